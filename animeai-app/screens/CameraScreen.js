@@ -17,6 +17,8 @@ export default function CameraScreen({ route, navigation }) {
   const [detectedEmotion, setDetectedEmotion] = useState(null);
   
   const cameraRef = useRef(null);
+  // 같은 화면에서 찍은 프레임끼리만 서버가 중복 프레임 결과를 재사용하도록 보내는 세션 id
+  const sessionIdRef = useRef(`camera-${Date.now()}-${Math.random().toString(36).slice(2)}`);
   const { onReturn } = route.params || {};
   
   // 카메라 권한 요청
@@ -44,6 +46,7 @@ export default function CameraScreen({ route, navigation }) {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            'X-Session-Id': sessionIdRef.current,
           },
           body: JSON.stringify({
             image: `data:image/jpeg;base64,${photo.base64}`
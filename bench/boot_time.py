@@ -0,0 +1,64 @@
+"""
+server.py 를 가져오고 앱을 만드는 데 걸리는 시간(워커 한 개의 시작 비용)을 새 프로세스에서 여러 번 재서
+중앙값이 예산을 넘으면 실패 (종료 코드 1). DATABASE_URL, OPENAI_API_KEY 없이도 가져올 수 있어야 함.
+
+    python bench/boot_time.py --runs 10 --budget-ms 1000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+server.create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "importMs": (imported - started) * 1000,
+    "createAppMs": (created - imported) * 1000,
+    "openaiLoaded": "openai" in sys.modules,
+    "engineCreated": sys.modules["database"]._engine is not None,
+}))
+"""
+
+
+def measure():
+    env = {key: value for key, value in os.environ.items() if key not in ("DATABASE_URL", "OPENAI_API_KEY")}
+    output = subprocess.run([sys.executable, "-c", PROBE], env=env, cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    args = parser.parse_args()
+
+    # 첫 실행은 .pyc 생성과 디스크 캐시 때문에 느리므로 버림
+    measure()
+    samples = [measure() for _ in range(args.runs)]
+    import_ms = statistics.median(sample["importMs"] for sample in samples)
+    create_ms = statistics.median(sample["createAppMs"] for sample in samples)
+    total_ms = statistics.median(sample["importMs"] + sample["createAppMs"] for sample in samples)
+
+    print(f"import server      median {import_ms:8.1f} ms")
+    print(f"create_app()       median {create_ms:8.1f} ms")
+    print(f"total              median {total_ms:8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+    print(f"openai imported at boot: {any(sample['openaiLoaded'] for sample in samples)}")
+    print(f"engine created at boot:  {any(sample['engineCreated'] for sample in samples)}")
+
+    if total_ms > args.budget_ms:
+        print("over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+합성 캐릭터 N 명(감정 9개씩)을 NDJSON 으로 만들어 character_io 로 가져오기(새로 추가, 다시 실행해서 갱신)와
+내보내기 시간을 잰다. --naive 를 주면 기존 init_db 방식(ORM 으로 한 명씩 추가 후 표정 추가)과 비교함.
+
+    python bench/character_import.py --characters 50000 --naive
+
+--database-url 의 테이블은 모두 지우고 다시 만드므로 전용 DB 를 쓸 것. 생략하면 임시 SQLite 파일을 씀.
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_lines(count, emotions):
+    for i in range(count):
+        image_url = f"/assets/bench-{i}.png"
+        yield json.dumps({
+            "name": f"bench-character-{i}",
+            "description": f"synthetic character {i}",
+            "image_url": image_url,
+            "personality": {"type": "Friendly", "traits": ["calm", "curious"]},
+            "voice_type": "nova",
+            "expressions": {emotion: image_url for emotion in emotions}
+        }, ensure_ascii=False) + "\n"
+
+
+def naive_import(session, count, emotions):
+    # 이전 add_default_characters 흐름
+    from models import Character, CharacterExpression
+    started = time.perf_counter()
+    for line in make_lines(count, emotions):
+        record = json.loads(line)
+        session.add(Character(
+            name=record["name"], description=record["description"], image_url=record["image_url"],
+            personality=record["personality"], voice_type=record["voice_type"]
+        ))
+    session.commit()
+    for character in session.query(Character).all():
+        for emotion in emotions:
+            session.add(CharacterExpression(character_id=character.id, emotion=emotion, image_url=character.image_url))
+    session.commit()
+    return round(time.perf_counter() - started, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Character catalog import/export benchmark")
+    parser.add_argument("--characters", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--naive", action="store_true", help="also time the old row-by-row seeding")
+    parser.add_argument("--database-url", help="dedicated benchmark database (all tables are dropped)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="character-bench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'characters.db')}"
+
+    from character_io import export_characters, import_characters
+    from database import create_schema, db_session, get_engine
+    from emotion import EMOTIONS
+    from models import Base
+
+    engine = get_engine()
+    path = os.path.join(workdir, "characters.ndjson")
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(make_lines(args.characters, EMOTIONS))
+
+    result = {"characters": args.characters, "expressionsPerCharacter": len(EMOTIONS), "database": engine.dialect.name}
+    try:
+        Base.metadata.drop_all(bind=engine)
+        create_schema()
+        with open(path, encoding="utf-8") as f:
+            result["import"] = import_characters(engine, f, args.batch_size)
+        with open(path, encoding="utf-8") as f:
+            result["reimport"] = import_characters(engine, f, args.batch_size)
+
+        started = time.perf_counter()
+        out = io.StringIO()
+        exported = export_characters(engine, out, args.batch_size)
+        result["export"] = {"characters": exported, "bytes": len(out.getvalue().encode("utf-8")),
+                            "seconds": round(time.perf_counter() - started, 3)}
+
+        if args.naive:
+            Base.metadata.drop_all(bind=engine)
+            create_schema()
+            result["naiveSeconds"] = naive_import(db_session, args.characters, EMOTIONS)
+            db_session.remove()
+    finally:
+        engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
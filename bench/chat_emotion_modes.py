@@ -0,0 +1,61 @@
+"""
+CHAT_EMOTION_MODE=separate(두 번 호출), single(한 번 호출), local(한 번 호출 + 로컬 분류기)의
+/api/chat 지연 시간 비교.
+
+가짜 OpenAI 서버를 같은 프로세스에서 띄우고 Flask 테스트 클라이언트로 요청을 보냄:
+
+    python bench/chat_emotion_modes.py --latency 0.3 --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai import serve
+
+BODY = {
+    "message": "안녕! 오늘 기분 어때?",
+    "persona": {"type": "Friendly", "traits": ["positive", "enthusiastic", "caring"]},
+    "history": []
+}
+
+
+def run(server_module, mode, runs):
+    server_module.CHAT_EMOTION_MODE = mode
+    test_client = server_module.app.test_client()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = test_client.post("/api/chat", json=BODY)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.get_json()
+    return {
+        "p50_ms": round(statistics.median(samples), 1),
+        "max_ms": round(max(samples), 1),
+        "emotion": response.get_json()["emotion"]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chat emotion modes")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock upstream latency per call in seconds")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+
+    mock = serve(port=args.port, latency=args.latency)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite:///bench.db")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    import server
+
+    results = {mode: run(server, mode, args.runs) for mode in ("separate", "single", "local")}
+    print(json.dumps(results, indent=2))
+    mock.shutdown()
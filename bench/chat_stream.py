@@ -0,0 +1,52 @@
+"""
+/api/chat 의 첫 바이트까지 시간(TTFB)과 전체 시간을 스트리밍/일반 모드별로 측정.
+
+    python bench/chat_stream.py --url http://127.0.0.1:8000 --runs 20
+"""
+import argparse
+import json
+import statistics
+import time
+
+import requests
+
+BODY = {
+    "message": "안녕! 오늘 기분 어때?",
+    "persona": {"type": "Friendly", "traits": ["positive", "enthusiastic", "caring"]},
+    "history": []
+}
+
+
+def measure(url, stream):
+    started = time.perf_counter()
+    first_byte = None
+    with requests.post(f"{url}/api/chat", json={**BODY, "stream": stream}, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=None):
+            if first_byte is None and chunk:
+                first_byte = time.perf_counter() - started
+    total = time.perf_counter() - started
+    return first_byte * 1000, total * 1000
+
+
+def summarize(samples):
+    ttfb = [s[0] for s in samples]
+    total = [s[1] for s in samples]
+    return {
+        "ttfb_p50_ms": round(statistics.median(ttfb), 1),
+        "ttfb_max_ms": round(max(ttfb), 1),
+        "total_p50_ms": round(statistics.median(total), 1),
+        "total_max_ms": round(max(total), 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /api/chat TTFB vs total latency")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {}
+    for mode, stream in (("blocking", False), ("stream", True)):
+        results[mode] = summarize([measure(args.url, stream) for _ in range(args.runs)])
+    print(json.dumps(results, indent=2))
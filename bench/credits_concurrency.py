@@ -0,0 +1,103 @@
+"""
+여러 스레드가 같은 사용자의 크레딧을 동시에 차감할 때 잃어버리는 갱신이 없는지와 초당 처리량을 확인.
+--naive 를 주면 기존 방식(ORM 으로 읽고-수정하고-쓰기)과 비교함.
+
+    DATABASE_URL=sqlite:///bench.db python bench/credits_concurrency.py --threads 16 --debits 200
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench.db")
+
+import credit_ledger
+from database import db_session, engine
+from models import Base, User, CreditTransaction
+
+
+def ledger_worker(username, debits, results):
+    for _ in range(debits):
+        try:
+            credit_ledger.debit(db_session, username, 1, "bench")
+            results["ok"] += 1
+        except credit_ledger.InsufficientCredits:
+            results["insufficient"] += 1
+        except Exception as e:
+            results["errors"] += 1
+            print(f"debit failed: {e}")
+    db_session.remove()
+
+
+def naive_worker(username, debits, results):
+    # 기존 save-credits 흐름: 읽고, 파이썬에서 빼고, 덮어쓰기
+    for _ in range(debits):
+        try:
+            user = db_session.query(User).filter_by(username=username).one()
+            if user.credits >= 1:
+                user.credits = user.credits - 1
+                db_session.commit()
+                results["ok"] += 1
+            else:
+                db_session.rollback()
+                results["insufficient"] += 1
+        except Exception:
+            db_session.rollback()
+            results["errors"] += 1
+    db_session.remove()
+
+
+def run(mode, threads, debits, initial):
+    username = f"bench-{mode}-{uuid.uuid4().hex[:8]}"
+    credit_ledger.set_balance(db_session, username, initial)
+    db_session.remove()
+
+    worker = ledger_worker if mode == "ledger" else naive_worker
+    counters = [{"ok": 0, "insufficient": 0, "errors": 0} for _ in range(threads)]
+    pool = [threading.Thread(target=worker, args=(username, debits, counters[i])) for i in range(threads)]
+
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    succeeded = sum(c["ok"] for c in counters)
+    user = db_session.query(User).filter_by(username=username).one()
+    ledger_rows = db_session.query(CreditTransaction).filter_by(user_id=user.id, reason="bench").count()
+    result = {
+        "mode": mode,
+        "operations": threads * debits,
+        "succeeded": succeeded,
+        "insufficient": sum(c["insufficient"] for c in counters),
+        "errors": sum(c["errors"] for c in counters),
+        "final_balance": user.credits,
+        "expected_balance": initial - succeeded,
+        "lost_updates": user.credits - (initial - succeeded),
+        "ledger_rows": ledger_rows,
+        "ops_per_sec": round(threads * debits / elapsed, 1)
+    }
+    db_session.remove()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent credit debit benchmark")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--debits", type=int, default=200, help="debits per thread")
+    parser.add_argument("--initial", type=int, default=None, help="starting balance (default: 3/4 of all debits)")
+    parser.add_argument("--naive", action="store_true", help="also run the read-modify-write baseline")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    initial = args.initial if args.initial is not None else args.threads * args.debits * 3 // 4
+
+    results = [run("ledger", args.threads, args.debits, initial)]
+    if args.naive:
+        results.append(run("naive", args.threads, args.debits, initial))
+    print(json.dumps(results, indent=2))
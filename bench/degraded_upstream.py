@@ -0,0 +1,114 @@
+"""
+느린 가짜 OpenAI 서버(기본 응답 지연 10초)를 상대로 /api/chat 을 동시에 계속 보내면서
+업스트림을 쓰지 않는 /api/characters 의 응답 시간과 채팅 처리량(대체 답변 포함)을 잰다.
+
+    python bench/degraded_upstream.py --latency 10 --concurrency 64 --duration 30
+    BREAKER_ENABLED=false python bench/degraded_upstream.py   # 서킷 브레이커 없이 비교
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai import serve
+
+BODY = {"message": "안녕!", "persona": {"type": "Friendly"}, "history": []}
+
+
+def summarize(durations):
+    if not durations:
+        return {"count": 0}
+    durations = sorted(durations)
+    return {
+        "count": len(durations),
+        "p50_ms": round(statistics.median(durations), 1),
+        "p95_ms": round(durations[max(0, int(len(durations) * 0.95) - 1)], 1)
+    }
+
+
+def chat_worker(session, url, deadline, think, results):
+    # 사용자 한 명처럼 답을 받으면 think 초 쉬고 다음 메시지를 보냄
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{url}/api/chat", json=BODY, timeout=120)
+            kind = "error" if response.status_code != 200 else "degraded" if response.json().get("degraded") else "ok"
+        except requests.RequestException:
+            kind = "error"
+        results.append((kind, (time.perf_counter() - started) * 1000))
+        time.sleep(think)
+
+
+def probe_characters(url, deadline, durations):
+    # 업스트림과 무관한 엔드포인트가 채팅 요청에 밀려 느려지는지 확인
+    session = requests.Session()
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        session.get(f"{url}/api/characters", timeout=120)
+        durations.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat and catalog latency while the upstream is slow")
+    parser.add_argument("--latency", type=float, default=10.0, help="mock upstream latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--think", type=float, default=0.5, help="seconds each client waits between messages")
+    parser.add_argument("--mock-port", type=int, default=9104)
+    parser.add_argument("--port", type=int, default=8104)
+    args = parser.parse_args()
+
+    mock = serve(port=args.mock_port, latency=args.latency)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix="degraded-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.mock_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    import server
+    import upstream
+
+    server.create_schema()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app_server = make_server("127.0.0.1", args.port, server.app, threaded=True)
+    threading.Thread(target=app_server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{args.port}"
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency))
+    deadline = time.perf_counter() + args.duration
+    chats, catalog = [], []
+    prober = threading.Thread(target=probe_characters, args=(url, deadline, catalog))
+    prober.start()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for _ in range(args.concurrency):
+            pool.submit(chat_worker, session, url, deadline, args.think, chats)
+    prober.join()
+
+    result = {
+        "latency": args.latency,
+        "concurrency": args.concurrency,
+        "breakerEnabled": os.environ.get("BREAKER_ENABLED", "true"),
+        "chatPerSecond": round(len(chats) / args.duration, 1),
+        "characters": summarize(catalog)
+    }
+    for kind in ("ok", "degraded", "error"):
+        result[f"chat_{kind}"] = summarize([ms for outcome, ms in chats if outcome == kind])
+    result["breakers"] = upstream.breakers.stats()
+    print(json.dumps(result, indent=2))
+
+    app_server.shutdown()
+    mock.shutdown()
@@ -0,0 +1,82 @@
+"""
+1,000턴짜리 합성 대화에서 HistoryManager 의 요약 횟수, 압축 시간, 프롬프트 토큰 수를 측정.
+요약은 가짜 함수(--summary-delay 만큼 지연)로 대체하므로 OpenAI 없이 실행됨.
+
+    python bench/history_compaction.py --turns 1000 --sessions 5
+    python bench/history_compaction.py --summary-delay 0.5 --workers 2   # 요약을 백그라운드에서 만들 때
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HistoryManager, estimate_tokens, message_tokens
+
+USER_LINES = ["안녕! 오늘 뭐 했어?", "I watched a movie yesterday, it was great.", "내일 같이 도서관 갈래?", "What is your favourite song?", "요즘 너무 피곤해서 걱정이야..."]
+CHARACTER_LINES = ["오늘은 학생회 회의가 있었다요! 조금 바빴지만 재밌었어요.", "Oh, that sounds wonderful! Which movie was it?", "좋아요! 몇 시에 만날까요? 저는 오후가 좋다요!", "I love calm piano pieces, they help me think.", "괜찮아요? 오늘은 일찍 쉬는 게 좋겠다요."]
+
+
+def synthetic_session(turns, rng):
+    history = []
+    for _ in range(turns):
+        history.append({"role": "user", "content": rng.choice(USER_LINES)})
+        history.append({"role": "assistant", "content": rng.choice(CHARACTER_LINES)})
+    return history
+
+
+def run(turns, sessions, summary_delay, workers=0):
+    calls = []
+
+    def summarize(previous, messages):
+        calls.append(len(messages))
+        time.sleep(summary_delay)
+        return (previous or "")[-200:] + f" [{len(messages)} messages summarized]"
+
+    manager = HistoryManager(summarize, workers=workers)
+    rng = random.Random(42)
+    compact_ms = []
+    sent_tokens = []
+    full_tokens = []
+
+    for session in range(sessions):
+        history = synthetic_session(turns, rng)
+        uncompacted = 0
+        for turn in range(1, turns + 1):
+            visible = history[:turn * 2]
+            started = time.perf_counter()
+            summary, window = manager.compact(f"session-{session}", visible)
+            compact_ms.append((time.perf_counter() - started) * 1000)
+            sent_tokens.append(sum(message_tokens(m) for m in window) + estimate_tokens(summary))
+            uncompacted += sum(message_tokens(m) for m in visible[-2:])
+            full_tokens.append(uncompacted)
+
+    if manager.executor is not None:
+        manager.executor.shutdown(wait=True)
+    return {
+        "turns": turns,
+        "sessions": sessions,
+        "summarizer_calls": len(calls),
+        "summarizer_calls_per_session": round(len(calls) / sessions, 1),
+        "compact_p50_ms": round(statistics.median(compact_ms), 3),
+        "compact_max_ms": round(max(compact_ms), 3),
+        "prompt_tokens_last_turn": sent_tokens[-1],
+        "prompt_tokens_max": max(sent_tokens),
+        "uncompacted_tokens_last_turn": full_tokens[-1],
+        "prompt_tokens_total": sum(sent_tokens),
+        "uncompacted_tokens_total": sum(full_tokens),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark token-budgeted history compaction")
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=5)
+    parser.add_argument("--summary-delay", type=float, default=0.0, help="simulated summarizer latency in seconds")
+    parser.add_argument("--workers", type=int, default=0, help="background summary threads (0 summarizes inline)")
+    args = parser.parse_args()
+    print(json.dumps(run(args.turns, args.sessions, args.summary_delay, args.workers), indent=2))
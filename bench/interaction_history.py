@@ -0,0 +1,177 @@
+"""
+합성 interactions 테이블(기본 100만 행, --rows 10000000 으로 1천만 행)에서
+대화별 최근 턴 조회와 OFFSET / 키셋 페이지네이션을 인덱스 전후로 재고, 보존 기간이 지난 턴을 옮기는 속도를 측정.
+
+    python bench/interaction_history.py --rows 10000000
+    python bench/interaction_history.py --rows 10000000 --database-url postgresql://localhost/bench
+
+--database-url 의 테이블은 모두 지우고 다시 만드므로 전용 DB 를 쓸 것. 생략하면 임시 SQLite 파일을 만들고 끝나면 지움.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert, select, text
+
+
+def timed(fn, samples):
+    # 밀리초 단위 중앙값과 p95
+    durations = []
+    for args in samples:
+        started = time.perf_counter()
+        fn(*args)
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    return {
+        "p50_ms": round(statistics.median(durations), 3),
+        "p95_ms": round(durations[int(len(durations) * 0.95) - 1], 3)
+    }
+
+
+def populate(engine, rows, users, characters, days, chunk=50000):
+    from models import Character, Interaction, User
+    rng = random.Random(1)
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": i, "username": f"bench-{i}", "credits": 0} for i in range(1, users + 1)])
+        connection.execute(insert(Character), [{"id": i, "name": f"character-{i}"} for i in range(1, characters + 1)])
+
+    # id 가 커질수록 최근 턴이 되도록 created_at 을 days 일에 걸쳐 고르게 배치
+    step = timedelta(days=days) / rows
+    started = time.perf_counter()
+    for offset in range(0, rows, chunk):
+        batch = []
+        for i in range(offset, min(rows, offset + chunk)):
+            batch.append({
+                "id": i + 1,
+                "user_id": rng.randint(1, users),
+                "character_id": rng.randint(1, characters),
+                "message": f"message {i}",
+                "response": f"response to message {i} with a few more words",
+                "emotion": "neutral",
+                "created_at": now - timedelta(days=days) + step * i
+            })
+        with engine.begin() as connection:
+            connection.execute(insert(Interaction), batch)
+        print(f"\rinserted {min(rows, offset + chunk):,} / {rows:,}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    return time.perf_counter() - started
+
+
+def drop_interaction_indexes(engine):
+    from models import Interaction
+    with engine.begin() as connection:
+        for index in Interaction.__table__.indexes:
+            index.drop(connection, checkfirst=True)
+
+
+def measure_queries(engine, samples, page, depth):
+    from models import Interaction
+
+    def last_turns(user_id, character_id):
+        with engine.connect() as connection:
+            connection.execute(
+                select(Interaction.message, Interaction.response)
+                .where(Interaction.user_id == user_id, Interaction.character_id == character_id)
+                .order_by(Interaction.id.desc()).limit(10)
+            ).all()
+
+    def offset_page(user_id, character_id):
+        with engine.connect() as connection:
+            connection.execute(
+                select(Interaction.id)
+                .where(Interaction.user_id == user_id, Interaction.character_id == character_id)
+                .order_by(Interaction.id.desc()).limit(page).offset(page * depth)
+            ).all()
+
+    def keyset_pages(user_id, character_id):
+        # depth 페이지를 넘긴 다음 페이지. 실제 클라이언트처럼 앞 페이지를 before 로 따라감
+        before = None
+        with engine.connect() as connection:
+            for _ in range(depth + 1):
+                query = (select(Interaction.id)
+                         .where(Interaction.user_id == user_id, Interaction.character_id == character_id))
+                if before is not None:
+                    query = query.where(Interaction.id < before)
+                ids = connection.execute(query.order_by(Interaction.id.desc()).limit(page)).scalars().all()
+                if not ids:
+                    break
+                before = ids[-1]
+
+    return {
+        "last10": timed(last_turns, samples),
+        "offsetPage": timed(offset_page, samples),
+        "keysetAllPages": timed(keyset_pages, samples)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interaction history index and retention benchmark")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--characters", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365, help="span of created_at")
+    parser.add_argument("--retention-days", type=int, default=90)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--page", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=5, help="pages skipped before the measured page")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--database-url", help="dedicated benchmark database (all tables are dropped)")
+    args = parser.parse_args()
+
+    workdir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        workdir = tempfile.mkdtemp(prefix="history-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'history.db')}"
+
+    from database import get_engine, upgrade_schema
+    from models import Base
+    from retention import archive_interactions
+
+    engine = get_engine()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    drop_interaction_indexes(engine)
+
+    result = {"rows": args.rows, "database": engine.dialect.name}
+    result["insertSeconds"] = round(populate(engine, args.rows, args.users, args.characters, args.days), 1)
+
+    rng = random.Random(2)
+    samples = [(rng.randint(1, args.users), rng.randint(1, args.characters)) for _ in range(args.queries)]
+
+    result["withoutIndexes"] = measure_queries(engine, samples[:max(5, args.queries // 10)], args.page, args.depth)
+    started = time.perf_counter()
+    upgrade_schema(engine, Base.metadata)
+    result["indexSeconds"] = round(time.perf_counter() - started, 1)
+    result["withIndexes"] = measure_queries(engine, samples, args.page, args.depth)
+
+    cutoff = datetime.utcnow() - timedelta(days=args.retention_days)
+    result["archive"] = archive_interactions(engine, cutoff, args.batch_size)
+    if result["archive"]["seconds"]:
+        result["archive"]["rowsPerSecond"] = round(result["archive"]["archived"] / result["archive"]["seconds"])
+    result["afterArchive"] = measure_queries(engine, samples, args.page, args.depth)
+
+    with engine.connect() as connection:
+        result["remainingRows"] = connection.execute(text("SELECT COUNT(*) FROM interactions")).scalar()
+
+    print(json.dumps(result, indent=2))
+
+    engine.dispose()
+    if workdir is not None:
+        import shutil
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
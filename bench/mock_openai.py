@@ -0,0 +1,138 @@
+"""
+로컬 테스트/벤치마크용 가짜 OpenAI 서버.
+
+server.py 를 실제 API 대신 이 서버에 연결하려면:
+
+    python bench/mock_openai.py --port 9100 --latency 0.3 --token-delay 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=test python server.py
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "안녕하세요! 오늘도 만나서 정말 반가워요. 같이 즐거운 이야기 나눠요!"
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    token_delay = 0.0
+    reply = REPLY
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        # 이미지 편집 요청은 multipart 로 오므로 본문만 읽고 버림
+        if "json" not in (self.headers.get("Content-Type") or "json"):
+            return {}
+        return json.loads(body or b"{}")
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        payload = self.read_json()
+        time.sleep(self.latency)
+
+        if self.path.endswith("/chat/completions"):
+            if payload.get("stream"):
+                return self.stream_completion(payload)
+            return self.send_json(self.completion(payload))
+        if self.path.endswith("/audio/speech"):
+            return self.speech(payload)
+        if self.path.endswith("/images/generations") or self.path.endswith("/images/edits"):
+            return self.send_json(self.image())
+        self.send_json({"error": {"message": f"unknown path {self.path}"}}, status=404)
+
+    def completion_text(self, payload):
+        messages = payload.get("messages", [])
+        system = messages[0]["content"] if messages and isinstance(messages[0].get("content"), str) else ""
+        if system.startswith("Extract the primary emotion"):
+            return "happy"
+        if (payload.get("response_format") or {}).get("type") == "json_object":
+            return json.dumps({"response": self.reply, "emotion": "happy"}, ensure_ascii=False)
+        return self.reply
+
+    def completion(self, payload):
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.completion_text(payload)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    def stream_completion(self, payload):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        text = self.completion_text(payload)
+        # 공백 단위로 끊어서 토큰처럼 보냄
+        words = text.split(" ")
+        tokens = [words[0]] + [" " + word for word in words[1:]]
+        for token in tokens:
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "gpt-4o"),
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+            }
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            time.sleep(self.token_delay)
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def speech(self, payload):
+        # 실제 MP3 는 아니지만 입력 길이에 비례하는 바이트를 돌려줌
+        body = b"ID3" + payload.get("input", "").encode("utf-8") * 64
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def image(self):
+        # 1x1 투명 PNG
+        png = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+        return {"created": int(time.time()), "data": [{"b64_json": png}]}
+
+
+def serve(host="127.0.0.1", port=9100, latency=0.0, token_delay=0.0):
+    handler = type("Handler", (MockOpenAIHandler,), {"latency": latency, "token_delay": token_delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte of every response")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.token_delay)
+    print(f"Mock OpenAI server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
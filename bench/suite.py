@@ -0,0 +1,322 @@
+"""
+server.py 를 SQLite 와 가짜 OpenAI 서버에 연결해 띄우고, 채팅/캐릭터 목록/크레딧/감정 분석을 섞은 트래픽을
+동시 요청 수별로 보내서 시나리오별 p50/p95/p99, 처리량, 서버 메모리를 JSON 으로 기록.
+
+    python bench/suite.py --concurrency 1 8 32 --duration 20 --latency 0.2 --token-delay 0.01
+    python bench/suite.py --output bench/results/after.json --compare bench/results/before.json
+
+결과 파일에는 커밋 해시와 설정이 함께 들어가므로 커밋 사이에 비교할 수 있음.
+서버 메모리(VmRSS/VmHWM)는 Linux 의 /proc 에서 읽음.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_openai import serve
+
+CHARACTERS = 20
+USERS = 200
+
+# 시나리오 이름 -> 기본 가중치
+MIX = {
+    "chat": 30,
+    "chat_stream": 15,
+    "characters": 25,
+    "credits_get": 15,
+    "credits_debit": 10,
+    "emotion": 5,
+}
+MESSAGES = ["안녕! 오늘 뭐 했어?", "I watched a movie yesterday, it was great.", "내일 같이 도서관 갈래?",
+            "What is your favourite song?", "요즘 너무 피곤해서 걱정이야..."]
+
+
+def percentile(sorted_values, fraction):
+    # 최근접 순위 방식
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def memory_mb(pid):
+    status = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    status[key] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        return {"rss_mb": None, "peak_rss_mb": None}
+    return {"rss_mb": status.get("VmRSS"), "peak_rss_mb": status.get("VmHWM")}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(database_url):
+    # 서버와 같은 SQLite 파일에 캐릭터를 미리 넣어 둠
+    os.environ["DATABASE_URL"] = database_url
+    from database import db_session, engine
+    from models import Base, Character
+
+    Base.metadata.create_all(bind=engine)
+    for i in range(CHARACTERS):
+        db_session.add(Character(
+            name=f"bench-{i}",
+            description="벤치마크용 캐릭터",
+            personality={"type": "Friendly", "traits": ["positive", "caring"]},
+            voice_type="nova"
+        ))
+    db_session.commit()
+    db_session.remove()
+    engine.dispose()
+
+
+def start_server(port, mock_port, database_url):
+    env = {
+        **os.environ,
+        "PORT": str(port),
+        "DATABASE_URL": database_url,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "test"),
+        # 소수의 가상 사용자가 빠르게 요청하므로 기본적으로 속도 제한은 끄고 측정
+        "RATE_LIMIT_ENABLED": os.environ.get("RATE_LIMIT_ENABLED", "false"),
+    }
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py")], env=env, cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            requests.get(f"{url}/api/status", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("server did not start")
+
+
+class Client:
+    # 워커 스레드 하나. 실제 앱처럼 ETag 를 기억해서 캐릭터 목록을 재검증함
+    def __init__(self, url, rng):
+        self.url = url
+        self.rng = rng
+        self.session = requests.Session()
+        self.etag = None
+
+    def chat(self, stream=False):
+        body = {
+            "message": self.rng.choice(MESSAGES),
+            "characterId": self.rng.randint(1, CHARACTERS),
+            "userId": f"bench-user-{self.rng.randint(1, USERS)}",
+            "stream": stream
+        }
+        with self.session.post(f"{self.url}/api/chat", json=body, stream=stream, timeout=120) as response:
+            if stream:
+                for _ in response.iter_content(chunk_size=None):
+                    pass
+            return response.status_code
+
+    def chat_stream(self):
+        return self.chat(stream=True)
+
+    def characters(self):
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        response = self.session.get(f"{self.url}/api/characters", headers=headers, timeout=60)
+        if response.status_code == 200:
+            self.etag = response.headers.get("ETag")
+        return 200 if response.status_code == 304 else response.status_code
+
+    def credits_get(self):
+        params = {"userId": f"bench-user-{self.rng.randint(1, USERS)}"}
+        return self.session.get(f"{self.url}/api/get-credits", params=params, timeout=60).status_code
+
+    def credits_debit(self):
+        body = {"userId": f"bench-user-{self.rng.randint(1, USERS)}", "amount": 1, "reason": "bench"}
+        status = self.session.post(f"{self.url}/api/credits/debit", json=body, timeout=60).status_code
+        # 잔액 부족(402)은 정상 응답으로 봄
+        return 200 if status == 402 else status
+
+    def emotion(self):
+        body = {"type": "text", "data": self.rng.choice(MESSAGES)}
+        return self.session.post(f"{self.url}/api/emotion-analyze", json=body, timeout=60).status_code
+
+
+def run_level(url, concurrency, duration, mix, seed_value):
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        client = Client(url, rng)
+        local_samples = defaultdict(list)
+        local_errors = defaultdict(int)
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(scenarios, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = getattr(client, scenario)()
+            except requests.RequestException:
+                status = None
+            elapsed = (time.perf_counter() - started) * 1000
+            if status == 200:
+                local_samples[scenario].append(elapsed)
+            else:
+                local_errors[scenario] += 1
+        with lock:
+            for scenario, values in local_samples.items():
+                samples[scenario].extend(values)
+            for scenario, count in local_errors.items():
+                errors[scenario] += count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    result = {"concurrency": concurrency, "seconds": round(elapsed, 2), "scenarios": {}}
+    total = 0
+    for scenario in scenarios:
+        values = sorted(samples.get(scenario, []))
+        total += len(values)
+        result["scenarios"][scenario] = {
+            "requests": len(values),
+            "errors": errors.get(scenario, 0),
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": _round(percentile(values, 0.50)),
+            "p95_ms": _round(percentile(values, 0.95)),
+            "p99_ms": _round(percentile(values, 0.99)),
+        }
+    all_values = sorted(value for values in samples.values() for value in values)
+    result["total"] = {
+        "requests": total,
+        "errors": sum(errors.values()),
+        "rps": round(total / elapsed, 1),
+        "p50_ms": _round(percentile(all_values, 0.50)),
+        "p95_ms": _round(percentile(all_values, 0.95)),
+        "p99_ms": _round(percentile(all_values, 0.99)),
+    }
+    return result
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def compare(previous, current):
+    # 같은 동시 요청 수끼리 처리량과 p95 변화율 출력
+    before = {level["concurrency"]: level for level in previous["levels"]}
+    for level in current["levels"]:
+        old = before.get(level["concurrency"])
+        if old is None:
+            continue
+        for scenario, stats in [("total", level["total"])] + list(level["scenarios"].items()):
+            old_stats = old["total"] if scenario == "total" else old["scenarios"].get(scenario)
+            if not old_stats or not old_stats["rps"] or not old_stats["p95_ms"] or not stats["p95_ms"]:
+                continue
+            rps_change = (stats["rps"] - old_stats["rps"]) / old_stats["rps"] * 100
+            p95_change = (stats["p95_ms"] - old_stats["p95_ms"]) / old_stats["p95_ms"] * 100
+            print(f"c={level['concurrency']:<4} {scenario:<14} rps {old_stats['rps']:>8} -> {stats['rps']:<8} ({rps_change:+.1f}%)"
+                  f"  p95 {old_stats['p95_ms']:>8} -> {stats['p95_ms']:<8} ({p95_change:+.1f}%)")
+
+
+def parse_mix(values):
+    mix = dict(MIX)
+    for value in values or []:
+        name, _, weight = value.partition("=")
+        if name not in MIX:
+            raise SystemExit(f"unknown scenario {name}, expected one of {', '.join(MIX)}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mixed-traffic benchmark against a mock OpenAI server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=15, help="seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of traffic before the first level")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock upstream latency in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="mock delay between streamed tokens")
+    parser.add_argument("--mix", nargs="*", metavar="SCENARIO=WEIGHT", help=f"override weights ({', '.join(MIX)})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="previous JSON result to compare against")
+    parser.add_argument("--mock-port", type=int, default=9105)
+    parser.add_argument("--port", type=int, default=8105)
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    mock = serve(port=args.mock_port, latency=args.latency, token_delay=args.token_delay)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix="animeai-bench-")
+    database_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    seed(database_url)
+    process, url = start_server(args.port, args.mock_port, database_url)
+    try:
+        if args.warmup:
+            run_level(url, max(args.concurrency), args.warmup, mix, args.seed)
+        levels = []
+        for concurrency in args.concurrency:
+            level = run_level(url, concurrency, args.duration, mix, args.seed)
+            level["memory"] = memory_mb(process.pid)
+            levels.append(level)
+            total = level["total"]
+            print(f"c={concurrency:<4} {total['rps']:>8} req/s  p50 {total['p50_ms']} ms  p95 {total['p95_ms']} ms"
+                  f"  p99 {total['p99_ms']} ms  errors {total['errors']}  rss {level['memory']['rss_mb']} MB", file=sys.stderr)
+    finally:
+        process.terminate()
+        process.wait()
+        mock.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "latency": args.latency,
+            "token_delay": args.token_delay,
+            "mix": mix,
+            "seed": args.seed,
+        },
+        "levels": levels,
+    }
+    body = json.dumps(result, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(body + "\n")
+    else:
+        print(body)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
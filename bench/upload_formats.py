@@ -0,0 +1,131 @@
+"""
+4MB 카메라 프레임을 base64 JSON, multipart, 원시 image/jpeg 본문으로 보낼 때
+/api/analyze-expression 의 요청 시간과 서버 프로세스 최대 RSS 를 비교.
+형식마다 server.py 를 새로 띄워서 최대 RSS(VmHWM)가 섞이지 않게 함 (Linux 전용).
+
+    python bench/upload_formats.py --requests 20 --image-mb 4
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_openai import serve
+
+MODES = ["json", "multipart", "raw"]
+
+
+def make_image(target_bytes):
+    # 압축이 잘 안 되는 노이즈 JPEG 을 목표 크기 근처까지 키움
+    rng = random.Random(7)
+    side = 512
+    while True:
+        image = Image.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=95)
+        if buffer.tell() >= target_bytes:
+            return buffer.getvalue()
+        side = int(side * 1.05)
+
+
+def memory_kb(pid, field):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def start_server(port, mock_port, database):
+    env = {
+        **os.environ,
+        "PORT": str(port),
+        "DATABASE_URL": f"sqlite:///{database}",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "test"),
+        # 프레임 캐시가 업스트림 호출을 건너뛰지 않도록
+        "FRAME_HASH_THRESHOLD": "-1",
+    }
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py")], env=env, cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{url}/api/status", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("server did not start")
+
+
+def send(session, url, mode, image, data_url):
+    endpoint = f"{url}/api/analyze-expression"
+    if mode == "json":
+        return session.post(endpoint, json={"image": data_url, "sessionId": "bench"})
+    if mode == "multipart":
+        return session.post(endpoint, files={"image": ("frame.jpg", image, "image/jpeg")}, data={"sessionId": "bench"})
+    return session.post(endpoint, data=image, headers={"Content-Type": "image/jpeg", "X-Session-Id": "bench"})
+
+
+def run(mode, image, args, port):
+    database = os.path.join(ROOT, f"bench-upload-{mode}.db")
+    process, url = start_server(port, args.mock_port, database)
+    try:
+        session = requests.Session()
+        data_url = "data:image/jpeg;base64," + base64.b64encode(image).decode("ascii")
+        baseline = memory_kb(process.pid, "VmRSS")
+        timings = []
+        errors = 0
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            response = send(session, url, mode, image, data_url)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors += 1
+        return {
+            "mode": mode,
+            "requests": args.requests,
+            "errors": errors,
+            "request_bytes": len(data_url) if mode == "json" else len(image),
+            "p50_ms": round(statistics.median(timings), 1),
+            "mean_ms": round(statistics.mean(timings), 1),
+            "baseline_rss_mb": round(baseline / 1024, 1),
+            "peak_rss_mb": round(memory_kb(process.pid, "VmHWM") / 1024, 1),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+        if os.path.exists(database):
+            os.remove(database)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare upload formats for /api/analyze-expression")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--image-mb", type=float, default=4)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--mock-port", type=int, default=9104)
+    parser.add_argument("--port", type=int, default=8104)
+    args = parser.parse_args()
+
+    mock = serve(port=args.mock_port)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+
+    image = make_image(int(args.image_mb * 1024 * 1024))
+    results = [run(mode, image, args, args.port + i) for i, mode in enumerate(args.modes)]
+    print(json.dumps({"image_bytes": len(image), "results": results}, indent=2))
+    mock.shutdown()
@@ -0,0 +1,77 @@
+"""
+가짜 OpenAI 서버(지연 시간 고정)를 상대로 동시 요청 수를 늘려가며 /api/chat 처리량을 측정.
+
+    python bench/upstream_load.py --latency 0.5 --concurrency 1 16 64 256
+
+UPSTREAM_MAX_CONCURRENCY, UPSTREAM_POOL_SIZE 등 upstream.py 설정을 바꿔가며 비교할 수 있음.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai import serve
+
+BODY = {"message": "안녕!", "persona": {"type": "Friendly"}, "history": []}
+
+
+def drive(url, concurrency, total):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    errors = 0
+
+    def one(_):
+        response = session.post(f"{url}/api/chat", json=BODY, timeout=120)
+        return response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for status in pool.map(one, range(total)):
+            if status != 200:
+                errors += 1
+    elapsed = time.perf_counter() - started
+    return {"requests": total, "errors": errors, "seconds": round(elapsed, 2), "rps": round(total / elapsed, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of /api/chat against a slow mock upstream")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--requests-per-worker", type=int, default=4)
+    parser.add_argument("--mock-port", type=int, default=9103)
+    parser.add_argument("--port", type=int, default=8103)
+    args = parser.parse_args()
+
+    mock = serve(port=args.mock_port, latency=args.latency)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite:///bench.db")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.mock_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    import server
+    import upstream
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app_server = make_server("127.0.0.1", args.port, server.app, threaded=True)
+    threading.Thread(target=app_server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{args.port}"
+
+    results = {}
+    for concurrency in args.concurrency:
+        results[concurrency] = drive(url, concurrency, concurrency * args.requests_per_worker)
+    results["upstream"] = upstream.stats()
+    print(json.dumps(results, indent=2))
+
+    app_server.shutdown()
+    mock.shutdown()
@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload
+from models import Character, CharacterAtlas, CharacterExpression
+
+# 캐릭터 목록 캐시 설정
+#   CHARACTER_CACHE_TTL: 다른 워커 프로세스의 변경도 반영되도록 캐시를 강제로 다시 읽는 주기(초)
+CACHE_TTL = float(os.getenv("CHARACTER_CACHE_TTL", 60))
+MAX_CACHED_PAGES = 256
+MAX_PAGE_SIZE = 500
+
+CHARACTER_FIELDS = ("id", "name", "description", "image_url", "personality", "voice_type", "expressions", "atlas")
+
+# 이 모델들이 쓰여지면 캐시를 무효화함
+WATCHED_MODELS = (Character, CharacterExpression, CharacterAtlas)
+
+
+def serialize_character(character):
+    char_dict = character.to_dict()
+
+    # 감정 표현 이미지
+    char_dict["expressions"] = {expr.emotion: expr.image_url for expr in character.expressions}
+    # 표정을 한 장에 모은 스프라이트 아틀라스 (아직 없으면 None, 클라이언트는 expressions 를 개별로 읽음)
+    char_dict["atlas"] = character.atlas.to_dict() if character.atlas is not None else None
+    return char_dict
+
+
+class CharacterCatalog:
+    # /api/characters 응답을 직렬화된 JSON 으로 캐시. 캐릭터나 표정이 커밋되면 버전이 올라가고 캐시가 비워짐
+    def __init__(self, session, ttl=CACHE_TTL):
+        self.session = session
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.version = 0
+        self.loaded_at = 0.0
+        self.pages = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.pages.clear()
+
+    def _query(self):
+        # expressions, atlas 는 selectin 으로 한 번에 읽어서 캐릭터마다 추가 쿼리가 나가지 않게 함
+        return (
+            self.session.query(Character)
+            .options(selectinload(Character.expressions), selectinload(Character.atlas))
+            .order_by(Character.id)
+        )
+
+    def _render(self, offset, limit, fields):
+        query = self._query()
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+
+        characters = [serialize_character(character) for character in query]
+        if fields:
+            characters = [{field: char_dict[field] for field in fields} for char_dict in characters]
+
+        payload = {
+            "success": True,
+            "characters": characters,
+            "total": self.session.query(Character).count(),
+            "offset": offset
+        }
+        if limit is not None:
+            payload["limit"] = limit
+
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()
+        return body, etag
+
+    def page(self, offset=0, limit=None, fields=None):
+        # (JSON 바이트, ETag) 반환
+        key = (offset, limit, fields)
+        with self.lock:
+            if time.monotonic() - self.loaded_at > self.ttl:
+                self.pages.clear()
+                self.loaded_at = time.monotonic()
+
+            cached = self.pages.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+
+            self.misses += 1
+            version = self.version
+
+        rendered = self._render(offset, limit, fields)
+
+        with self.lock:
+            # 렌더링 중에 무효화되었으면 저장하지 않음
+            if version == self.version:
+                if len(self.pages) >= MAX_CACHED_PAGES:
+                    self.pages.clear()
+                self.pages[key] = rendered
+        return rendered
+
+    def stats(self):
+        with self.lock:
+            return {"version": self.version, "pages": len(self.pages), "hits": self.hits, "misses": self.misses}
+
+
+def _touches_catalog(objects):
+    return any(isinstance(obj, WATCHED_MODELS) for obj in objects)
+
+
+def watch(session_class, on_change):
+    # 세션에서 캐릭터/표정이 추가·수정·삭제된 뒤 커밋되면 on_change 호출
+    # 여러 번 등록해도 서로의 표시를 지우지 않도록 등록마다 따로 표시함
+    flag = ("catalog_changed", object())
+
+    @event.listens_for(session_class, "after_flush")
+    def after_flush(session, flush_context):
+        if _touches_catalog(session.new) or _touches_catalog(session.dirty) or _touches_catalog(session.deleted):
+            session.info[flag] = True
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def do_orm_execute(orm_execute_state):
+        # query.update() / delete() / insert() 같은 일괄 실행
+        if orm_execute_state.is_select:
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, WATCHED_MODELS):
+            orm_execute_state.session.info[flag] = True
+
+    @event.listens_for(session_class, "after_commit")
+    def after_commit(session):
+        if session.info.pop(flag, False):
+            on_change()
+
+    @event.listens_for(session_class, "after_rollback")
+    def after_rollback(session):
+        session.info.pop(flag, None)
+
+
+def parse_fields(value):
+    # "id,name,expressions" -> ("id", "name", "expressions"), 알 수 없는 필드는 ValueError
+    if not value:
+        return None
+    fields = tuple(field.strip() for field in value.split(",") if field.strip())
+    unknown = [field for field in fields if field not in CHARACTER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields or None
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import argparse
+from sqlalchemy import select, text
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from models import Character, CharacterExpression
+
+# 캐릭터 카탈로그 NDJSON 가져오기/내보내기
+#   한 줄에 캐릭터 하나: {"id"?, "name", "description", "image_url", "personality", "voice_type", "expressions": {감정: URL}}
+#   id 가 있으면 그 id 로, 없으면 같은 이름의 캐릭터를 갱신하고 둘 다 없으면 새로 추가하므로 여러 번 실행해도 결과가 같음
+#   CHARACTER_IMPORT_BATCH: 한 트랜잭션에 넣는 캐릭터 수
+BATCH_SIZE = int(os.getenv("CHARACTER_IMPORT_BATCH", 1000))
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seed", "characters.ndjson")
+
+CHARACTER_COLUMNS = ("name", "description", "image_url", "personality", "voice_type")
+
+
+class CatalogFormatError(ValueError):
+    pass
+
+
+def _upsert(connection, table, rows, keys, columns):
+    # 한 번의 executemany 로 INSERT ... ON CONFLICT DO UPDATE. columns 가 비어 있으면 ON CONFLICT DO NOTHING
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert(table) if dialect == "postgresql" else sqlite.insert(table)
+        if columns:
+            statement = insert.on_conflict_do_update(index_elements=keys, set_={column: insert.excluded[column] for column in columns})
+        else:
+            statement = insert.on_conflict_do_nothing(index_elements=keys)
+    elif columns:
+        insert = mysql.insert(table)
+        statement = insert.on_duplicate_key_update({column: insert.inserted[column] for column in columns})
+    else:
+        statement = mysql.insert(table).prefix_with("IGNORE")
+    connection.execute(statement, rows)
+
+
+def _parse(line, number):
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise CatalogFormatError(f"line {number}: invalid JSON ({e})")
+    if not isinstance(record, dict) or not isinstance(record.get("name"), str) or not record["name"].strip():
+        raise CatalogFormatError(f"line {number}: name is required")
+    if record.get("id") is not None and not isinstance(record["id"], int):
+        raise CatalogFormatError(f"line {number}: id must be an integer")
+    if record.get("personality") is not None and not isinstance(record["personality"], dict):
+        raise CatalogFormatError(f"line {number}: personality must be an object")
+    expressions = record.get("expressions") or {}
+    if not isinstance(expressions, dict) or not all(isinstance(key, str) and isinstance(value, str) for key, value in expressions.items()):
+        raise CatalogFormatError(f"line {number}: expressions must map emotion names to URLs")
+    return record
+
+
+def import_characters(engine, lines, batch_size=BATCH_SIZE, update=True):
+    # NDJSON 줄을 batch_size 씩 묶어서 캐릭터와 표정을 일괄 upsert. 배치마다 커밋
+    # update=False 이면 이미 있는 캐릭터와 표정은 건드리지 않고 없는 것만 추가 (init_db 의 기본 데이터)
+    # 새 id 는 이 프로세스에서 max(id)+1 부터 매기므로 동시에 여러 개를 실행하지 않음
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        existing = {}  # 이름 -> 가장 작은 id
+        known_ids = set()
+        for character_id, name in connection.execute(select(Character.id, Character.name).order_by(Character.id)):
+            existing.setdefault(name, character_id)
+            known_ids.add(character_id)
+    next_id = max(known_ids, default=0) + 1
+
+    result = {"characters": 0, "inserted": 0, "updated": 0, "skipped": 0, "expressions": 0}
+    characters, expressions = [], []
+    batch_ids = set()
+
+    def flush():
+        if not characters and not expressions:
+            return
+        with engine.begin() as connection:
+            if characters:
+                _upsert(connection, Character.__table__, characters, ["id"], CHARACTER_COLUMNS if update else ())
+            if expressions:
+                _upsert(connection, CharacterExpression.__table__, expressions, ["character_id", "emotion"], ["image_url"] if update else ())
+        result["expressions"] += len(expressions)
+        characters.clear()
+        expressions.clear()
+        batch_ids.clear()
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        record = _parse(line, number)
+        name = record["name"].strip()
+        character_id = record.get("id")
+        if character_id is None:
+            character_id = existing.get(name)
+        if character_id is None:
+            character_id = next_id
+        next_id = max(next_id, character_id + 1)
+
+        exists = character_id in known_ids
+        result["characters"] += 1
+        result[("updated" if update else "skipped") if exists else "inserted"] += 1
+        known_ids.add(character_id)
+        existing.setdefault(name, character_id)
+
+        # 같은 캐릭터가 한 문장 안에 두 번 들어가면 ON CONFLICT 가 실패하므로 먼저 앞 배치를 씀
+        if character_id in batch_ids:
+            flush()
+        batch_ids.add(character_id)
+        if update or not exists:
+            characters.append({
+                "id": character_id,
+                "name": name,
+                "description": record.get("description"),
+                "image_url": record.get("image_url"),
+                "personality": record.get("personality"),
+                "voice_type": record.get("voice_type") or "nova"
+            })
+        for emotion, image_url in (record.get("expressions") or {}).items():
+            expressions.append({"character_id": character_id, "emotion": emotion, "image_url": image_url})
+        if len(batch_ids) >= batch_size:
+            flush()
+    flush()
+
+    if engine.dialect.name == "postgresql" and result["inserted"]:
+        # id 를 직접 넣었으므로 다음 자동 id 가 겹치지 않게 시퀀스를 맞춤
+        with engine.begin() as connection:
+            connection.execute(text("SELECT setval(pg_get_serial_sequence('characters', 'id'), (SELECT MAX(id) FROM characters))"))
+
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def export_characters(engine, out, batch_size=BATCH_SIZE):
+    # 캐릭터와 표정을 id 순 LEFT JOIN 한 번으로 흘려 읽으면서 캐릭터가 바뀔 때마다 한 줄씩 씀
+    columns = [getattr(Character, column) for column in CHARACTER_COLUMNS]
+    query = (
+        select(Character.id, *columns, CharacterExpression.emotion, CharacterExpression.image_url.label("expression_url"))
+        .outerjoin(CharacterExpression, CharacterExpression.character_id == Character.id)
+        .order_by(Character.id)
+    )
+    count = 0
+    record = None
+    with engine.connect() as connection:
+        for row in connection.execution_options(yield_per=batch_size).execute(query):
+            if record is None or record["id"] != row.id:
+                if record is not None:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    count += 1
+                record = {"id": row.id, **{column: getattr(row, column) for column in CHARACTER_COLUMNS}, "expressions": {}}
+            if row.emotion is not None:
+                record["expressions"][row.emotion] = row.expression_url
+    if record is not None:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    #   python character_io.py import characters.ndjson   ('-' 는 표준 입력)
+    #   python character_io.py export -o characters.ndjson   (생략하면 표준 출력)
+    parser = argparse.ArgumentParser(description="Import or export the character catalog as NDJSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("import")
+    load.add_argument("path")
+    load.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    dump = commands.add_parser("export")
+    dump.add_argument("-o", "--output", default="-")
+    dump.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from database import get_engine
+
+    if args.command == "import":
+        source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+        try:
+            print(import_characters(get_engine(), source, args.batch_size), file=sys.stderr)
+        except CatalogFormatError as e:
+            print(f"Import failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+    else:
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            count = export_characters(get_engine(), out, args.batch_size)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"{count} characters exported", file=sys.stderr)
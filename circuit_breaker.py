@@ -0,0 +1,163 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+
+# 업스트림 작업별 서킷 브레이커 설정
+#   BREAKER_ENABLED: 끄려면 false
+#   BREAKER_WINDOW: 판단에 쓰는 최근 호출 수
+#   BREAKER_MIN_CALLS: 창에 이만큼 쌓이기 전에는 열지 않음
+#   BREAKER_FAILURE_RATIO: 실패(연결 오류, 타임아웃, 429, 5xx) 비율이 이 값 이상이면 열림
+#   BREAKER_SLOW_RATIO: 느린 호출 비율이 이 값 이상이면 열림
+#   BREAKER_OPEN_SECONDS: 열린 뒤 시험 호출을 보내기까지 기다리는 시간(초)
+#   BREAKER_PROBES: 반열림 상태에서 동시에 보내는 시험 호출 수, 모두 성공하면 닫힘
+ENABLED = os.getenv("BREAKER_ENABLED", "true").lower() in ("1", "true", "yes")
+WINDOW = int(os.getenv("BREAKER_WINDOW", 20))
+MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 10))
+FAILURE_RATIO = float(os.getenv("BREAKER_FAILURE_RATIO", 0.5))
+SLOW_RATIO = float(os.getenv("BREAKER_SLOW_RATIO", 0.5))
+OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", 15))
+PROBES = int(os.getenv("BREAKER_PROBES", 1))
+
+# 작업별 느린 호출 기준(초). BREAKER_SLOW_CHAT 처럼 환경 변수로 덮어쓸 수 있음
+#   스트리밍은 스트림이 열릴 때(첫 응답)까지의 시간으로 판단
+SLOW_SECONDS = {
+    "chat": 8.0,
+    "emotion": 3.0,
+    "summary": 15.0,
+    "vision": 8.0,
+    "tts": 8.0,
+    "image": 60.0,
+}
+for _operation in SLOW_SECONDS:
+    SLOW_SECONDS[_operation] = float(os.getenv(f"BREAKER_SLOW_{_operation.upper()}", SLOW_SECONDS[_operation]))
+DEFAULT_SLOW_SECONDS = 10.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    def __init__(self, operation, retry_after):
+        super().__init__(f"Upstream {operation} is unavailable")
+        self.operation = operation
+        self.retry_after = retry_after
+
+    def headers(self):
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class CircuitBreaker:
+    # 최근 window 개 호출의 실패/지연 비율이 기준을 넘으면 열려서 open_seconds 동안 호출 없이 바로 CircuitOpen.
+    # 그 뒤 probes 개의 시험 호출만 보내고(반열림), 모두 빠르게 성공하면 닫고 하나라도 실패하거나 느리면 다시 열림
+    def __init__(self, operation, slow_seconds=None, window=WINDOW, min_calls=MIN_CALLS, failure_ratio=FAILURE_RATIO,
+                 slow_ratio=SLOW_RATIO, open_seconds=OPEN_SECONDS, probes=PROBES, enabled=ENABLED):
+        self.operation = operation
+        self.slow_seconds = slow_seconds if slow_seconds is not None else SLOW_SECONDS.get(operation, DEFAULT_SLOW_SECONDS)
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_ratio = slow_ratio
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.calls = deque(maxlen=window)  # (실패, 느림)
+        self.opened_at = 0.0
+        self.probing = 0
+        self.probe_successes = 0
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        # 호출해도 되면 반환, 아니면 CircuitOpen. 허용된 호출은 반드시 record() 나 release() 로 끝냄
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpen(self.operation, remaining)
+                self.state = HALF_OPEN
+                self.probing = 0
+                self.probe_successes = 0
+            if self.state == HALF_OPEN:
+                if self.probing + self.probe_successes >= self.probes:
+                    self.rejected += 1
+                    raise CircuitOpen(self.operation, 1.0)
+                self.probing += 1
+
+    def record(self, seconds, failed):
+        if not self.enabled:
+            return
+        slow = seconds >= self.slow_seconds
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probing = max(0, self.probing - 1)
+                if failed or slow:
+                    self._open()
+                    return
+                self.probe_successes += 1
+                if self.probe_successes >= self.probes:
+                    self.state = CLOSED
+                    self.calls.clear()
+                return
+            if self.state == OPEN:
+                # 열리기 전에 시작한 호출
+                return
+            self.calls.append((failed, slow))
+            if len(self.calls) < self.min_calls:
+                return
+            failures = sum(1 for failed, _ in self.calls if failed)
+            slow_calls = sum(1 for _, slow in self.calls if slow)
+            if failures >= self.failure_ratio * len(self.calls) or slow_calls >= self.slow_ratio * len(self.calls):
+                self._open()
+
+    def release(self):
+        # 결과를 판단할 수 없이 끝난 호출 (동시 호출 한도 초과, 클라이언트가 스트림을 끊음)
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probing = max(0, self.probing - 1)
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.calls.clear()
+        self.probing = 0
+        self.probe_successes = 0
+        self.opened += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "open": self.state != CLOSED,
+                "halfOpen": self.state == HALF_OPEN,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "slowSeconds": self.slow_seconds
+            }
+
+
+class BreakerSet:
+    # 작업 이름 -> CircuitBreaker, 처음 쓰는 작업은 기본 설정으로 만듦
+    def __init__(self, **options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def get(self, operation):
+        with self.lock:
+            breaker = self.breakers.get(operation)
+            if breaker is None:
+                breaker = self.breakers[operation] = CircuitBreaker(operation, **self.options)
+            return breaker
+
+    def stats(self):
+        with self.lock:
+            breakers = dict(self.breakers)
+        return {operation: breaker.stats() for operation, breaker in sorted(breakers.items())}
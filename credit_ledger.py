@@ -0,0 +1,187 @@
+import os
+import time
+import threading
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import User, CreditTransaction
+
+# 새 사용자의 기본 크레딧
+DEFAULT_CREDITS = 100
+# 사용자를 만들 때 처음 잔액을 원장에 남기는 항목의 reason (원장 합계 = users.credits)
+INITIAL_REASON = "initial"
+# credit_transactions.reason 컬럼 길이
+MAX_REASON_LENGTH = CreditTransaction.__table__.c.reason.type.length
+# 다른 워커 프로세스의 변경을 반영하기 위해 캐시된 잔액을 다시 읽는 주기(초)
+BALANCE_CACHE_TTL = float(os.getenv("CREDIT_BALANCE_CACHE_TTL", 5))
+# set_balance 가 다른 변경과 겹쳤을 때 다시 시도하는 횟수
+SET_BALANCE_ATTEMPTS = 20
+
+
+class InsufficientCredits(Exception):
+    def __init__(self, balance):
+        super().__init__("Insufficient credits")
+        self.balance = balance
+
+
+class BalanceCache:
+    # username -> (users.id, 잔액, 기록 시각). 원자적 UPDATE ... RETURNING 결과로만 갱신됨
+    def __init__(self, ttl=BALANCE_CACHE_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, username):
+        with self.lock:
+            entry = self.entries.get(username)
+        if entry is None or time.monotonic() - entry[2] > self.ttl:
+            return None
+        return entry[0], entry[1]
+
+    def user_id(self, username):
+        with self.lock:
+            entry = self.entries.get(username)
+        return entry[0] if entry else None
+
+    def set(self, username, user_id, balance):
+        with self.lock:
+            self.entries[username] = (user_id, balance, time.monotonic())
+
+
+balances = BalanceCache()
+
+
+def _insert_ignore(session, table):
+    # 이미 있으면 아무것도 하지 않는 INSERT (PostgreSQL/SQLite 의 ON CONFLICT DO NOTHING)
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    return insert(table).prefix_with("IGNORE")
+
+
+def ensure_user(session, username, initial=DEFAULT_CREDITS):
+    # 동시에 같은 사용자를 만들어도 unique 제약 오류 없이 users.id 반환
+    # 실제로 만든 쪽만 같은 트랜잭션에서 처음 잔액을 원장에 기록함
+    user_id = balances.user_id(username)
+    if user_id is not None:
+        return user_id
+
+    row = session.execute(select(User.id, User.credits).where(User.username == username)).first()
+    if row is None:
+        try:
+            created = session.execute(_insert_ignore(session, User).values(username=username, credits=initial)).rowcount
+            row = session.execute(select(User.id, User.credits).where(User.username == username)).one()
+            if created:
+                session.execute(insert(CreditTransaction).values(
+                    user_id=row.id,
+                    amount=initial,
+                    balance_after=initial,
+                    reason=INITIAL_REASON
+                ))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+    balances.set(username, row.id, row.credits)
+    return row.id
+
+
+def _apply(session, username, statement, amount, reason):
+    # 잔액 UPDATE 와 원장 INSERT 를 한 트랜잭션으로 실행, 조건에 맞지 않으면 None
+    user_id = ensure_user(session, username)
+    try:
+        balance = session.execute(
+            statement.where(User.id == user_id).returning(User.credits),
+            execution_options={"synchronize_session": False}
+        ).scalar_one_or_none()
+        if balance is None:
+            session.rollback()
+            return user_id, None
+
+        session.execute(insert(CreditTransaction).values(
+            user_id=user_id,
+            amount=amount,
+            balance_after=balance,
+            reason=reason
+        ))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    balances.set(username, user_id, balance)
+    return user_id, balance
+
+
+def debit(session, username, amount, reason=None):
+    # 잔액이 충분할 때만 차감: UPDATE users SET credits = credits - n WHERE credits >= n
+    statement = update(User).where(User.credits >= amount).values(credits=User.credits - amount)
+    _, balance = _apply(session, username, statement, -amount, reason)
+    if balance is None:
+        raise InsufficientCredits(get_balance(session, username, fresh=True))
+    return balance
+
+
+def credit(session, username, amount, reason=None):
+    statement = update(User).values(credits=User.credits + amount)
+    _, balance = _apply(session, username, statement, amount, reason)
+    return balance
+
+
+def set_balance(session, username, credits, reason="set"):
+    # 기존 save-credits 처럼 잔액을 특정 값으로 맞춤. 원장에는 차이만큼 기록
+    # SQLite 에서는 SELECT ... FOR UPDATE 가 잠그지 않으므로, 읽은 잔액이 그대로일 때만 바꾸는 UPDATE 로 맞추고
+    # 그 사이 다른 변경이 끼어들었으면 다시 읽어서 재시도함 (차이가 항상 실제로 바뀐 양과 같음)
+    user_id = ensure_user(session, username, initial=credits)
+    for _ in range(SET_BALANCE_ATTEMPTS):
+        try:
+            previous = session.execute(select(User.credits).where(User.id == user_id)).scalar_one()
+            if previous == credits:
+                session.rollback()
+                break
+            updated = session.execute(
+                update(User).where(User.id == user_id, User.credits == previous).values(credits=credits).returning(User.id),
+                execution_options={"synchronize_session": False}
+            ).scalar_one_or_none()
+            if updated is None:
+                session.rollback()
+                continue
+            session.execute(insert(CreditTransaction).values(
+                user_id=user_id,
+                amount=credits - previous,
+                balance_after=credits,
+                reason=reason
+            ))
+            session.commit()
+            break
+        except Exception:
+            session.rollback()
+            raise
+    else:
+        raise RuntimeError("Balance kept changing while setting it, try again")
+
+    balances.set(username, user_id, credits)
+    return credits
+
+
+def get_balance(session, username, fresh=False):
+    if not fresh:
+        cached = balances.get(username)
+        if cached is not None:
+            return cached[1]
+
+    user_id = ensure_user(session, username)
+    balance = session.execute(select(User.credits).where(User.id == user_id)).scalar_one()
+    balances.set(username, user_id, balance)
+    return balance
+
+
+def transactions(session, username, limit=50, before=None):
+    # 최근 거래 내역 (최신 순). before 로 이전 페이지를 이어서 조회
+    user_id = ensure_user(session, username)
+    query = select(CreditTransaction).where(CreditTransaction.user_id == user_id)
+    if before is not None:
+        query = query.where(CreditTransaction.id < before)
+    query = query.order_by(CreditTransaction.id.desc()).limit(limit)
+    return session.execute(query).scalars().all()
@@ -1,119 +1,210 @@
 import os
-from sqlalchemy import create_engine
+import time
+import threading
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 from dotenv import load_dotenv
 
 # 환경 변수 로드
 load_dotenv()
 
-# 데이터베이스 URL 가져오기
-DATABASE_URL = os.environ.get("DATABASE_URL")
-if DATABASE_URL is None:
-    raise ValueError("DATABASE_URL 환경 변수가 설정되지 않았습니다.")
+# 연결 풀 설정
+#   DB_POOL_SIZE / DB_MAX_OVERFLOW: 유지할 연결 수와 순간적으로 더 열 수 있는 연결 수
+#   DB_POOL_TIMEOUT: 빈 연결을 기다리는 최대 시간(초)
+#   DB_POOL_RECYCLE: 이 시간(초)보다 오래된 연결은 다시 연결 (서버/프록시의 유휴 연결 끊김 방지)
+#   DB_POOL_PRE_PING: 연결을 꺼낼 때마다 살아있는지 확인
+#   DB_STATEMENT_TIMEOUT_MS: 쿼리 하나의 최대 실행 시간 (PostgreSQL statement_timeout, SQLite 는 잠금 대기 시간)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 15000))
+
+
+class PoolMetrics:
+    # 연결을 꺼내는 데 걸린 시간과 풀 포화 상태 집계
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    def record(self, wait_ms, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "checkoutWaitAvgMs": round(self.wait_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "checkoutWaitMaxMs": round(self.wait_max_ms, 3)
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    # 연결을 꺼낼 때(대기 + 새 연결 생성 포함) 걸린 시간을 pool_metrics 에 기록
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            pool_metrics.record(0, timed_out=True)
+            raise
+        pool_metrics.record((time.perf_counter() - started) * 1000)
+        return connection
+
+
+def engine_options(url):
+    url = make_url(url)
+    options = {"pool_pre_ping": POOL_PRE_PING}
+    backend = url.get_backend_name()
+
+    if backend == "sqlite":
+        # SQLite 는 statement_timeout 이 없으므로 잠금 대기 시간(timeout)으로 대신함
+        connect_args = {"timeout": STATEMENT_TIMEOUT_MS / 1000, "check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # 메모리 DB 는 연결 하나를 모든 스레드가 공유해야 같은 데이터를 봄
+            options.update(poolclass=StaticPool, connect_args=connect_args)
+            return options
+        options["connect_args"] = connect_args
+    elif backend == "postgresql":
+        options["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE
+    )
+    return options
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_engine_hooks = []
+
+
+def get_engine():
+    # 엔진은 처음 필요할 때 만듦. DATABASE_URL 이 없어도 모듈은 가져올 수 있음
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                database_url = os.environ.get("DATABASE_URL")
+                if database_url is None:
+                    raise ValueError("DATABASE_URL 환경 변수가 설정되지 않았습니다.")
+                engine = create_engine(database_url, **engine_options(database_url))
+                for fn in _engine_hooks:
+                    fn(engine)
+                _engine = engine
+    return _engine
+
+
+def on_engine(fn):
+    # 엔진이 만들어지면 fn(engine) 호출 (이미 있으면 바로 호출). 이벤트 리스너 등록용
+    with _engine_lock:
+        if _engine is None:
+            _engine_hooks.append(fn)
+            return
+    fn(_engine)
+
+
+def __getattr__(name):
+    # from database import engine 은 그 시점에 엔진을 만듦
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(name)
+
+
+class LazySession(Session):
+    # 바인딩이 없으면 get_engine() 을 사용하는 세션
+    def get_bind(self, mapper=None, **kwargs):
+        if self.bind is None:
+            self.bind = get_engine()
+        return super().get_bind(mapper, **kwargs)
 
-# 엔진 생성
-engine = create_engine(str(DATABASE_URL))
 
 # 세션 생성
-db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+db_session = scoped_session(sessionmaker(class_=LazySession, autocommit=False, autoflush=False))
 
 # Base 클래스 생성
 Base = declarative_base()
 Base.query = db_session.query_property()
 
-def init_db():
-    # 모델 가져오기
-    import models
-    
-    # 테이블 생성
-    Base.metadata.create_all(bind=engine)
-    
-    # 잠시 대기 (테이블 생성 확인)
-    import time
-    time.sleep(1)
-    
-    # 기본 캐릭터 데이터 추가
-    add_default_characters()
-
-def add_default_characters():
-    from models import Character, CharacterExpression
-    
-    # 이미 데이터가 있는지 확인
-    existing_characters = db_session.query(Character).all()
-    if existing_characters:
-        # 이미 데이터가 있으면 추가하지 않음
-        return
-    
-    # 기본 캐릭터 데이터
-    characters = [
-        {
-            "name": "미카",
-            "description": "활발하고 친절한 성격의 10대 소녀. 긍정적인 에너지를 가지고 있으며, 친구들을 격려하는 것을 좋아합니다.",
-            "image_url": "/assets/mika.png",
-            "personality": {
-                "type": "Friendly",
-                "traits": ["positive", "enthusiastic", "caring"],
-                "background": "고등학교 학생회장. 예술과 음악을 좋아합니다.",
-                "speechStyle": "친근하고 활기차게 말합니다. 종종 \"-다요!\" 라는 말투를 사용해요."
-            },
-            "voice_type": "nova"
-        },
-        {
-            "name": "유키",
-            "description": "조용하고 사려 깊은 대학생. 책을 읽는 것을 좋아하며, 깊은 철학적 대화를 나누는 것을 즐깁니다.",
-            "image_url": "/assets/yuki.png",
-            "personality": {
-                "type": "Thoughtful",
-                "traits": ["calm", "philosophical", "intelligent"],
-                "background": "문학을 전공하는 대학생. 카페에서 일하며 소설을 쓰고 있습니다.",
-                "speechStyle": "조용하고 신중하게 말합니다. 때때로 책에서 인용구를 사용합니다."
-            },
-            "voice_type": "alloy"
-        },
-        {
-            "name": "타로",
-            "description": "열정적이고 에너지가 넘치는 10대 소년. 스포츠와 모험을 좋아합니다.",
-            "image_url": "/assets/taro.png",
-            "personality": {
-                "type": "Energetic",
-                "traits": ["passionate", "brave", "competitive"],
-                "background": "고등학교 농구부 주장. 프로 선수가 되는 것이 꿈입니다.",
-                "speechStyle": "자신감 있고 열정적으로 말합니다. 종종 \"-다고!\" 라는 말투를 사용해요."
-            },
-            "voice_type": "onyx"
+def pool_status():
+    # 현재 풀 상태와 연결 대기 시간 통계
+    pool = get_engine().pool
+    status = pool_metrics.snapshot()
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + max(MAX_OVERFLOW, 0)
+        status.update({
+            "size": pool.size(),
+            "checkedOut": pool.checkedout(),
+            "checkedIn": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": round(pool.checkedout() / capacity, 3) if capacity else 0.0
+        })
+    return status
+
+def ping():
+    # SELECT 1 왕복 시간(ms)
+    started = time.perf_counter()
+    with get_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+    return (time.perf_counter() - started) * 1000
+
+def create_schema():
+    # 테이블 생성. 워커가 뜰 때마다 하지 않고 배포 시 한 번만 실행 (python init_db.py 또는 flask --app server init-db)
+    # 모델은 models.py 의 Base 에 등록되어 있음
+    from models import Base as ModelBase
+    engine = get_engine()
+    ModelBase.metadata.create_all(bind=engine)
+    upgrade_schema(engine, ModelBase.metadata)
+
+def upgrade_schema(engine, metadata):
+    # create_all 은 이미 있는 테이블에 새 인덱스를 추가하지 않으므로 빠진 인덱스만 만듦
+    from models import CharacterExpression
+    with engine.begin() as connection:
+        existing = {
+            table.name: {index["name"] for index in inspect(connection).get_indexes(table.name)}
+            for table in metadata.sorted_tables
         }
-    ]
-    
-    # 캐릭터 추가
-    for char_data in characters:
-        character = Character(
-            name=char_data["name"],
-            description=char_data["description"],
-            image_url=char_data["image_url"],
-            personality=char_data["personality"],
-            voice_type=char_data["voice_type"]
-        )
-        db_session.add(character)
-    
-    # 저장
-    db_session.commit()
-    
-    # 이제 캐릭터별 표정 데이터 추가
-    # 현재는 모든 캐릭터가 동일한 이미지를 사용하므로 간단하게 설정
-    characters = db_session.query(Character).all()
-    emotions = ["happy", "sad", "angry", "surprised", "neutral", "embarrassed", "thoughtful", "excited", "nervous"]
-    
-    for character in characters:
-        base_image = character.image_url
-        
-        for emotion in emotions:
-            expression = CharacterExpression(
-                character_id=character.id,
-                emotion=emotion,
-                image_url=base_image  # 현재는 동일한 이미지 사용, 나중에 다양한 이미지로 업데이트 가능
-            )
-            db_session.add(expression)
-    
-    # 저장
-    db_session.commit()
\ No newline at end of file
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in existing[table.name]:
+                    continue
+                if table.name == CharacterExpression.__tablename__ and index.unique:
+                    # unique 인덱스를 만들기 전에 (캐릭터, 감정) 중복 행은 가장 최근 것만 남김
+                    connection.execute(text(
+                        "DELETE FROM character_expressions WHERE id NOT IN "
+                        "(SELECT MAX(id) FROM character_expressions GROUP BY character_id, emotion)"
+                    ))
+                print(f"인덱스 생성: {index.name}")
+                index.create(connection)
+        # 처음 잔액 항목이 없는 기존 사용자는 원장 합계가 users.credits 와 맞도록 차이만큼 'initial' 항목을 추가
+        connection.execute(text(
+            "INSERT INTO credit_transactions (user_id, amount, balance_after, reason, created_at) "
+            "SELECT users.id, users.credits - COALESCE(SUM(credit_transactions.amount), 0), "
+            "users.credits - COALESCE(SUM(credit_transactions.amount), 0), 'initial', users.created_at "
+            "FROM users LEFT JOIN credit_transactions ON credit_transactions.user_id = users.id "
+            "WHERE NOT EXISTS (SELECT 1 FROM credit_transactions AS opening "
+            "WHERE opening.user_id = users.id AND opening.reason = 'initial') "
+            "GROUP BY users.id, users.credits, users.created_at"
+        ))
@@ -0,0 +1,204 @@
+import re
+import numpy as np
+
+# 캐릭터 표정(CharacterExpression)과 채팅 응답에서 사용하는 감정 목록
+EMOTIONS = ["happy", "sad", "angry", "surprised", "neutral", "embarrassed", "thoughtful", "excited", "nervous"]
+
+# 감정별 어휘 사전 (한국어/영어). 한국어는 어간 단위 부분 문자열로 매칭하고,
+# 영어는 단어 경계로 매칭함. 값은 가중치.
+LEXICON = {
+    "happy": {
+        "기뻐": 1.0, "기쁘": 1.0, "기쁨": 1.0, "좋아": 0.8, "좋은": 0.5, "좋네": 0.8, "행복": 1.2, "반가": 1.0,
+        "웃": 0.6, "즐거": 1.0, "재밌": 0.8, "재미있": 0.8, "고마": 0.8, "감사": 0.7, "다행": 0.8, "사랑": 0.9,
+        "ㅋㅋ": 0.8, "ㅎㅎ": 0.8, "^^": 0.8, "😊": 1.0, "😄": 1.0, "🙂": 0.8, "❤": 0.8,
+        "happy": 1.2, "glad": 1.0, "great": 0.7, "good": 0.4, "love": 0.9, "fun": 0.7, "smile": 0.8,
+        "thanks": 0.7, "thank you": 0.8, "nice": 0.6, "joy": 1.0, "lovely": 0.8, "pleased": 0.9, "yay": 0.9
+    },
+    "sad": {
+        "슬퍼": 1.2, "슬프": 1.2, "슬픔": 1.2, "우울": 1.2, "눈물": 1.0, "아쉽": 0.8, "아쉬": 0.8, "외로": 1.0,
+        "속상": 1.0, "안타깝": 0.9, "안타까": 0.9, "미안": 0.6, "힘들": 0.8, "그리워": 0.9, "보고 싶": 0.6,
+        "ㅠㅠ": 1.0, "ㅜㅜ": 1.0, "ㅠ": 0.5, "😢": 1.2, "😭": 1.2,
+        "sad": 1.2, "sorry": 0.6, "miss": 0.7, "cry": 1.0, "crying": 1.0, "lonely": 1.0, "unhappy": 1.2,
+        "depressed": 1.2, "heartbroken": 1.3, "upset": 0.8, "tears": 1.0
+    },
+    "angry": {
+        "화나": 1.2, "화났": 1.2, "화가": 1.2, "화를": 1.0, "짜증": 1.2, "싫어": 0.8, "열받": 1.2, "분노": 1.3, "못마땅": 1.0,
+        "어이없": 0.9, "용서": 0.6, "흥": 0.5, "😠": 1.2, "😡": 1.3,
+        "angry": 1.2, "mad": 1.0, "annoyed": 1.0, "annoying": 0.9, "hate": 1.0, "furious": 1.4, "rage": 1.3,
+        "irritated": 1.0, "stop it": 0.7, "how dare": 1.1
+    },
+    "surprised": {
+        "놀라": 1.1, "놀랐": 1.1, "놀람": 1.1, "깜짝": 1.2, "헉": 1.0, "헐": 0.9, "믿기지": 1.0, "뜻밖": 1.0,
+        "정말?": 0.7, "진짜?": 0.7, "어머": 0.9, "세상에": 0.9, "와우": 0.8, "😮": 1.2, "😲": 1.2, "?!": 0.8,
+        "surprised": 1.2, "surprise": 1.0, "wow": 0.8, "whoa": 1.0, "really?": 0.6, "no way": 1.0,
+        "unbelievable": 1.0, "shocked": 1.2, "omg": 0.9
+    },
+    "embarrassed": {
+        "부끄": 1.3, "창피": 1.2, "민망": 1.2, "쑥스": 1.2, "당황": 0.9, "에구": 0.6, "앗": 0.5, "쪽팔": 1.2,
+        "얼굴이 빨개": 1.3, "😳": 1.3, "///": 1.0,
+        "embarrassed": 1.3, "embarrassing": 1.2, "blush": 1.2, "blushing": 1.2, "shy": 1.0, "awkward": 0.9,
+        "flustered": 1.2
+    },
+    "thoughtful": {
+        "생각": 0.8, "고민": 0.9, "글쎄": 1.0, "아마": 0.6, "흠": 0.8, "음..": 0.8, "이해": 0.5, "그렇군": 0.8,
+        "어쩌면": 0.8, "궁금": 0.6, "흥미": 0.6, "의미": 0.6, "🤔": 1.2, "...": 0.4,
+        "think": 0.7, "thinking": 0.8, "perhaps": 0.8, "maybe": 0.6, "wonder": 0.9, "hmm": 1.0,
+        "consider": 0.8, "interesting": 0.6, "i suppose": 0.8, "curious": 0.6, "ponder": 1.0
+    },
+    "excited": {
+        "신나": 1.2, "신난": 1.2, "흥분": 1.1, "최고": 1.0, "대박": 1.1, "두근": 1.1, "설레": 1.1, "설렘": 1.1, "기대": 0.9,
+        "멋진": 0.8, "멋있": 0.8, "굉장": 1.0, "환상적": 1.1, "완벽": 0.8, "와아": 1.0, "빨리": 0.4,
+        "!!": 0.8, "🎉": 1.2, "✨": 0.8, "🤩": 1.3,
+        "excited": 1.3, "exciting": 1.2, "amazing": 1.0, "awesome": 1.0, "can't wait": 1.2, "cannot wait": 1.2,
+        "let's go": 1.0, "incredible": 1.0, "thrilled": 1.3, "yes!": 0.8
+    },
+    "nervous": {
+        "긴장": 1.2, "불안": 1.2, "걱정": 1.1, "두려": 1.1, "조마조마": 1.3, "떨려": 1.1, "떨리": 1.1, "겁나": 1.1,
+        "무서": 1.0, "무섭": 1.0, "어떡해": 1.0, "어떡하": 1.0, "😰": 1.3, "😬": 1.0,
+        "nervous": 1.3, "worried": 1.1, "worry": 1.0, "anxious": 1.2, "scared": 1.1, "afraid": 1.1,
+        "uh oh": 1.0, "oh no": 0.8, "what if": 0.7
+    }
+}
+
+# 다른 단어의 앞부분이 되는 짧은 감탄사/어간은 바로 뒤에 이 글자들이 오면 매칭하지 않음
+# 한국어는 어미가 띄어쓰기 없이 붙으므로("화가났어", "흠흠") 단어 경계는 요구하지 않음
+EXCLUDED_FOLLOWERS = {
+    "흥": ("분", "미", "정", "행"),
+    "어머": ("니", "님"),
+    "화가": ("예요", "에요", "입니다", "였", "이다", "이에요", "들"),
+    "헐": ("렁", "거", "값", "뜯", "벗"),
+    "흠": ("뻑", "집", "모", "잡"),
+    "앗": ("아",),
+}
+
+# 바로 앞에 오면 매칭된 감정 표현을 무시하는 부정어, 가중치를 키우는 강조어
+NEGATION_RE = re.compile(r"(?:\bnot|\bno|\bnever|n't|\b안|\b못|\b별로)\s*$")
+INTENSIFIER_RE = re.compile(r"(?:\bvery|\bso|\breally|\btoo|너무|정말|진짜|완전|엄청|되게)\s*$")
+CONTEXT_CHARS = 12
+INTENSIFIER_WEIGHT = 1.5
+
+# 최고 점수가 이 값보다 낮으면 neutral
+SCORE_THRESHOLD = 0.5
+
+
+def _is_word_term(term):
+    return term[0].isascii() and term[0].isalpha() and term[-1].isascii() and term[-1].isalnum()
+
+
+def _excluded(followers):
+    return f"(?!{'|'.join(re.escape(follower) for follower in followers)})" if followers else ""
+
+
+class EmotionEngine:
+    # 어휘 사전 기반 감정 분류기. 사전의 각 항목을 하나의 특징(feature)으로 보고
+    # 텍스트별 등장 횟수 벡터에 (특징 x 감정) 가중치 행렬을 곱해 감정 점수를 계산함.
+    def __init__(self, lexicon=LEXICON, emotions=EMOTIONS, threshold=SCORE_THRESHOLD, excluded=EXCLUDED_FOLLOWERS):
+        self.emotions = list(emotions)
+        self.threshold = threshold
+        self.neutral_index = self.emotions.index("neutral")
+
+        self.terms = []
+        for words in lexicon.values():
+            for term in words:
+                if term not in self.terms:
+                    self.terms.append(term)
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+
+        self.weights = np.zeros((len(self.terms), len(self.emotions)), dtype=np.float32)
+        for emotion, words in lexicon.items():
+            for term, weight in words.items():
+                self.weights[self.term_index[term], self.emotions.index(emotion)] = weight
+
+        # 모든 항목을 하나의 정규식으로 한 번에 찾음. 첫 글자별로 묶고(긴 항목 우선)
+        # 첫 글자 집합에 대한 전방 탐색을 앞에 두어 해당 없는 위치는 바로 건너뜀
+        groups = {}
+        for term in sorted(self.terms, key=len, reverse=True):
+            groups.setdefault(term[0], []).append(term)
+        alternatives = []
+        for first, terms in groups.items():
+            head = (r"\b" if first.isascii() and first.isalpha() else "") + re.escape(first)
+            rests = [re.escape(term[1:]) + (r"\b" if _is_word_term(term) else "") + _excluded(excluded.get(term)) for term in terms]
+            alternatives.append(f"{head}(?:{'|'.join(rests)})")
+        first_chars = "".join(re.escape(first) for first in groups)
+        self.pattern = re.compile(f"(?=[{first_chars}])(?:{'|'.join(alternatives)})")
+
+    def features(self, text):
+        # (특징 인덱스, 가중치 배수) 목록을 돌려줌
+        lowered = text.lower()
+        found = []
+        for match in self.pattern.finditer(lowered):
+            context = lowered[max(0, match.start() - CONTEXT_CHARS):match.start()]
+            if NEGATION_RE.search(context):
+                continue
+            multiplier = INTENSIFIER_WEIGHT if INTENSIFIER_RE.search(context) else 1.0
+            found.append((self.term_index[match.group(0)], multiplier))
+        return found
+
+    def score_batch(self, texts):
+        # (텍스트 수 x 감정 수) 점수 행렬. 매칭된 항목들의 가중치 행을 모아 텍스트별로 합산함
+        rows, cols, multipliers = [], [], []
+        for row, text in enumerate(texts):
+            for col, multiplier in self.features(text or ""):
+                rows.append(row)
+                cols.append(col)
+                multipliers.append(multiplier)
+
+        scores = np.zeros((len(texts), len(self.emotions)), dtype=np.float32)
+        if rows:
+            contributions = self.weights[cols] * np.asarray(multipliers, dtype=np.float32)[:, None]
+            np.add.at(scores, np.asarray(rows), contributions)
+        return scores
+
+    def classify_batch(self, texts):
+        if not texts:
+            return []
+        scores = self.score_batch(texts)
+        best = scores.argmax(axis=1)
+        best[scores.max(axis=1) < self.threshold] = self.neutral_index
+        return [self.emotions[i] for i in best]
+
+    def classify(self, text):
+        return self.classify_batch([text])[0]
+
+    def analyze(self, text):
+        # assets/js/emotion-analyzer.js 의 분석 결과와 같은 형태
+        scores = self.score_batch([text])[0]
+        max_score = float(scores.max())
+        primary = self.emotions[int(scores.argmax())] if max_score >= self.threshold else "neutral"
+
+        secondary = []
+        if max_score >= self.threshold:
+            secondary = [
+                emotion for emotion, score in zip(self.emotions, scores)
+                if emotion != primary and score >= max_score * 0.7
+            ]
+
+        confidence = min(0.5 + max_score * 0.1, 0.9)
+        return {
+            "primary": primary,
+            "confidence": round(confidence, 3),
+            "intensity": round(confidence * 0.8, 3),
+            "secondary_emotions": secondary,
+            "scores": {emotion: round(float(score), 3) for emotion, score in zip(self.emotions, scores) if score > 0}
+        }
+
+
+engine = EmotionEngine()
+
+
+def normalize_emotion(value):
+    # 모델이 돌려준 감정 문자열을 EMOTIONS 중 하나로 정리, 알 수 없으면 None
+    if not value:
+        return None
+    word = re.sub(r"[^a-z]", "", value.strip().lower())
+    return word if word in EMOTIONS else None
+
+
+def classify_emotion(text):
+    if not text:
+        return "neutral"
+    return engine.classify(text)
+
+
+def classify_emotions(texts):
+    return engine.classify_batch(texts)
@@ -0,0 +1,256 @@
+import io
+import os
+import time
+import uuid
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageEnhance, ImageOps
+from sqlalchemy.exc import IntegrityError
+from models import Character, CharacterExpression
+
+# 표정 변형 생성 작업 설정
+#   EXPRESSION_WORKERS: 변형 이미지를 동시에 생성하는 워커 수
+#   EXPRESSION_GENERATOR: "openai" 는 이미지 API, "stub" 은 로컬에서 기준 이미지를 변형 (테스트/개발용)
+WORKERS = int(os.getenv("EXPRESSION_WORKERS", 4))
+GENERATOR = os.getenv("EXPRESSION_GENERATOR", "openai")
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+# 끝난 작업은 이 개수만큼만 조회용으로 보관
+MAX_FINISHED_JOBS = 1000
+
+EXPRESSION_PROMPT = (
+    "Redraw this anime character with a clearly {emotion} facial expression. "
+    "Keep the same character design, outfit, art style, framing and background."
+)
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def as_png(data):
+    # 편집 API 에는 PNG 로 보냄. JPEG/WebP 등은 Pillow 로 방향을 바로잡고 PNG 로 다시 인코딩. 이미지가 아니면 ValueError
+    if data.startswith(PNG_SIGNATURE):
+        return data
+    try:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    except Exception as e:
+        raise ValueError(f"Invalid image: {str(e)}")
+    output = io.BytesIO()
+    image.convert("RGBA" if "A" in image.getbands() else "RGB").save(output, format="PNG")
+    return output.getvalue()
+
+
+class OpenAIExpressionGenerator:
+    # 기준 이미지가 있으면 편집 API, 없으면 캐릭터 설명으로 새로 생성. PNG 바이트 반환
+    def __init__(self, client, call):
+        self.client = client
+        self.call = call
+
+    def __call__(self, character, emotion, base_image):
+        prompt = EXPRESSION_PROMPT.format(emotion=emotion)
+        if base_image is not None:
+            response = self.call(
+                "image",
+                self.client.images.edit,
+                model="gpt-image-1",
+                image=("base.png", as_png(base_image), "image/png"),
+                prompt=prompt,
+                size="1024x1024",
+                n=1,
+            )
+        else:
+            response = self.call(
+                "image",
+                self.client.images.generate,
+                model="gpt-image-1",
+                prompt=f"{character['description'] or character['name']}. {prompt}",
+                size="1024x1024",
+                n=1,
+            )
+        return base64.b64decode(response.data[0].b64_json)
+
+
+class StubExpressionGenerator:
+    # 업스트림 없이 감정마다 색조를 바꾼 이미지를 만듦
+    TINTS = {
+        "happy": (255, 214, 90), "sad": (90, 130, 220), "angry": (220, 70, 60),
+        "surprised": (250, 160, 40), "neutral": (180, 180, 180), "confused": (160, 110, 200),
+        "love": (245, 120, 170), "shy": (250, 170, 160), "excited": (120, 220, 120),
+        "embarrassed": (240, 130, 140), "thoughtful": (120, 170, 160), "nervous": (200, 200, 110)
+    }
+
+    def __init__(self, delay=0.0, size=256):
+        self.delay = delay
+        self.size = size
+
+    def __call__(self, character, emotion, base_image):
+        time.sleep(self.delay)
+        if base_image is not None:
+            image = Image.open(io.BytesIO(base_image)).convert("RGB")
+            image.thumbnail((self.size, self.size))
+        else:
+            image = Image.new("RGB", (self.size, self.size), (255, 255, 255))
+        tint = self.TINTS.get(emotion, (128, 128, 128))
+        image = ImageOps.colorize(ImageOps.grayscale(image), black=(0, 0, 0), white=tint)
+        image = ImageEnhance.Contrast(image).enhance(1.2)
+        output = io.BytesIO()
+        image.save(output, format="PNG")
+        return output.getvalue()
+
+
+class ExpressionJob:
+    def __init__(self, key, character_id, emotions):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.character_id = character_id
+        self.emotions = emotions
+        self.status = "queued"
+        self.results = {}
+        self.errors = {}
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        done = len(self.results) + len(self.errors)
+        return {
+            "jobId": self.id,
+            "characterId": self.character_id,
+            "status": self.status,
+            "progress": {"completed": done, "total": len(self.emotions)},
+            "expressions": dict(self.results),
+            "errors": dict(self.errors),
+            "createdAt": self.created_at,
+            "finishedAt": self.finished_at
+        }
+
+
+def resolve_base_image(image_url):
+    # 캐릭터 image_url 이 이 서버의 정적 파일이면 그 내용을 기준 이미지로 사용
+    if not image_url or "://" in image_url:
+        return None
+    path = os.path.normpath(os.path.join(ROOT_DIR, image_url.lstrip("/")))
+    if not path.startswith(ROOT_DIR + os.sep) or not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class ExpressionJobQueue:
+    # 캐릭터 표정 변형 생성 작업. 요청 스레드는 작업을 등록만 하고, 감정별 생성은 워커 풀에서 병렬로 진행.
+    # 같은 (캐릭터, 감정 목록, 기준 이미지) 작업이 진행 중이면 새로 만들지 않고 기존 작업을 돌려줌.
+    # 결과 이미지는 ImageStore 에 저장하고 그 URL 을 CharacterExpression.image_url 에 기록
+    def __init__(self, session, generator, store, workers=WORKERS):
+        self.session = session
+        self.generator = generator
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="expression")
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()  # job id -> ExpressionJob
+        self.in_flight = {}  # 작업 키 -> ExpressionJob
+        self.deduplicated = 0
+        self.generated = 0
+        self.failed = 0
+
+    def submit(self, character_id, emotions, base_image=None):
+        # (작업 상태 dict, 새로 만들었는지). 캐릭터가 없으면 LookupError
+        character = self.session.get(Character, character_id)
+        if character is None:
+            raise LookupError(f"Character {character_id} not found")
+        if base_image is None:
+            base_image = resolve_base_image(character.image_url)
+        snapshot = {"id": character.id, "name": character.name, "description": character.description}
+
+        emotions = list(dict.fromkeys(emotions))
+        if not emotions:
+            raise ValueError("No emotions requested")
+        digest = hashlib.sha1(base_image).hexdigest() if base_image is not None else ""
+        key = (character_id, tuple(sorted(emotions)), digest)
+        with self.lock:
+            job = self.in_flight.get(key)
+            if job is not None:
+                self.deduplicated += 1
+                return job.to_dict(), False
+            job = ExpressionJob(key, character_id, emotions)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+            status = job.to_dict()
+
+        for emotion in emotions:
+            self.executor.submit(self._generate, job, snapshot, emotion, base_image)
+        return status, True
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def _generate(self, job, character, emotion, base_image):
+        with self.lock:
+            job.status = "running"
+        try:
+            data = self.generator(character, emotion, base_image)
+            url = self.store.put(data)["url"]
+            self._record(job.character_id, emotion, url)
+        except Exception as e:
+            print(f"Error generating {emotion} expression for character {job.character_id}: {str(e)}")
+            with self.lock:
+                self.failed += 1
+                job.errors[emotion] = str(e)
+        else:
+            with self.lock:
+                self.generated += 1
+                job.results[emotion] = url
+        finally:
+            self.session.remove()
+            self._finish_if_done(job)
+
+    def _record(self, character_id, emotion, url):
+        # (character_id, emotion) 은 unique. 다른 워커가 먼저 추가했으면 한 번 더 시도해서 그 행을 갱신
+        for attempt in range(2):
+            expression = self.session.query(CharacterExpression).filter_by(character_id=character_id, emotion=emotion).first()
+            if expression is None:
+                expression = CharacterExpression(character_id=character_id, emotion=emotion)
+                self.session.add(expression)
+            expression.image_url = url
+            try:
+                self.session.commit()
+                return
+            except IntegrityError:
+                self.session.rollback()
+                if attempt:
+                    raise
+            except Exception:
+                self.session.rollback()
+                raise
+
+    def _finish_if_done(self, job):
+        with self.lock:
+            if len(job.results) + len(job.errors) < len(job.emotions):
+                return
+            job.status = "failed" if job.errors and not job.results else "done"
+            job.finished_at = time.time()
+            self.in_flight.pop(job.key, None)
+            finished = [job_id for job_id, queued in self.jobs.items() if queued.finished_at is not None]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[job_id]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "jobs": len(self.jobs),
+                "inFlight": len(self.in_flight),
+                "deduplicated": self.deduplicated,
+                "generated": self.generated,
+                "failed": self.failed
+            }
+
+
+def create_generator(name, client, call):
+    if name == "stub":
+        return StubExpressionGenerator()
+    return OpenAIExpressionGenerator(client, call)
@@ -0,0 +1,165 @@
+import os
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 대화 기록 압축 설정
+#   CHAT_HISTORY_TOKEN_BUDGET: 모델에 그대로 보내는 최근 대화의 최대 토큰 수(추정치)
+#   CHAT_SUMMARY_MAX_TOKENS: 오래된 대화를 접은 요약의 최대 길이
+#   CHAT_SUMMARY_WORKERS: 요약을 만드는 백그라운드 스레드 수. 0 이면 요청 스레드에서 바로 요약함
+TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 2000))
+SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", 300))
+SUMMARY_WORKERS = int(os.getenv("CHAT_SUMMARY_WORKERS", 2))
+# 예산을 넘으면 이 비율까지 줄여서, 매 턴마다 요약을 다시 만들지 않게 함
+LOW_WATERMARK = 0.6
+MAX_CONVERSATIONS = 10000
+
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    # 토크나이저 없이 쓰는 보수적인 추정: 영문은 4글자당 1토큰, 한글 등 비ASCII 문자는 글자당 1토큰
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def message_tokens(message):
+    return estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def fingerprint(messages):
+    # 요약에 마지막으로 접어 넣은 위치를 찾기 위한 지문. 같은 말이 반복되어도 헷갈리지 않도록 직전 메시지까지 포함
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(f"{message.get('role')}\0{message.get('content')}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def anchor_at(history, end):
+    return fingerprint(history[max(0, end - 2):end])
+
+
+class HistoryManager:
+    # 최근 대화는 토큰 예산 안에서 그대로 두고, 밖으로 밀려난 대화는 대화별 요약에 점진적으로 접어 넣음.
+    # summarize(previous_summary, messages) -> 새 요약 문자열
+    # workers > 0 이면 요약은 백그라운드에서 만들고, 그동안의 요청은 이전 요약과 최근 메시지만으로 바로 진행함
+    def __init__(self, summarize, budget=TOKEN_BUDGET, low_watermark=LOW_WATERMARK, max_conversations=MAX_CONVERSATIONS,
+                 workers=SUMMARY_WORKERS):
+        self.summarize = summarize
+        self.budget = budget
+        self.low_watermark = low_watermark
+        self.max_conversations = max_conversations
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summary") if workers > 0 else None
+        self.lock = threading.Lock()
+        # key -> {"summary": 요약, "count": 접어 넣은 메시지 수, "anchor": 접어 넣은 마지막 메시지들의 지문}
+        self.states = OrderedDict()
+        self.pending = set()  # 백그라운드에서 요약 중인 대화
+        self.summaries = 0
+        self.resets = 0
+
+    def _state(self, key):
+        with self.lock:
+            state = self.states.get(key)
+            if state is not None:
+                self.states.move_to_end(key)
+            return state
+
+    def _store(self, key, state):
+        with self.lock:
+            self.states[key] = state
+            self.states.move_to_end(key)
+            while len(self.states) > self.max_conversations:
+                self.states.popitem(last=False)
+
+    def _covered(self, history, state, sliding):
+        # 이미 요약에 포함된 앞부분 메시지 수
+        if state is None:
+            return 0
+        # 클라이언트가 기록을 계속 이어 붙여 보내는 경우 같은 위치에 있음
+        count = state["count"]
+        if count <= len(history) and anchor_at(history, count) == state["anchor"]:
+            return count
+        for end in range(len(history), 0, -1):
+            if anchor_at(history, end) == state["anchor"]:
+                return end
+        if sliding:
+            # DB 에서 최근 N 턴만 읽어온 경우: 기준 메시지가 창 밖으로 밀려났을 뿐이므로 전부 요약 이후의 메시지
+            return 0
+        return None
+
+    def _window_start(self, history, covered, budget):
+        # 끝에서부터 예산이 허락하는 만큼 포함했을 때의 시작 인덱스
+        total = 0
+        start = len(history)
+        while start > covered:
+            cost = message_tokens(history[start - 1])
+            if total + cost > budget:
+                break
+            total += cost
+            start -= 1
+        return start
+
+    def compact(self, key, history, sliding=False, max_messages=None):
+        # (요약 또는 None, 모델에 보낼 최근 메시지 목록)
+        # max_messages: 토큰 예산과 별개로 그대로 보낼 최근 메시지 수 한도. 창 밖으로 밀려난 메시지도 요약에 접어 넣음
+        #   (서버 기록처럼 최근 N 턴만 보내는 경우, 짧은 턴이 많아 토큰 예산을 넘지 않아도 오래된 대화가 버려지지 않게 함)
+        seen = state = self._state(key)
+        covered = self._covered(history, state, sliding)
+        if covered is None:
+            # 기록이 바뀌었거나 새로 시작된 대화
+            with self.lock:
+                self.resets += 1
+            state, covered = None, 0
+
+        summary = state["summary"] if state else None
+        budget = self.budget - (estimate_tokens(summary) if summary else 0)
+        start = self._window_start(history, covered, budget)
+        if max_messages is not None:
+            start = max(start, len(history) - max_messages)
+        if start == covered:
+            return summary, history[covered:]
+
+        # 예산 또는 메시지 수 초과: 낮은 기준선까지 줄이고 그 앞부분을 요약에 접어 넣음
+        fold = self._window_start(history, covered, int(self.budget * self.low_watermark))
+        if max_messages is not None:
+            fold = max(fold, len(history) - int(max_messages * self.low_watermark))
+        if self.executor is None:
+            new_summary = self._fold(key, seen, summary, history[covered:fold], fold, anchor_at(history, fold))
+            if new_summary is None:
+                return summary, history[start:]
+            return new_summary, history[fold:]
+
+        # 요약 호출이 응답을 늦추지 않도록 백그라운드로 보내고, 이번 요청은 이전 요약 + 예산 안의 최근 메시지로 진행
+        with self.lock:
+            scheduled = key not in self.pending
+            self.pending.add(key)
+        if scheduled:
+            self.executor.submit(self._fold, key, seen, summary, history[covered:fold], fold, anchor_at(history, fold))
+        return summary, history[start:]
+
+    def _fold(self, key, seen, summary, messages, count, anchor):
+        # 새 요약을 만들어 저장하고 반환, 실패하면 None. seen 은 compact 가 읽었던 상태
+        try:
+            new_summary = self.summarize(summary, messages)
+        except Exception as e:
+            print(f"Error summarizing conversation: {str(e)}")
+            return None
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+        with self.lock:
+            # 요약하는 동안 대화가 초기화되거나 밀려났으면 버림
+            if self.states.get(key) is not seen:
+                return None
+            self.summaries += 1
+        self._store(key, {"summary": new_summary, "count": count, "anchor": anchor})
+        return new_summary
+
+    def stats(self):
+        with self.lock:
+            return {"conversations": len(self.states), "pending": len(self.pending), "summaries": self.summaries, "resets": self.resets}
@@ -0,0 +1,137 @@
+import io
+import os
+import time
+import base64
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# 카메라 프레임 전처리 설정
+#   IMAGE_MAX_EDGE: 업스트림으로 보내기 전 긴 변의 최대 픽셀 수
+#   IMAGE_JPEG_QUALITY: 다시 인코딩할 JPEG 품질
+#   FRAME_HASH_THRESHOLD: 직전 프레임과의 지각 해시 해밍 거리가 이 값 이하이면 같은 프레임으로 봄
+#   FRAME_CACHE_TTL: 같은 프레임으로 보고 이전 감정을 재사용하는 최대 시간(초)
+MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", 512))
+JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", 80))
+HASH_THRESHOLD = int(os.getenv("FRAME_HASH_THRESHOLD", 6))
+FRAME_CACHE_TTL = float(os.getenv("FRAME_CACHE_TTL", 10))
+MAX_SESSIONS = 10000
+# 압축 폭탄 방지용 최대 픽셀 수
+MAX_PIXELS = 40_000_000
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def dhash(image, size=8):
+    # 차이 해시(dHash): 가로로 인접한 픽셀 밝기 비교로 만든 64비트 정수
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class PreparedImage:
+    def __init__(self, data, width, height, phash, original_size):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.phash = phash
+        self.original_size = original_size
+
+    def data_url(self):
+        return f"data:image/jpeg;base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+def prepare_image(source, max_edge=MAX_EDGE, quality=JPEG_QUALITY):
+    # 검증 -> 회전 보정 -> 축소 -> JPEG 재인코딩 -> 지각 해시
+    # source 는 바이트 또는 seek 가능한 파일 객체 (업로드 임시 파일을 그대로 넘길 수 있음)
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    source.seek(0, os.SEEK_END)
+    original_size = source.tell()
+    source.seek(0)
+    try:
+        image = Image.open(source)
+        if image.width * image.height > MAX_PIXELS:
+            raise InvalidImage("Image is too large")
+        # JPEG 는 디코딩 단계에서 바로 줄여서 읽음
+        image.draft("RGB", (max_edge, max_edge))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage(f"Invalid image: {str(e)}")
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    return PreparedImage(output.getvalue(), image.width, image.height, dhash(image), original_size)
+
+
+class FrameCache:
+    # 세션별 직전 프레임의 해시와 분석 결과. 거의 같은 프레임이면 업스트림 호출 없이 재사용
+    def __init__(self, threshold=HASH_THRESHOLD, ttl=FRAME_CACHE_TTL, max_sessions=MAX_SESSIONS):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()  # session -> (hash, emotion, 기록 시각)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def lookup(self, session, phash):
+        with self.lock:
+            entry = self.sessions.get(session)
+            if entry is not None:
+                last_hash, emotion, stored_at = entry
+                if time.monotonic() - stored_at <= self.ttl and hamming(last_hash, phash) <= self.threshold:
+                    self.sessions.move_to_end(session)
+                    self.hits += 1
+                    return emotion
+            self.misses += 1
+            return None
+
+    def last(self, session):
+        # 프레임 유사도와 관계없이 세션의 직전 결과 (업스트림을 쓸 수 없을 때의 대체값), 없으면 None
+        with self.lock:
+            entry = self.sessions.get(session)
+            if entry is not None and time.monotonic() - entry[2] <= self.ttl:
+                return entry[1]
+            return None
+
+    def store(self, session, phash, emotion):
+        with self.lock:
+            self.sessions[session] = (phash, emotion, time.monotonic())
+            self.sessions.move_to_end(session)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def record_sizes(self, original_size, prepared_size):
+        with self.lock:
+            self.bytes_in += original_size
+            self.bytes_out += prepared_size
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytesIn": self.bytes_in,
+                "bytesOut": self.bytes_out
+            }
@@ -0,0 +1,107 @@
+import io
+import os
+import re
+import uuid
+import hashlib
+import threading
+from PIL import Image
+
+# 생성된 이미지 저장소 설정
+#   IMAGE_STORE_DIR: 이미지와 썸네일을 저장하는 디렉터리
+#   IMAGE_THUMBNAIL_SIZES: 미리 만들어 두는 WebP 썸네일의 긴 변 크기들 (쉼표 구분)
+STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "images"))
+THUMBNAIL_SIZES = tuple(int(size) for size in os.getenv("IMAGE_THUMBNAIL_SIZES", "128,256,512").split(",") if size.strip())
+THUMBNAIL_QUALITY = 80
+URL_PREFIX = "/api/images"
+
+FORMATS = {"PNG": ("png", "image/png"), "JPEG": ("jpg", "image/jpeg"), "WEBP": ("webp", "image/webp")}
+MIMETYPES = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp"}
+NAME_RE = re.compile(r"([0-9a-f]{64})(?:-(\d+))?\.(png|jpg|webp)")
+
+
+class ImageStore:
+    # 내용 해시(SHA-256)를 이름으로 쓰는 이미지 저장소. 같은 이미지는 한 번만 저장되고 URL 이 바뀌지 않으므로
+    # 응답에 오래 캐시되는 URL 만 넣으면 됨. 원본과 함께 크기별 WebP 썸네일을 미리 만들어 둠
+    def __init__(self, directory=STORE_DIR, thumbnail_sizes=THUMBNAIL_SIZES, url_prefix=URL_PREFIX):
+        self.directory = directory
+        self.thumbnail_sizes = thumbnail_sizes
+        self.url_prefix = url_prefix
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.duplicates = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    def _write(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, data, thumbnails=True):
+        # 이미지 바이트를 저장하고 urls() 형태의 dict 반환. 이미지가 아니면 ValueError
+        # 썸네일이 필요 없는 이미지(스프라이트 아틀라스 등)는 thumbnails=False
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            image = Image.open(io.BytesIO(data))
+            extension, _ = FORMATS.get(image.format, (None, None))
+        except Exception as e:
+            raise ValueError(f"Invalid image: {str(e)}")
+        if extension is None:
+            raise ValueError(f"Unsupported image format: {image.format}")
+
+        name = f"{digest}.{extension}"
+        if os.path.exists(self._path(name)):
+            with self.lock:
+                self.duplicates += 1
+            return self.urls(name, thumbnails)
+
+        # 썸네일을 먼저 써서 원본이 보이는 시점에는 썸네일도 모두 있게 함
+        image.load()
+        for size in self.thumbnail_sizes if thumbnails else ():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size), Image.LANCZOS)
+            output = io.BytesIO()
+            thumbnail.save(output, format="WEBP", quality=THUMBNAIL_QUALITY)
+            self._write(f"{digest}-{size}.webp", output.getvalue())
+        self._write(name, data)
+        with self.lock:
+            self.stored += 1
+        return self.urls(name, thumbnails)
+
+    def urls(self, name, thumbnails=True):
+        digest, _, extension = NAME_RE.fullmatch(name).groups()
+        return {
+            "id": digest,
+            "url": f"{self.url_prefix}/{name}",
+            "thumbnails": {str(size): f"{self.url_prefix}/{digest}-{size}.webp" for size in self.thumbnail_sizes} if thumbnails else {}
+        }
+
+    def lookup(self, name):
+        # (파일 경로, MIME 타입) 또는 None. 이름 형식이 맞지 않으면 None
+        match = NAME_RE.fullmatch(name)
+        if match is None:
+            return None
+        path = self._path(name)
+        if not os.path.isfile(path):
+            return None
+        return path, MIMETYPES[match.group(3)]
+
+    def read(self, url):
+        # 이 저장소의 URL 이면 이미지 바이트, 아니면 None
+        prefix = f"{self.url_prefix}/"
+        if not url or not url.startswith(prefix):
+            return None
+        found = self.lookup(url[len(prefix):])
+        if found is None:
+            return None
+        with open(found[0], "rb") as f:
+            return f.read()
+
+    def stats(self):
+        with self.lock:
+            return {"stored": self.stored, "duplicates": self.duplicates}
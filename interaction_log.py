@@ -0,0 +1,149 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from database import LazySession
+from models import Interaction
+
+# 대화 기록 쓰기 지연(write-behind) 설정
+#   INTERACTION_BATCH_SIZE: 한 번에 bulk insert 할 최대 행 수
+#   INTERACTION_FLUSH_INTERVAL: 배치가 다 차지 않아도 기록하는 주기(초)
+#   INTERACTION_QUEUE_SIZE: 메모리에 쌓아둘 수 있는 최대 행 수, 넘으면 버리고 dropped 로 집계
+BATCH_SIZE = int(os.getenv("INTERACTION_BATCH_SIZE", 200))
+FLUSH_INTERVAL = float(os.getenv("INTERACTION_FLUSH_INTERVAL", 0.5))
+QUEUE_SIZE = int(os.getenv("INTERACTION_QUEUE_SIZE", 10000))
+WRITE_ATTEMPTS = 3
+
+
+class InteractionWriter:
+    # 채팅 턴을 큐에 넣고 백그라운드 스레드가 모아서 한 번에 INSERT 함.
+    # 요청 스레드는 DB 를 기다리지 않고, 아직 기록되지 않은 턴은 pending() 으로 조회할 수 있음
+    def __init__(self, engine=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, queue_size=QUEUE_SIZE):
+        # engine 을 생략하면 처음 기록할 때 database.get_engine() 을 사용
+        self.session_factory = sessionmaker(class_=LazySession, bind=engine)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.in_transit = []  # 큐에서 꺼냈지만 아직 커밋되지 않은 행
+        self.thread = None
+        self.stopping = threading.Event()
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_batch_ms = 0.0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="interaction-writer", daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+
+    def record(self, user_id, character_id, message, response, emotion):
+        self.start()
+        row = {
+            "user_id": user_id,
+            "character_id": character_id,
+            "message": message,
+            "response": response,
+            "emotion": emotion,
+            "created_at": datetime.utcnow()
+        }
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            print("Interaction queue is full, dropping turn")
+
+    def pending(self, user_id, character_id):
+        # 아직 DB 에 기록되지 않은 해당 대화의 턴 (오래된 순)
+        with self.queue.mutex:
+            queued = list(self.queue.queue)
+        with self.lock:
+            in_transit = list(self.in_transit)
+        return [
+            row for row in in_transit + queued
+            if row["user_id"] == user_id and row["character_id"] == character_id
+        ]
+
+    def _take_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            batch = self._take_batch()
+            if not batch:
+                continue
+            with self.lock:
+                self.in_transit = batch
+            self._write(batch)
+            with self.lock:
+                self.in_transit = []
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        for attempt in range(WRITE_ATTEMPTS):
+            session = self.session_factory()
+            try:
+                session.execute(insert(Interaction), batch)
+                session.commit()
+                with self.lock:
+                    self.written += len(batch)
+                    self.batches += 1
+                    self.last_batch_ms = (time.perf_counter() - started) * 1000
+                return
+            except Exception as e:
+                session.rollback()
+                print(f"Error writing interactions (attempt {attempt + 1}): {str(e)}")
+                time.sleep(0.1 * (attempt + 1))
+            finally:
+                session.close()
+        with self.lock:
+            self.failed += len(batch)
+
+    def flush(self, timeout=None):
+        # 큐에 쌓인 턴이 모두 기록될 때까지 대기. 시간 안에 끝나면 True
+        if self.thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=10):
+        # 종료 시 남은 턴을 모두 기록
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join(timeout)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queueDepth": self.queue.qsize() + len(self.in_transit),
+                "written": self.written,
+                "batches": self.batches,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "lastBatchMs": round(self.last_batch_ms, 2)
+            }
@@ -0,0 +1,204 @@
+import re
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy import event
+
+# 지연 시간 히스토그램 구간(초)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+SQL_VERBS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+_CAMEL_RE = re.compile(r"(?<!^)(?=[A-Z])")
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    # 라벨 조합마다 구간별 개수, 합계, 개수를 유지. observe 는 이분 탐색 한 번과 잠금 한 번
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # labels -> [구간별 개수..., +Inf 개수, 합계]
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self.series.items())
+        names = self.labelnames + ("le",)
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_text(names, labels + (bound,))} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_label_text(names, labels + ('+Inf',))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def _flatten(prefix, stats):
+    # {"hits": 3, "pool": {"size": 10}} -> [(prefix_hits, 3), (prefix_pool_size, 10)]. 숫자가 아닌 값은 건너뜀
+    for key, value in stats.items():
+        name = f"{prefix}_{_CAMEL_RE.sub('_', key).lower()}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+class Registry:
+    # 히스토그램/카운터와, 기존 stats() dict 들을 게이지로 바꿔 내보내는 수집기를 모아 Prometheus 텍스트로 출력
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collect(self, prefix, stats):
+        # stats: 인자 없이 dict 를 반환하는 함수 (tts_cache.stats 등)
+        self.collectors.append((prefix, stats))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for prefix, stats in self.collectors:
+            try:
+                values = list(_flatten(prefix, stats()))
+            except Exception as e:
+                print(f"Error collecting {prefix} metrics: {str(e)}")
+                continue
+            for name, value in values:
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.add(Histogram(
+    "http_request_duration_seconds", "Time until the response headers are ready, by route.",
+    ("method", "route", "status")
+))
+upstream_calls = registry.add(Histogram(
+    "upstream_call_duration_seconds", "OpenAI call duration including retries, by operation and model.",
+    ("operation", "model", "outcome")
+))
+upstream_tokens = registry.add(Counter(
+    "upstream_tokens_total", "Tokens reported by OpenAI usage, by operation, model and kind.",
+    ("operation", "model", "kind")
+))
+db_queries = registry.add(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by statement type.",
+    ("statement",), DB_BUCKETS
+))
+spans = registry.add(Histogram(
+    "app_span_duration_seconds", "Time spent in named sections of request handling.",
+    ("span",)
+))
+
+
+@contextmanager
+def span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.observe(time.perf_counter() - started, name)
+
+
+def instrument_app(app):
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # 라벨 수가 늘어나지 않도록 실제 경로 대신 라우트 규칙을 사용
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            http_requests.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+        return response
+
+
+def record_upstream(operation, model, seconds, outcome, response=None):
+    # upstream.observe() 로 등록되는 콜백
+    model = model or "unknown"
+    upstream_calls.observe(seconds, operation, model, outcome)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        for kind in ("prompt_tokens", "completion_tokens"):
+            tokens = getattr(usage, kind, None)
+            if tokens:
+                upstream_tokens.inc(operation, model, kind.split("_")[0], amount=tokens)
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_query_started"].pop()
+        verb = statement.lstrip()[:6].upper()
+        db_queries.observe(time.perf_counter() - started, verb if verb in SQL_VERBS else "OTHER")
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        stack = context.connection.info.get("metrics_query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
@@ -1,6 +1,6 @@
 import os
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean, JSON, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import json
@@ -18,6 +18,7 @@ class User(Base):
     
     # 관계 설정
     interactions = relationship("Interaction", back_populates="user")
+    credit_transactions = relationship("CreditTransaction", back_populates="user")
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -36,6 +37,7 @@ class Character(Base):
     # 관계 설정
     interactions = relationship("Interaction", back_populates="character")
     expressions = relationship("CharacterExpression", back_populates="character")
+    atlas = relationship("CharacterAtlas", uselist=False, back_populates="character")
     
     def __repr__(self):
         return f'<Character {self.name}>'
@@ -52,6 +54,10 @@ class Character(Base):
 
 class CharacterExpression(Base):
     __tablename__ = 'character_expressions'
+    __table_args__ = (
+        # 캐릭터마다 감정 하나에 이미지 하나. 기존 테이블에도 추가할 수 있도록 제약 대신 unique 인덱스로 둠
+        Index('uq_character_expressions_character_emotion', 'character_id', 'emotion', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     character_id = Column(Integer, ForeignKey('characters.id'))
@@ -64,8 +70,37 @@ class CharacterExpression(Base):
     def __repr__(self):
         return f'<Expression {self.character_id} - {self.emotion}>'
 
+class CharacterAtlas(Base):
+    __tablename__ = 'character_atlases'
+    
+    # 캐릭터의 표정 이미지를 한 장에 모은 스프라이트 아틀라스
+    character_id = Column(Integer, ForeignKey('characters.id'), primary_key=True)
+    version = Column(String(16), nullable=False)  # 원본 (감정, URL) 목록의 해시. 같으면 다시 만들지 않음
+    image_url = Column(String(255), nullable=False)
+    frames = Column(JSON, nullable=False)  # 감정 -> [x, y, 너비, 높이]
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 관계 설정
+    character = relationship("Character", back_populates="atlas")
+    
+    def __repr__(self):
+        return f'<CharacterAtlas {self.character_id} {self.version}>'
+    
+    def to_dict(self):
+        return {
+            'url': self.image_url,
+            'version': self.version,
+            'frames': self.frames
+        }
+
 class Interaction(Base):
     __tablename__ = 'interactions'
+    __table_args__ = (
+        # 대화별 최근 턴 조회와 id 기준 키셋 페이지네이션
+        Index('ix_interactions_user_character_id', 'user_id', 'character_id', 'id'),
+        # 보존 기간이 지난 턴 찾기
+        Index('ix_interactions_created_at', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -80,4 +115,51 @@ class Interaction(Base):
     character = relationship("Character", back_populates="interactions")
     
     def __repr__(self):
-        return f'<Interaction {self.id}>'
\ No newline at end of file
+        return f'<Interaction {self.id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'message': self.message,
+            'response': self.response,
+            'emotion': self.emotion,
+            'createdAt': self.created_at.isoformat() if self.created_at else None
+        }
+
+class InteractionArchive(Base):
+    __tablename__ = 'interaction_archive'
+    
+    # 보존 기간이 지난 대화 턴. 조회용 인덱스 없이 본문(message, response, emotion)은 zlib 압축 JSON 으로 보관
+    id = Column(Integer, primary_key=True, autoincrement=False)  # 원래 interactions.id
+    user_id = Column(Integer, nullable=True)
+    character_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=True)
+    payload = Column(LargeBinary, nullable=False)
+    
+    def __repr__(self):
+        return f'<InteractionArchive {self.id}>'
+
+class CreditTransaction(Base):
+    __tablename__ = 'credit_transactions'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    amount = Column(Integer, nullable=False)  # 충전은 양수, 차감은 음수
+    balance_after = Column(Integer, nullable=False)
+    reason = Column(String(50), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # 관계 설정
+    user = relationship("User", back_populates="credit_transactions")
+    
+    def __repr__(self):
+        return f'<CreditTransaction {self.user_id} {self.amount:+d}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'amount': self.amount,
+            'balanceAfter': self.balance_after,
+            'reason': self.reason,
+            'createdAt': self.created_at.isoformat() if self.created_at else None
+        }
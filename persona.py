@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import time
+from models import Character
+
+# 캐릭터 시스템 프롬프트 캐시 설정
+#   PERSONA_CACHE_TTL: 다른 워커 프로세스의 변경도 반영되도록 캐시를 강제로 다시 읽는 주기(초)
+CACHE_TTL = float(os.getenv("PERSONA_CACHE_TTL", 300))
+
+CLOSING = "Respond as this character would, with appropriate tone, expressions, and mannerisms."
+
+# 업스트림이 응답하지 못할 때 쓰는 캐릭터 말투의 짧은 대체 답변과 감정. 사용자 메시지가 한국어면 한국어로 답함
+#   목록이 고정되어 있으므로 음성 합성 결과도 TTS 캐시에서 다시 쓰임
+FALLBACK_REPLIES = {
+    "ko": [
+        ("음... 잠깐 생각이 멈춘 것 같아요. 조금 있다가 다시 말해 줄래요?", "thoughtful"),
+        ("앗, 지금은 머리가 좀 복잡해요. 잠시 후에 다시 이야기해요!", "embarrassed"),
+        ("미안해요, 방금 한 말을 놓쳤어요. 한 번만 더 말해 줄래요?", "nervous"),
+    ],
+    "en": [
+        ("Hmm... my mind went blank for a second. Could you say that again in a moment?", "thoughtful"),
+        ("Oops, my thoughts are a little tangled right now. Let's talk again shortly!", "embarrassed"),
+        ("Sorry, I missed what you said. Could you tell me once more?", "nervous"),
+    ],
+}
+HANGUL_RE = re.compile(r"[\uac00-\ud7a3\u3131-\u318e]")
+
+# 알려진 personality 키는 고정된 순서와 이름으로 씀
+KNOWN_FIELDS = (
+    ("type", "Personality"),
+    ("traits", "Traits"),
+    ("background", "Background"),
+    ("speechStyle", "Speech style"),
+)
+
+
+def _text(value):
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_text(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return str(value).strip()
+
+
+def compile_persona(personality, name=None, description=None):
+    # personality dict 를 JSON 문장부호 없이 읽기 쉬운 줄 단위 시스템 프롬프트로 바꿈.
+    # 같은 입력이면 항상 같은 문자열이 나오도록 키 순서를 고정함 (업스트림 프롬프트 캐시 적중)
+    personality = personality if isinstance(personality, dict) else {}
+    lines = [f"You are {name}, an anime character." if name else "You are an anime character."]
+    if description:
+        lines.append(description.strip())
+    for key, label in KNOWN_FIELDS:
+        if personality.get(key):
+            lines.append(f"{label}: {_text(personality[key])}")
+    for key in sorted(set(personality) - {key for key, _ in KNOWN_FIELDS}):
+        if personality[key] not in (None, "", [], {}):
+            lines.append(f"{key}: {_text(personality[key])}")
+    lines.append(CLOSING)
+    return "\n".join(lines)
+
+
+def fallback_reply(system_prompt, user_message):
+    # (답변, 감정). 같은 캐릭터와 메시지에는 항상 같은 답변을 고름
+    replies = FALLBACK_REPLIES["ko" if HANGUL_RE.search(user_message or "") else "en"]
+    digest = hashlib.sha1(f"{system_prompt}\0{user_message}".encode("utf-8")).digest()
+    return replies[digest[0] % len(replies)]
+
+
+class CompiledPersona:
+    def __init__(self, character_id, prompt):
+        self.character_id = character_id
+        self.prompt = prompt
+        # 프롬프트 내용이 바뀌면 버전도 바뀜 (응답 캐시 등의 키로 사용)
+        self.version = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+class PersonaCache:
+    # 캐릭터 id -> 컴파일된 시스템 프롬프트. 캐릭터가 커밋되면 invalidate() 로 비움
+    def __init__(self, session, ttl=CACHE_TTL):
+        self.session = session
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.generation = 0
+        self.loaded_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def get(self, character_id):
+        # 캐릭터가 없으면 None
+        with self.lock:
+            if time.monotonic() - self.loaded_at > self.ttl:
+                self.entries.clear()
+                self.loaded_at = time.monotonic()
+            compiled = self.entries.get(character_id)
+            if compiled is not None:
+                self.hits += 1
+                return compiled
+            self.misses += 1
+            generation = self.generation
+
+        character = self.session.get(Character, character_id)
+        if character is None:
+            return None
+        compiled = CompiledPersona(character.id, compile_persona(character.personality, character.name, character.description))
+        with self.lock:
+            # 읽는 도중 무효화되었으면 오래된 값일 수 있으므로 저장하지 않음
+            if generation == self.generation:
+                self.entries[character_id] = compiled
+        return compiled
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
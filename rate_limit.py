@@ -0,0 +1,124 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+
+# 사용자별 요청 속도 제한 설정 (토큰 버킷)
+#   RATE_LIMIT_ENABLED: 끄려면 false
+#   RATE_LIMIT_RATE: 사용자 버킷이 초당 다시 채워지는 토큰 수
+#   RATE_LIMIT_BURST: 버킷 크기 (한 번에 몰아서 쓸 수 있는 토큰 수)
+#   RATE_LIMIT_MAX_WAIT: 토큰이 이 시간(초) 안에 채워지면 거절하지 않고 기다렸다가 처리
+#   RATE_LIMIT_MAX_QUEUE: 동시에 기다릴 수 있는 요청 수, 넘으면 바로 429
+#   RATE_LIMIT_IP_SCALE: 같은 IP 에서 오는 모든 요청이 함께 쓰는 IP 버킷의 크기/속도 배수 (사용자 버킷 기준)
+#   RATE_LIMIT_COSTS: 엔드포인트별 비용 덮어쓰기 ("chat=1,image=10")
+#   RATE_LIMIT_CHECK_CREDITS: true 면 캐시된 크레딧 잔액이 비용보다 적은 사용자는 업스트림 호출 전에 402
+ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE = float(os.getenv("RATE_LIMIT_RATE", 1.0))
+BURST = float(os.getenv("RATE_LIMIT_BURST", 30))
+MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 0.5))
+MAX_QUEUE = int(os.getenv("RATE_LIMIT_MAX_QUEUE", 32))
+IP_SCALE = float(os.getenv("RATE_LIMIT_IP_SCALE", 4))
+CHECK_CREDITS = os.getenv("RATE_LIMIT_CHECK_CREDITS", "false").lower() in ("1", "true", "yes")
+MAX_KEYS = 100000
+
+# 요청 한 번이 쓰는 토큰 수 (크레딧과 같은 단위). 업스트림 비용에 맞춰 이미지 생성이 가장 비쌈
+COSTS = {
+    "chat": 1,
+    "tts": 1,
+    "vision": 1,
+    "image": 10,
+    "expressions": 10,
+}
+for _item in os.getenv("RATE_LIMIT_COSTS", "").split(","):
+    _name, _, _cost = _item.partition("=")
+    if _name.strip() and _cost.strip():
+        COSTS[_name.strip()] = float(_cost)
+
+
+class LocalBackend:
+    # 프로세스 안의 버킷 저장소. 여러 워커가 같은 한도를 나누려면 같은 reserve() 를 가진 공유 저장소(Redis 등)로 교체
+    def __init__(self, max_keys=MAX_KEYS):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()  # key -> (토큰 수, 갱신 시각)
+
+    def reserve(self, key, cost, rate, capacity, max_wait):
+        # 토큰을 차감하고 기다려야 하는 시간(초) 반환. max_wait 안에 채워지지 않으면 차감하지 않고 음수(-필요한 시간) 반환
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            # 버킷보다 비싼 요청도 버킷이 가득 차면 통과할 수 있게 함
+            cost = min(cost, capacity)
+            wait = max(0.0, (cost - tokens) / rate)
+            if wait <= max_wait:
+                # 기다리는 동안 채워질 토큰을 미리 빌려 씀 (잔고가 음수가 될 수 있음)
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait if wait <= max_wait else -wait
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Rate limit exceeded")
+        self.retry_after = retry_after
+
+    def headers(self):
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class RateLimiter:
+    # 키(사용자 id 또는 IP)마다 토큰 버킷 하나. 짧게 기다리면 되는 요청만 제한된 수까지 대기시키고 나머지는 바로 거절
+    def __init__(self, backend=None, rate=RATE, burst=BURST, costs=COSTS, max_wait=MAX_WAIT, max_queue=MAX_QUEUE, enabled=ENABLED):
+        self.backend = backend or LocalBackend()
+        self.rate = rate
+        self.burst = burst
+        self.costs = costs
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+
+    def cost(self, endpoint):
+        return self.costs.get(endpoint, 1)
+
+    def admit(self, key, endpoint, scale=1.0):
+        # 통과하면 반환, 아니면 RateLimited. 대기가 필요하면 이 스레드에서 잠시 기다림
+        # scale 은 버킷 크기와 채워지는 속도의 배수 (여러 사용자가 나눠 쓰는 IP 버킷)
+        if not self.enabled:
+            return
+        with self.lock:
+            queue_full = self.waiting >= self.max_queue
+        wait = self.backend.reserve(key, self.cost(endpoint), self.rate * scale, self.burst * scale, 0.0 if queue_full else self.max_wait)
+        if wait < 0:
+            with self.lock:
+                self.rejected += 1
+            raise RateLimited(-wait)
+        if wait > 0:
+            with self.lock:
+                self.waiting += 1
+                self.delayed += 1
+            try:
+                time.sleep(wait)
+            finally:
+                with self.lock:
+                    self.waiting -= 1
+        with self.lock:
+            self.admitted += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "delayed": self.delayed,
+                "rejected": self.rejected
+            }
@@ -0,0 +1,172 @@
+import os
+import re
+import time
+import zlib
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+# 짧은 첫 인사 등에 대한 채팅 응답 캐시 (기본 꺼짐)
+#   RESPONSE_CACHE_ENABLED: true 면 대화 기록이 없는 짧은 메시지의 답변과 감정을 캐릭터/페르소나 버전별로 재사용
+#   RESPONSE_CACHE_TTL: 저장된 답변을 쓰는 시간(초)
+#   RESPONSE_CACHE_MAX_ENTRIES: 전체 항목 수, 넘으면 가장 오래 쓰지 않은 것부터 버림
+#   RESPONSE_CACHE_THRESHOLD: 정규화한 문장이 다를 때 n-gram 코사인 유사도가 이 값 이상이면 같은 질문으로 봄
+#   RESPONSE_CACHE_FUZZY_MAX_CHARS: 유사도 비교는 이 길이 이하의 짧은 인사말끼리만, 더 길면 정규화한 문장이 같아야 함
+#     ("do you like cats" / "do you like bats" 처럼 한 단어만 달라도 뜻이 다른 문장을 같은 질문으로 보지 않도록)
+#   RESPONSE_CACHE_MAX_CHARS: 이보다 긴 메시지는 캐시하지 않음
+ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+TTL = float(os.getenv("RESPONSE_CACHE_TTL", 3600))
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.95))
+FUZZY_MAX_CHARS = int(os.getenv("RESPONSE_CACHE_FUZZY_MAX_CHARS", 16))
+MAX_CHARS = int(os.getenv("RESPONSE_CACHE_MAX_CHARS", 64))
+
+DIMENSIONS = 1024
+NGRAM_SIZES = (2, 3)
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_REPEAT_RE = re.compile(r"(.)\1{2,}")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text):
+    # 대소문자, 전각/반각, 문장부호, 반복 문자("안녕~~~", "hiiii"), 공백 차이를 없앰
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _PUNCTUATION_RE.sub(" ", text)
+    text = _REPEAT_RE.sub(r"\1\1", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def vectorize(text):
+    # 문자 2/3-gram 을 해시해서 고정 길이 벡터로 만든 뒤 길이 1로 정규화 (내적 = 코사인 유사도)
+    # 띄어쓰기는 빼고 비교함 ("안녕 하세요" = "안녕하세요")
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    padded = f" {text.replace(' ', '')} "
+    for size in NGRAM_SIZES:
+        for start in range(len(padded) - size + 1):
+            vector[zlib.crc32(padded[start:start + size].encode("utf-8")) % DIMENSIONS] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def prompt_version(system_prompt):
+    # 클라이언트가 보낸 persona 도 캐릭터 프롬프트와 같은 방식으로 버전을 매김 (persona.CompiledPersona.version 과 같음)
+    return hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+class _Scope:
+    # 한 (캐릭터, 페르소나 버전)의 항목과 짧은 항목들의 최근접 이웃 검색용 행렬
+    def __init__(self):
+        self.entries = {}  # 정규화한 문장 -> (답변, 감정, 벡터 또는 None(긴 문장), 만료 시각)
+        self.keys = []
+        self.matrix = None
+        self.stale = True
+
+    def index(self):
+        # 벡터가 있는 (짧은) 항목이 없으면 ([], None)
+        if self.stale:
+            self.keys = [key for key, entry in self.entries.items() if entry[2] is not None]
+            self.matrix = np.stack([self.entries[key][2] for key in self.keys]) if self.keys else None
+            self.stale = False
+        return self.keys, self.matrix
+
+
+class ResponseCache:
+    # 대화 기록 없이 들어오는 짧은 메시지("안녕", "hi", "who are you?")에 대한 답변을 캐릭터와 페르소나 버전별로 저장.
+    # 정규화한 문장이 같으면 바로 쓰고, 다르면 같은 범위 안에서 n-gram 벡터 내적으로 가장 가까운 항목을 찾음
+    def __init__(self, enabled=ENABLED, ttl=TTL, max_entries=MAX_ENTRIES, threshold=THRESHOLD, max_chars=MAX_CHARS,
+                 fuzzy_max_chars=FUZZY_MAX_CHARS):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.max_chars = max_chars
+        self.fuzzy_max_chars = fuzzy_max_chars
+        self.lock = threading.Lock()
+        self.scopes = {}
+        self.order = OrderedDict()  # (범위, 정규화한 문장) -> None, 오래 쓰지 않은 순
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def key(self, character_id, system_prompt, message, history, summary=None):
+        # 캐시할 수 있는 요청이면 (범위, 정규화한 문장), 아니면 None
+        if not self.enabled or history or summary or not isinstance(message, str):
+            return None
+        text = normalize(message)
+        if not text or len(text) > self.max_chars:
+            return None
+        return (character_id, prompt_version(system_prompt)), text
+
+    def _drop(self, scope_key, text):
+        scope = self.scopes.get(scope_key)
+        if scope is not None and scope.entries.pop(text, None) is not None:
+            scope.stale = True
+            if not scope.entries:
+                del self.scopes[scope_key]
+        self.order.pop((scope_key, text), None)
+
+    def get(self, key):
+        # (답변, 감정) 또는 None
+        scope_key, text = key
+        now = time.monotonic()
+        with self.lock:
+            scope = self.scopes.get(scope_key)
+            match = None
+            if scope is not None:
+                if text in scope.entries:
+                    match = text
+                elif len(text) <= self.fuzzy_max_chars:
+                    keys, matrix = scope.index()
+                    if matrix is not None:
+                        similarity = matrix @ vectorize(text)
+                        best = int(np.argmax(similarity))
+                        if similarity[best] >= self.threshold:
+                            match = keys[best]
+            if match is not None:
+                response, emotion, _, expires = scope.entries[match]
+                if expires < now:
+                    self._drop(scope_key, match)
+                else:
+                    self.order.move_to_end((scope_key, match))
+                    if match == text:
+                        self.exact_hits += 1
+                    else:
+                        self.similar_hits += 1
+                    return response, emotion
+            self.misses += 1
+            return None
+
+    def put(self, key, response, emotion):
+        scope_key, text = key
+        with self.lock:
+            scope = self.scopes.setdefault(scope_key, _Scope())
+            vector = vectorize(text) if len(text) <= self.fuzzy_max_chars else None
+            scope.entries[text] = (response, emotion, vector, time.monotonic() + self.ttl)
+            scope.stale = True
+            self.order[(scope_key, text)] = None
+            self.order.move_to_end((scope_key, text))
+            self.stores += 1
+            while len(self.order) > self.max_entries:
+                (old_scope, old_text), _ = self.order.popitem(last=False)
+                self._drop(old_scope, old_text)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self.order),
+                "scopes": len(self.scopes),
+                "exactHits": self.exact_hits,
+                "similarHits": self.similar_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hitRate": round(hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,82 @@
+import os
+import json
+import zlib
+import time
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select
+from models import Interaction, InteractionArchive
+
+# 대화 기록 보존 설정
+#   INTERACTION_RETENTION_DAYS: 이보다 오래된 턴은 interaction_archive 테이블로 옮김
+#   INTERACTION_ARCHIVE_BATCH: 한 트랜잭션에서 옮기는 행 수
+RETENTION_DAYS = int(os.getenv("INTERACTION_RETENTION_DAYS", 90))
+BATCH_SIZE = int(os.getenv("INTERACTION_ARCHIVE_BATCH", 5000))
+
+
+def pack(message, response, emotion):
+    return zlib.compress(json.dumps([message, response, emotion], ensure_ascii=False).encode("utf-8"))
+
+
+def unpack(payload):
+    message, response, emotion = json.loads(zlib.decompress(payload).decode("utf-8"))
+    return {"message": message, "response": response, "emotion": emotion}
+
+
+def archive_interactions(engine, cutoff, batch_size=BATCH_SIZE):
+    # cutoff 보다 오래된 턴을 id 순으로 batch_size 씩 옮기고 원본을 지움.
+    # 배치마다 커밋하므로 도중에 멈춰도 다시 실행하면 남은 것부터 이어서 진행
+    started = time.perf_counter()
+    result = {"archived": 0, "batches": 0}
+    with engine.connect() as connection:
+        # created_at 인덱스로 옮길 마지막 id 를 먼저 구해서, 그 뒤의 최근 행은 훑지 않게 함
+        last_id = connection.execute(select(func.max(Interaction.id)).where(Interaction.created_at < cutoff)).scalar()
+    if last_id is None:
+        result["seconds"] = 0.0
+        return result
+
+    after_id = 0
+    columns = (Interaction.id, Interaction.user_id, Interaction.character_id,
+               Interaction.message, Interaction.response, Interaction.emotion, Interaction.created_at)
+    while after_id < last_id:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(*columns)
+                .where(Interaction.id > after_id, Interaction.id <= last_id, Interaction.created_at < cutoff)
+                .order_by(Interaction.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            connection.execute(insert(InteractionArchive), [
+                {
+                    "id": row.id,
+                    "user_id": row.user_id,
+                    "character_id": row.character_id,
+                    "created_at": row.created_at,
+                    "payload": pack(row.message, row.response, row.emotion)
+                }
+                for row in rows
+            ])
+            # 고른 행은 이 id 범위에서 cutoff 보다 오래된 행 전부이므로 IN 목록 대신 범위로 지움
+            connection.execute(
+                delete(Interaction)
+                .where(Interaction.id > after_id, Interaction.id <= rows[-1].id, Interaction.created_at < cutoff)
+            )
+        after_id = rows[-1].id
+        result["archived"] += len(rows)
+        result["batches"] += 1
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+if __name__ == "__main__":
+    # cron 등에서 주기적으로 실행: python retention.py --days 90
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from database import get_engine
+    cutoff = datetime.utcnow() - timedelta(days=args.days)
+    print(archive_interactions(get_engine(), cutoff, args.batch_size))
@@ -1,232 +1,898 @@
 import os
 import json
 import base64
-from flask import Flask, request, jsonify, send_file
+import hashlib
+import re
+import time
+import functools
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from openai import OpenAI
 from dotenv import load_dotenv
-from PIL import Image
-import io
-import requests
-from database import db_session, init_db
-from models import User, Character, CharacterExpression, Interaction
+from sqlalchemy.orm import Session
+from database import create_schema, db_session, on_engine, ping, pool_status
+from models import User, Interaction
+from emotion import EMOTIONS, classify_emotion, classify_emotions, normalize_emotion
+from emotion import engine as emotion_engine
+from tts_cache import TTSCache
+import upstream
+from catalog import CharacterCatalog, MAX_PAGE_SIZE, parse_fields, watch as watch_catalog
+from interaction_log import InteractionWriter
+from history import HistoryManager, SUMMARY_MAX_TOKENS
+from persona import PersonaCache, compile_persona, fallback_reply
+import credit_ledger
+import metrics
+from image_pipeline import FrameCache, InvalidImage, prepare_image
+from uploads import MAX_REQUEST_BYTES, UploadError, read_upload
+from image_store import ImageStore
+from singleflight import IdempotencyConflict, SingleFlight, fingerprint as request_fingerprint
+from expression_jobs import ExpressionJobQueue, GENERATOR as EXPRESSION_GENERATOR, as_png, create_generator
+from sprite_atlas import AtlasBuilder, watch_expressions
+from rate_limit import CHECK_CREDITS, IP_SCALE, RateLimited, RateLimiter
+from response_cache import ResponseCache
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Configure OpenAI (공유 연결 풀, 동시 호출 한도, 재시도는 upstream.py 에서 관리, 첫 호출 때 생성)
+client = upstream.client
 
-app = Flask(__name__, static_url_path='', static_folder='.')
-CORS(app, resources={r"/*": {"origins": "*"}})
+# 채팅 감정 추출 방식
+#   local: 응답 생성 후 로컬 감정 분류기(emotion.py)로 감정 추출 (기본값)
+#   separate: 응답 생성 후 감정 추출을 위해 두 번째 gpt-4o 호출
+#   single: 한 번의 JSON 응답에서 답변과 감정을 함께 받음, 감정이 없으면 로컬 분류기로 대체
+CHAT_EMOTION_MODE = os.getenv("CHAT_EMOTION_MODE", "local")
 
-# 애플리케이션 시작 시 데이터베이스 초기화
-with app.app_context():
-    # 모델 클래스 가져오기
-    from models import Base
-    from database import engine
-    # 테이블 생성
-    Base.metadata.create_all(bind=engine)
+# userId/characterId 로 서버에 저장된 대화 기록을 불러올 때 사용하는 최근 턴 수
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", 10))
+# 요약에 아직 접어 넣지 않은 턴을 찾기 위해 더 거슬러 읽는 턴 수 (다른 워커가 처리한 턴이 있어도 요약 기준점이 보이도록)
+CHAT_HISTORY_LOOKBACK = int(os.getenv("CHAT_HISTORY_LOOKBACK", CHAT_HISTORY_TURNS * 3))
+
+# 감정 일괄 분석 요청 하나에 허용하는 최대 텍스트 수
+MAX_EMOTION_BATCH = 1000
+
+# 음성 합성 결과 디스크 캐시 (기본 256MB)
+TTS_MODEL = "tts-1"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+TTS_AUDIO_MAX_AGE = 30 * 24 * 3600
+TTS_KEY_RE = re.compile(r"[0-9a-f]{64}")
+tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES)
+
+# 라우트는 블루프린트에 등록하고 create_app() 에서 앱에 붙임
+api = Blueprint("api", __name__)
+
+# 업스트림 호출과 SQL 실행 시간 계측 (/metrics). 엔진은 처음 쓸 때 만들어지므로 그때 리스너를 붙임
+on_engine(metrics.instrument_engine)
+upstream.observe(metrics.record_upstream)
+
+# 캐릭터 목록 캐시, 캐릭터/표정이 커밋되면 무효화
+character_catalog = CharacterCatalog(db_session)
+watch_catalog(Session, character_catalog.invalidate)
+
+# 캐릭터별로 컴파일한 시스템 프롬프트, 캐릭터가 커밋되면 무효화
+persona_cache = PersonaCache(db_session)
+watch_catalog(Session, persona_cache.invalidate)
+
+# 채팅 턴은 백그라운드에서 모아서 interactions 테이블에 기록
+interaction_writer = InteractionWriter()
+
+# 카메라 세션별 직전 프레임 분석 결과
+frame_cache = FrameCache()
+
+# 같은 내용의 업스트림 호출이 동시에 들어오면 한 번만 호출하고 결과를 나눠 씀
+single_flight = SingleFlight()
+
+# 생성된 이미지는 내용 해시 이름으로 디스크에 저장하고 URL 로만 응답
+image_store = ImageStore()
+IMAGE_MAX_AGE = 365 * 24 * 3600
+
+# 표정 변형 이미지는 백그라운드 워커 풀에서 생성
+expression_jobs = ExpressionJobQueue(db_session, create_generator(EXPRESSION_GENERATOR, client, upstream.call), image_store)
+
+# 캐릭터별 표정 스프라이트 아틀라스, 표정이 커밋되면 그 캐릭터만 백그라운드에서 다시 만듦
+atlas_builder = AtlasBuilder(db_session, image_store)
+watch_expressions(Session, atlas_builder.schedule)
+DEFAULT_EXPRESSION_EMOTIONS = ["happy", "sad", "angry", "surprised", "neutral"]
+EXPRESSION_NAME_RE = re.compile(r"[\w-]{1,50}")
+
+# 업스트림을 쓰는 엔드포인트는 사용자(없으면 IP)별 토큰 버킷으로 제한
+rate_limiter = RateLimiter()
+
+# 대화 기록 없는 짧은 채팅 메시지의 답변 캐시 (RESPONSE_CACHE_ENABLED=true 일 때만)
+response_cache = ResponseCache()
+
+# 각 구성 요소의 stats() 도 /metrics 에 게이지로 내보냄
+metrics.registry.collect("db_pool", pool_status)
+metrics.registry.collect("upstream", upstream.stats)
+metrics.registry.collect("tts_cache", tts_cache.stats)
+metrics.registry.collect("character_catalog", character_catalog.stats)
+metrics.registry.collect("persona_cache", persona_cache.stats)
+metrics.registry.collect("interactions", interaction_writer.stats)
+metrics.registry.collect("frames", frame_cache.stats)
+metrics.registry.collect("coalescing", single_flight.stats)
+metrics.registry.collect("image_store", image_store.stats)
+metrics.registry.collect("expression_jobs", expression_jobs.stats)
+metrics.registry.collect("atlas", atlas_builder.stats)
+metrics.registry.collect("rate_limit", rate_limiter.stats)
+metrics.registry.collect("response_cache", response_cache.stats)
 
-@app.teardown_appcontext
 def shutdown_session(exception=None):
     db_session.remove()
 
-@app.route("/", methods=["GET"])
+@api.route("/", methods=["GET"])
 def root():
     # 기본 경로로 접속하면 웹 인터페이스 제공
-    return app.send_static_file('index.html')
+    return current_app.send_static_file('index.html')
 
-@app.route("/api/status", methods=["GET"])
+@api.route("/api/status", methods=["GET"])
 def status():
     # API 상태 확인용 엔드포인트
     return jsonify({"status": "OK", "message": "AnimeAI API Server"})
 
-@app.route("/api/health", methods=["GET"])
+@api.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    # Prometheus 텍스트 형식
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@api.route("/api/health", methods=["GET"])
 def health_check():
-    return jsonify({"status": "OK", "message": "AnimeAI API is running"})
+    # 데이터베이스 왕복 시간과 연결 풀 상태를 함께 보고, DB 에 닿지 않으면 503
+    database_status = {}
+    try:
+        database_status["status"] = "OK"
+        database_status["roundTripMs"] = round(ping(), 2)
+    except Exception as e:
+        print(f"Error in health check: {str(e)}")
+        database_status["status"] = "ERROR"
+        database_status["error"] = str(e)
+    database_status["pool"] = pool_status()
+    
+    healthy = database_status["status"] == "OK"
+    return jsonify({
+        "status": "OK" if healthy else "DEGRADED",
+        "message": "AnimeAI API is running",
+        "database": database_status,
+        "interactions": interaction_writer.stats(),
+        "frames": frame_cache.stats(),
+        "coalescing": single_flight.stats(),
+        "rateLimit": rate_limiter.stats(),
+        "breakers": upstream.breakers.stats(),
+        "responseCache": response_cache.stats()
+    }), 200 if healthy else 503
 
-@app.route("/api/characters", methods=["GET"])
+@api.route("/api/characters", methods=["GET"])
 def get_characters():
+    # ?offset=0&limit=20&fields=id,name,expressions 로 페이지와 필드를 고를 수 있음
     try:
-        characters = db_session.query(Character).all()
-        character_list = []
+        offset = max(int(request.args.get("offset", 0)), 0)
+        limit = request.args.get("limit")
+        limit = min(max(int(limit), 1), MAX_PAGE_SIZE) if limit else None
+        fields = parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        body, etag = character_catalog.page(offset, limit, fields)
         
-        for character in characters:
-            char_dict = character.to_dict()
-            
-            # 감정 표현 이미지 가져오기
-            expressions = {}
-            for expr in character.expressions:
-                expressions[expr.emotion] = expr.image_url
-                
-            char_dict["expressions"] = expressions
-            character_list.append(char_dict)
-            
-        return jsonify({
-            "success": True,
-            "characters": character_list
-        })
+        response = current_app.response_class(body, mimetype="application/json")
+        response.set_etag(etag)
+        # 클라이언트는 매번 If-None-Match 로 재검증하고, 바뀌지 않았으면 304 를 받음
+        response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
     except Exception as e:
         print(f"Error in get-characters endpoint: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/chat", methods=["POST"])
+EMOTION_PROMPT = "Extract the primary emotion from this anime character's response. Output only one word: happy, sad, angry, surprised, embarrassed, thoughtful, excited, nervous, or neutral."
+
+STRUCTURED_REPLY_PROMPT = f"Reply with a JSON object of the form {{\"response\": \"<your in-character reply>\", \"emotion\": \"<one of: {', '.join(EMOTIONS)}>\"}}. The emotion is the primary emotion of your reply."
+
+SUMMARY_PROMPT = f"You keep a running summary of a conversation between a user and an anime character. Update the current summary with the new messages, keeping names, facts, promises and the emotional tone. Write it in the language of the conversation, in at most {SUMMARY_MAX_TOKENS} tokens."
+
+def build_chat_messages(system_prompt, chat_history, user_message, summary=None):
+    # 시스템 프롬프트를 항상 맨 앞에 같은 내용으로 두어 업스트림 프롬프트 캐시가 적중하게 함
+    messages = [
+        {"role": "system", "content": system_prompt}
+    ]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+    messages += [{"role": msg["role"], "content": msg["content"]} for msg in chat_history]
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def summarize_history(previous_summary, messages):
+    # 예산 밖으로 밀려난 메시지를 기존 요약에 접어 넣음
+    transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+    response = upstream.call(
+        "summary",
+        client.chat.completions.create,
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}
+        ],
+        temperature=0.3,
+        max_tokens=SUMMARY_MAX_TOKENS
+    )
+    return response.choices[0].message.content or previous_summary or ""
+
+# 토큰 예산을 넘는 대화 기록은 대화별 요약으로 접음
+history_manager = HistoryManager(summarize_history)
+metrics.registry.collect("history", history_manager.stats)
+
+def conversation_key(data, conversation, chat_history):
+    # 요약 캐시 키: 명시적인 conversationId, 서버 저장 대화, 또는 첫 메시지 내용
+    if data.get("conversationId"):
+        return f"id:{data['conversationId']}"
+    if conversation is not None:
+        return f"user:{conversation[0]}:{conversation[1]}"
+    first = json.dumps([data.get("persona"), chat_history[:1]], ensure_ascii=False, sort_keys=True)
+    return "first:" + hashlib.sha1(first.encode("utf-8")).hexdigest()
+
+def coalesce(scope, fn, parts, idempotency_key=None):
+    # 같은 내용(parts)의 호출이 진행 중이면 그 결과를 기다려서 씀.
+    # Idempotency-Key 가 있으면 끝난 결과도 IDEMPOTENCY_TTL 동안 그대로 돌려줌
+    digest = request_fingerprint(scope, *parts)
+    if idempotency_key:
+        result, _ = single_flight.do((scope, "key", idempotency_key), fn, fingerprint=digest, retain=True)
+    else:
+        result, _ = single_flight.do((scope, digest), fn)
+    return result
+
+def extract_emotion(character_response):
+    # Get character's emotion based on the response
+    try:
+        return coalesce("emotion", lambda: request_emotion(character_response), [character_response])
+    except Exception as e:
+        if not upstream.unavailable(e):
+            raise
+        # 감정 호출을 쓸 수 없으면 로컬 분류기로 대신함
+        return classify_emotion(character_response)
+
+def request_emotion(character_response):
+    emotion_response = upstream.call(
+        "emotion",
+        client.chat.completions.create,
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": EMOTION_PROMPT},
+            {"role": "user", "content": character_response}
+        ],
+        temperature=0.3,
+        max_tokens=10
+    )
+    
+    emotion = emotion_response.choices[0].message.content
+    if emotion is None:
+        return "neutral"
+    return emotion.strip().lower()
+
+def upstream_error(endpoint, e):
+    if isinstance(e, upstream.CircuitOpen):
+        # 서킷이 열려 있는 동안은 업스트림을 부르지 않고 바로 503 (로그도 남기지 않음)
+        return jsonify({"error": str(e), "retryAfter": round(e.retry_after, 2)}), 503, e.headers()
+    print(f"Error in {endpoint} endpoint: {str(e)}")
+    if isinstance(e, upstream.UpstreamBusy):
+        # 동시 호출 한도 초과는 잠시 후 재시도하도록 503 으로 응답
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+    if isinstance(e, IdempotencyConflict):
+        return jsonify({"error": str(e)}), 422
+    if upstream.unavailable(e):
+        # 재시도 후에도 남은 연결 오류, 타임아웃, 429, 5xx
+        return jsonify({"error": "Upstream unavailable"}), 503, {"Retry-After": "5"}
+    return jsonify({"error": str(e)}), 500
+
+def sse_event(event, data):
+    # Server-Sent Events 한 건을 직렬화
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def wants_stream(data):
+    if data.get("stream"):
+        return True
+    return "text/event-stream" in request.headers.get("Accept", "")
+
+def wants_binary(fields, mimetype):
+    # format=binary 이거나 Accept 헤더가 JSON 보다 해당 형식을 선호하면 바이트를 그대로 응답
+    if fields is not None and fields.get("format"):
+        return fields.get("format") == "binary"
+    return request.accept_mimetypes.best == mimetype
+
+def request_user():
+    # 속도 제한 키로 쓸 userId (쿼리, 헤더, 폼, JSON 순). 없으면 None
+    user = request.args.get("userId") or request.headers.get("X-User-Id") or request.form.get("userId")
+    if not user and request.is_json:
+        data = request.get_json(silent=True)
+        user = data.get("userId") if isinstance(data, dict) else None
+    return str(user) if user else None
+
+def check_rate_limit(endpoint):
+    # 통과하면 None, 아니면 오류 응답. 토큰이 모자라면 워커를 붙잡지 않고 429 + Retry-After 로 바로 돌려보냄
+    user = request_user()
+    cost = rate_limiter.cost(endpoint)
+    if CHECK_CREDITS and user:
+        cached = credit_ledger.balances.get(user)
+        if cached is not None and cached[1] < cost:
+            return jsonify({"error": "Insufficient credits", "userId": user, "creditsRemaining": cached[1]}), 402
+    try:
+        # userId 는 인증되지 않은 값이므로 IP 버킷도 항상 차감함. id 를 바꿔 가며 보내도 IP 한도는 넘지 못하고,
+        # IP 버킷을 먼저 확인하므로 거절된 요청이 사용자 버킷을 새로 만들어 다른 사용자의 버킷을 밀어내지 않음
+        rate_limiter.admit(f"ip:{request.remote_addr}", endpoint, scale=IP_SCALE)
+        rate_limiter.admit(f"user:{user}" if user else f"anon:{request.remote_addr}", endpoint)
+    except RateLimited as e:
+        return jsonify({"error": str(e), "retryAfter": round(e.retry_after, 2)}), 429, e.headers()
+    return None
+
+def rate_limited(endpoint):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return check_rate_limit(endpoint) or view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_user_id(username):
+    # 사용자가 없으면 get-credits 와 같은 기본 크레딧으로 생성
+    return credit_ledger.ensure_user(db_session, username)
+
+def load_history(user_id, character_id, limit=CHAT_HISTORY_LOOKBACK):
+    # 최근 턴을 DB 와 아직 기록되지 않은 쓰기 대기열에서 모아 메시지 목록으로 변환
+    pending = interaction_writer.pending(user_id, character_id)
+    rows = (
+        db_session.query(Interaction.message, Interaction.response, Interaction.created_at)
+        .filter_by(user_id=user_id, character_id=character_id)
+        .order_by(Interaction.id.desc())
+        .limit(limit)
+        .all()
+    )
+    
+    turns = [{"message": row.message, "response": row.response, "created_at": row.created_at} for row in reversed(rows)]
+    # 조회 직전에 기록된 턴은 양쪽에 모두 있을 수 있음
+    stored = {(turn["created_at"], turn["message"]) for turn in turns}
+    turns += [turn for turn in pending if (turn["created_at"], turn["message"]) not in stored]
+    
+    history = []
+    for turn in turns[-limit:]:
+        history.append({"role": "user", "content": turn["message"]})
+        if turn["response"]:
+            history.append({"role": "assistant", "content": turn["response"]})
+    return history
+
+def record_turn(conversation, user_message, character_response, emotion):
+    if conversation is not None:
+        user_id, character_id = conversation
+        interaction_writer.record(user_id, character_id, user_message, character_response, emotion)
+
+@api.route("/api/chat", methods=["POST"])
+@rate_limited("chat")
 def chat():
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
         
     user_message = data.get("message", "")
-    character_persona = data.get("persona", {})
-    chat_history = data.get("history", [])
+    character_persona = data.get("persona")
+    chat_history = data.get("history")
     
-    try:
-        # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-        # do not change this unless explicitly requested by the user
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": f"You are an anime character with the following traits: {json.dumps(character_persona)}. Respond as this character would, with appropriate tone, expressions, and mannerisms."},
-                *[{"role": msg["role"], "content": msg["content"]} for msg in chat_history],
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.7,
-            max_tokens=150
-        )
-        
-        character_response = response.choices[0].message.content
-        if character_response is None:
-            character_response = "..."
+    # characterId(+ userId)가 오면 페르소나와 대화 기록을 서버에서 불러오고 턴을 저장함
+    # persona 를 보내지 않으면 캐릭터별로 컴파일해 둔 시스템 프롬프트를 사용 (characterId 만으로 충분)
+    conversation = None
+    server_history = False
+    system_prompt = None
+    character_id = None
+    if data.get("characterId") is not None:
+        try:
+            character_id = int(data["characterId"])
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid characterId"}), 400
         
-        # Get character's emotion based on the response
-        emotion_response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Extract the primary emotion from this anime character's response. Output only one word: happy, sad, angry, surprised, embarrassed, thoughtful, excited, nervous, or neutral."},
-                {"role": "user", "content": character_response}
-            ],
-            temperature=0.3,
-            max_tokens=10
+        try:
+            compiled = persona_cache.get(character_id)
+            if compiled is None:
+                return jsonify({"error": "Character not found"}), 404
+            if character_persona is None:
+                system_prompt = compiled.prompt
+            if data.get("userId"):
+                conversation = (get_user_id(str(data["userId"])), character_id)
+            if chat_history is None and conversation is not None:
+                with metrics.span("chat.load_history"):
+                    chat_history = load_history(*conversation)
+                server_history = True
+        except Exception as e:
+            print(f"Error loading conversation: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+    
+    chat_history = chat_history or []
+    with metrics.span("chat.compact_history"):
+        summary, chat_history = history_manager.compact(
+            conversation_key(data, conversation, chat_history), chat_history, sliding=server_history,
+            # 서버 기록은 최근 CHAT_HISTORY_TURNS 턴만 그대로 보내고, 그보다 오래된 턴은 요약에 접어 넣음
+            max_messages=CHAT_HISTORY_TURNS * 2 if server_history else None
         )
-        
-        emotion = emotion_response.choices[0].message.content
-        if emotion is None:
-            emotion = "neutral"
+    if system_prompt is None:
+        system_prompt = compile_persona(character_persona or {})
+    messages = build_chat_messages(system_prompt, chat_history, user_message, summary)
+    
+    # 대화 기록 없는 짧은 메시지는 같은 캐릭터/페르소나 버전에 저장해 둔 답변을 재사용
+    cache_key = response_cache.key(character_id, system_prompt, user_message, chat_history, summary)
+    cached = response_cache.get(cache_key) if cache_key is not None else None
+    if cached is not None:
+        character_response, emotion = cached
+        record_turn(conversation, user_message, character_response, emotion)
+        if wants_stream(data):
+            return cached_chat_stream(character_response, emotion)
+        return jsonify({"response": character_response, "emotion": emotion, "cached": True})
+    
+    if wants_stream(data):
+        return chat_stream(messages, conversation, user_message, cache_key)
+    
+    try:
+        if CHAT_EMOTION_MODE == "single":
+            character_response, emotion = complete_with_emotion(messages)
+        elif CHAT_EMOTION_MODE == "separate":
+            character_response = complete_reply(messages)
+            emotion = extract_emotion(character_response)
         else:
-            emotion = emotion.strip().lower()
+            character_response = complete_reply(messages)
+            with metrics.span("chat.classify_emotion"):
+                emotion = classify_emotion(character_response)
         
+        record_turn(conversation, user_message, character_response, emotion)
+        if cache_key is not None and character_response != "...":
+            response_cache.put(cache_key, character_response, emotion)
+        
+        with metrics.span("chat.serialize"):
+            return jsonify({
+                "response": character_response,
+                "emotion": emotion
+            })
+        
+    except Exception as e:
+        if not upstream.unavailable(e):
+            return upstream_error("chat", e)
+        return fallback_chat(system_prompt, user_message)
+
+def fallback_chat(system_prompt, user_message):
+    # 업스트림을 쓸 수 없으면 캐릭터 말투의 대체 답변을 바로 돌려줌. 대화 기록과 응답 캐시에는 남기지 않음
+    character_response, emotion = fallback_reply(system_prompt, user_message)
+    return jsonify({"response": character_response, "emotion": emotion, "degraded": True})
+
+def complete_reply(messages):
+    # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+    # do not change this unless explicitly requested by the user
+    response = upstream.call(
+        "chat",
+        client.chat.completions.create,
+        model="gpt-4o",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=150
+    )
+    
+    character_response = response.choices[0].message.content
+    if character_response is None:
+        character_response = "..."
+    return character_response
+
+def complete_with_emotion(messages):
+    # 답변과 감정을 한 번의 호출로 받음
+    response = upstream.call(
+        "chat",
+        client.chat.completions.create,
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": f"{messages[0]['content']} {STRUCTURED_REPLY_PROMPT}"},
+            *messages[1:]
+        ],
+        temperature=0.7,
+        max_tokens=200,
+        response_format={"type": "json_object"}
+    )
+    
+    content = response.choices[0].message.content or ""
+    try:
+        parsed = json.loads(content)
+    except ValueError:
+        # JSON 이 깨졌으면 원문 전체를 답변으로 사용
+        parsed = {"response": content}
+    if not isinstance(parsed, dict):
+        parsed = {"response": content}
+    
+    character_response = parsed.get("response") or "..."
+    emotion = normalize_emotion(parsed.get("emotion")) or classify_emotion(character_response)
+    return character_response, emotion
+
+def chat_stream(messages, conversation=None, user_message="", cache_key=None):
+    # 토큰이 도착하는 대로 "token" 이벤트로 전달하고, 마지막에 감정과 타이밍을 담은 "done" 이벤트를 보냄
+    # firstTokenMs(첫 토큰까지의 시간)와 totalMs(전체 시간)를 따로 보고하므로 TTFB를 별도로 측정할 수 있음
+    def generate():
+        started = time.perf_counter()
+        first_token_ms = None
+        parts = []
+        try:
+            stream = upstream.stream(
+                "chat",
+                client.chat.completions.create,
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=150
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                parts.append(delta)
+                yield sse_event("token", {"content": delta})
+            
+            character_response = "".join(parts) or "..."
+            if CHAT_EMOTION_MODE == "separate":
+                emotion = extract_emotion(character_response)
+            else:
+                # 스트리밍 중에는 JSON 응답을 쓸 수 없으므로 single 모드도 로컬 분류기 사용
+                emotion = classify_emotion(character_response)
+            
+            record_turn(conversation, user_message, character_response, emotion)
+            if cache_key is not None and parts:
+                response_cache.put(cache_key, character_response, emotion)
+            
+            yield sse_event("done", {
+                "response": character_response,
+                "emotion": emotion,
+                "timing": {
+                    "firstTokenMs": round(first_token_ms, 1) if first_token_ms is not None else None,
+                    "totalMs": round((time.perf_counter() - started) * 1000, 1)
+                }
+            })
+        except Exception as e:
+            if parts or not upstream.unavailable(e):
+                print(f"Error in chat stream: {str(e)}")
+                yield sse_event("error", {"error": str(e)})
+                return
+            # 토큰을 하나도 받지 못했으면 대체 답변을 같은 이벤트 형식으로 보냄
+            character_response, emotion = fallback_reply(messages[0]["content"], user_message)
+            yield sse_event("token", {"content": character_response})
+            yield sse_event("done", {
+                "response": character_response,
+                "emotion": emotion,
+                "degraded": True,
+                "timing": {"firstTokenMs": None, "totalMs": round((time.perf_counter() - started) * 1000, 1)}
+            })
+    
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def cached_chat_stream(character_response, emotion):
+    # 캐시된 답변을 스트리밍 클라이언트와 같은 이벤트 형식으로 한 번에 보냄
+    body = sse_event("token", {"content": character_response}) + sse_event("done", {
+        "response": character_response,
+        "emotion": emotion,
+        "cached": True,
+        "timing": {"firstTokenMs": 0.0, "totalMs": 0.0}
+    })
+    return Response(body, mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@api.route("/api/history", methods=["GET"])
+def conversation_history():
+    # ?userId=...&characterId=1&limit=50&before=<id>, 최신 순. 다음 페이지는 응답의 nextBefore 를 before 로 보냄
+    # (user_id, character_id, id) 인덱스로 OFFSET 없이 바로 이어서 읽음
+    username = request.args.get("userId")
+    if not username:
+        return jsonify({"error": "No userId provided"}), 400
+    try:
+        character_id = int(request.args["characterId"])
+        limit = min(max(int(request.args.get("limit", 50)), 1), 200)
+        before = request.args.get("before")
+        before = int(before) if before else None
+    except (KeyError, ValueError):
+        return jsonify({"error": "Invalid characterId, limit or before"}), 400
+    
+    try:
+        user_id = db_session.query(User.id).filter_by(username=username).scalar()
+        rows = []
+        if user_id is not None:
+            query = db_session.query(Interaction).filter_by(user_id=user_id, character_id=character_id)
+            if before is not None:
+                query = query.filter(Interaction.id < before)
+            rows = query.order_by(Interaction.id.desc()).limit(limit).all()
         return jsonify({
-            "response": character_response,
-            "emotion": emotion
+            "userId": username,
+            "characterId": character_id,
+            "interactions": [row.to_dict() for row in rows],
+            "nextBefore": rows[-1].id if len(rows) == limit else None
         })
-        
     except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
+        print(f"Error in history endpoint: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/analyze-expression", methods=["POST"])
+@api.route("/api/emotion-analyze", methods=["POST"])
+def emotion_analyze():
+    # assets/js/emotion-analyzer.js 의 텍스트 분석 요청 ({"type": "text", "data": "..."})
+    data = request.json
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    
+    if data.get("type", "text") != "text":
+        return jsonify({"error": "Only text analysis is supported"}), 400
+    
+    text = data.get("data", data.get("text", ""))
+    if not isinstance(text, str):
+        return jsonify({"error": "Text must be a string"}), 400
+    
+    return jsonify(emotion_engine.analyze(text))
+
+@api.route("/api/emotion-analyze/batch", methods=["POST"])
+def emotion_analyze_batch():
+    data = request.json
+    if not data or not isinstance(data.get("texts"), list):
+        return jsonify({"error": "No texts provided"}), 400
+    
+    texts = data["texts"]
+    if len(texts) > MAX_EMOTION_BATCH:
+        return jsonify({"error": f"At most {MAX_EMOTION_BATCH} texts per request"}), 400
+    if not all(isinstance(text, str) for text in texts):
+        return jsonify({"error": "Texts must be strings"}), 400
+    
+    return jsonify({
+        "emotions": classify_emotions(texts)
+    })
+
+@api.app_errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": "Request body too large"}), 413
+
+@api.route("/api/analyze-expression", methods=["POST"])
+@rate_limited("vision")
 def analyze_expression():
-    if not request.json or 'image' not in request.json:
+    # 이미지는 base64 JSON, multipart(image 파트) 또는 image/* 본문으로 받음
+    try:
+        upload, fields = read_upload(request, 'image')
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    if upload is None:
         return jsonify({"error": "No image provided"}), 400
     
+    # 검증 후 축소/재인코딩한 JPEG 만 업스트림으로 보냄
     try:
-        # Get the base64 encoded image
-        image_data = request.json['image'].split(',')[1] if ',' in request.json['image'] else request.json['image']
-        
-        # Decode the image
-        image_bytes = base64.b64decode(image_data)
-        
-        # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-        # do not change this unless explicitly requested by the user
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text", 
-                            "text": "Analyze this facial expression and tell me the emotion. Only respond with one word: happy, sad, angry, surprised, neutral, confused, or other."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_data}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=10
+        prepared = prepare_image(upload.file)
+    except InvalidImage as e:
+        return jsonify({"error": str(e)}), 400
+    frame_cache.record_sizes(prepared.original_size, len(prepared.data))
+    
+    # 같은 세션의 직전 프레임과 거의 같으면 이전 결과를 그대로 반환
+    # 세션 id 를 보내지 않은 요청은 재사용하지 않음 (NAT/프록시 뒤의 다른 사용자와 IP 가 같을 수 있음)
+    session_id = fields.get('sessionId') or request.headers.get('X-Session-Id')
+    cached = frame_cache.lookup(session_id, prepared.phash) if session_id else None
+    if cached is not None:
+        return jsonify({
+            "emotion": cached,
+            "cached": True
+        })
+    
+    try:
+        # 같은 프레임이 동시에 재전송되면 비전 호출 한 번을 함께 씀
+        emotion = coalesce(
+            "vision",
+            lambda: classify_expression(prepared),
+            [hashlib.sha256(prepared.data).hexdigest()],
+            request.headers.get("Idempotency-Key")
         )
-        
-        emotion = response.choices[0].message.content
-        if emotion is None:
-            emotion = "neutral"
-        else:
-            emotion = emotion.strip().lower()
+        if session_id:
+            frame_cache.store(session_id, prepared.phash, emotion)
         
         return jsonify({
-            "emotion": emotion
+            "emotion": emotion,
+            "cached": False
         })
         
     except Exception as e:
-        print(f"Error in analyze-expression endpoint: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        if not upstream.unavailable(e):
+            return upstream_error("analyze-expression", e)
+        # 비전 호출을 쓸 수 없으면 세션의 직전 결과(없으면 neutral)를 돌려줌
+        return jsonify({
+            "emotion": (frame_cache.last(session_id) if session_id else None) or "neutral",
+            "cached": False,
+            "degraded": True
+        })
+
+def classify_expression(prepared):
+    # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+    # do not change this unless explicitly requested by the user
+    response = upstream.call(
+        "vision",
+        client.chat.completions.create,
+        model="gpt-4o",
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text", 
+                        "text": "Analyze this facial expression and tell me the emotion. Only respond with one word: happy, sad, angry, surprised, neutral, confused, or other."
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": prepared.data_url(),
+                            "detail": "low"
+                        }
+                    }
+                ]
+            }
+        ],
+        max_tokens=10
+    )
+    
+    emotion = response.choices[0].message.content
+    if emotion is None:
+        return "neutral"
+    return emotion.strip().lower()
+
+def synthesize_speech(text, voice, idempotency_key=None):
+    # 같은 (모델, 음성, 텍스트) 조합은 디스크 캐시에서 바로 반환하고, 캐시에 없는 같은 요청이 동시에 오면 한 번만 합성
+    key = TTSCache.make_key(TTS_MODEL, voice, text)
+    path = tts_cache.get(key)
+    if path is None:
+        path = coalesce("tts", lambda: request_speech(key, text, voice), [key], idempotency_key)
+        if not os.path.exists(path):
+            # 보관해 둔 Idempotency-Key 결과의 파일이 그 사이 캐시 LRU 로 지워졌으면 다시 합성
+            path = request_speech(key, text, voice)
+    return key, path
 
-@app.route("/api/text-to-speech", methods=["POST"])
+def request_speech(key, text, voice):
+    response = upstream.call(
+        "tts",
+        client.audio.speech.create,
+        model=TTS_MODEL,
+        voice=voice,
+        input=text
+    )
+    return tts_cache.put(key, response.content)
+
+def send_tts_audio(key, path):
+    # conditional=True 로 ETag/If-None-Match 와 Range 요청을 처리
+    return send_file(path, mimetype="audio/mpeg", conditional=True, etag=key, max_age=TTS_AUDIO_MAX_AGE)
+
+@api.route("/api/text-to-speech", methods=["GET", "POST"])
 def text_to_speech():
-    data = request.json
-    if not data:
-        return jsonify({"error": "No data provided"}), 400
+    # GET 요청과 format=binary 는 MP3 를 그대로 전송하고,
+    # POST 기본값은 기존 클라이언트를 위해 base64 JSON 을 유지함 (format=url 이면 URL 만 전달)
+    if request.method == "GET":
+        data = request.args
+        default_format = "binary"
+    else:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+        default_format = "binary" if request.accept_mimetypes.best == "audio/mpeg" else "json"
         
     text = data.get("text", "")
     voice = data.get("voice", "nova")  # Default: nova
+    response_format = data.get("format", default_format)
+    if not text:
+        return jsonify({"error": "No text provided"}), 400
+    
+    # 캐시된 음성은 업스트림을 쓰지 않으므로 속도 제한은 캐시에 없을 때만 적용
+    if not tts_cache.contains(TTSCache.make_key(TTS_MODEL, voice, text)):
+        limited = check_rate_limit("tts")
+        if limited is not None:
+            return limited
     
     try:
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text
-        )
+        key, path = synthesize_speech(text, voice, request.headers.get("Idempotency-Key"))
         
-        # Get the audio data
-        audio_data = response.content
+        if response_format == "binary":
+            return send_tts_audio(key, path)
         
-        # Convert to base64 for sending to frontend
-        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+        payload = {"audioUrl": f"/api/tts/{key}.mp3"}
+        if response_format != "url":
+            # Convert to base64 for sending to frontend
+            with open(path, "rb") as f:
+                payload["audio"] = base64.b64encode(f.read()).decode('utf-8')
         
-        return jsonify({
-            "audio": audio_base64
-        })
+        return jsonify(payload)
         
     except Exception as e:
-        print(f"Error in text-to-speech endpoint: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        return upstream_error("text-to-speech", e)
+
+@api.route("/api/tts/<key>.mp3", methods=["GET"])
+def tts_audio(key):
+    if not TTS_KEY_RE.fullmatch(key):
+        return jsonify({"error": "Invalid audio key"}), 400
+    
+    path = tts_cache.get(key)
+    if path is None:
+        return jsonify({"error": "Audio not found"}), 404
+    return send_tts_audio(key, path)
+
+def read_emotions(data):
+    # 감정 목록 (JSON 배열, 반복 폼 필드 또는 "happy,sad"). 잘못된 값이면 None
+    emotions = data.get("emotions", DEFAULT_EXPRESSION_EMOTIONS)
+    if hasattr(data, "getlist") and len(data.getlist("emotions")) > 1:
+        emotions = data.getlist("emotions")
+    if isinstance(emotions, str):
+        emotions = [emotion.strip() for emotion in emotions.split(",") if emotion.strip()]
+    if not isinstance(emotions, list) or not emotions:
+        return None
+    if not all(isinstance(emotion, str) and EXPRESSION_NAME_RE.fullmatch(emotion) for emotion in emotions):
+        return None
+    return emotions
 
-@app.route("/api/get-character-expressions", methods=["POST"])
+def submit_expression_job(character_id, emotions, upload):
+    limited = check_rate_limit("expressions")
+    if limited:
+        return limited
+    try:
+        job, created = expression_jobs.submit(character_id, emotions, upload.read() if upload is not None else None)
+    except LookupError:
+        return jsonify({"error": "Character not found"}), 404
+    job["deduplicated"] = not created
+    job["statusUrl"] = f"/api/expression-jobs/{job['jobId']}"
+    return jsonify(job), 202
+
+@api.route("/api/characters/<int:character_id>/expressions", methods=["POST"])
+def generate_character_expressions(character_id):
+    # 표정 변형 생성 작업을 등록하고 바로 202 와 작업 ID 를 돌려줌. 기준 이미지는 선택 (없으면 캐릭터 이미지)
+    try:
+        upload, data = read_upload(request, 'baseImage')
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    emotions = read_emotions(data if data is not None else {})
+    if emotions is None:
+        return jsonify({"error": "Invalid emotions"}), 400
+    return submit_expression_job(character_id, emotions, upload)
+
+@api.route("/api/expression-jobs/<job_id>", methods=["GET"])
+def expression_job_status(job_id):
+    job = expression_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@api.route("/api/images/<name>", methods=["GET"])
+def stored_image(name):
+    # 이름이 내용 해시라 내용이 바뀌지 않으므로 1년 동안 immutable 로 캐시
+    found = image_store.lookup(name)
+    if found is None:
+        return jsonify({"error": "Image not found"}), 404
+    path, mimetype = found
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=name.split(".")[0], max_age=IMAGE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@api.route("/api/get-character-expressions", methods=["POST"])
 def get_character_expressions():
-    data = request.json
-    if not data:
+    try:
+        upload, data = read_upload(request, 'baseImage')
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    if data is None:
         return jsonify({"error": "No data provided"}), 400
         
-    base_image = data.get("baseImage", "")
-    emotions = data.get("emotions", ["happy", "sad", "angry", "surprised", "neutral"])
+    emotions = read_emotions(data)
+    if emotions is None:
+        return jsonify({"error": "Invalid emotions"}), 400
+    
+    # characterId 가 있으면 실제 변형 생성 작업을 등록 (/api/expression-jobs/<id> 로 진행 상황 조회)
+    if data.get("characterId") is not None:
+        try:
+            character_id = int(data.get("characterId"))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid characterId"}), 400
+        return submit_expression_job(character_id, emotions, upload)
     
-    # For now, return a placeholder implementation
-    # In a real implementation, we would use the OpenAI image model to generate variants
-    # based on the base image and emotions
+    # characterId 없는 기존 요청은 기준 이미지를 그대로 돌려줌
     emotion_images = {}
     
     try:
-        # Decode base image
-        if base_image:
-            image_data = base_image.split(',')[1] if ',' in base_image else base_image
-            image_bytes = base64.b64decode(image_data)
-            
-            # For this implementation, we'll just return the base image for all emotions
-            # In a production app, we would use AI to generate variations
+        if upload is not None:
+            # JSON 으로 받은 경우 보낸 문자열을 그대로 돌려줌
+            base_image = data.get("baseImage") if isinstance(data.get("baseImage"), str) else upload.data_url()
             for emotion in emotions:
                 emotion_images[emotion] = base_image
         else:
@@ -242,95 +908,232 @@ def get_character_expressions():
         print(f"Error in get-character-expressions endpoint: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def request_character_image(prompt, size, base_image):
+    # 생성된 이미지의 base64 문자열. base_image 는 as_png 로 정리한 PNG 바이트
+    if base_image is not None:
+        # 기준 이미지가 있으면 편집 API 로 변형
+        response = upstream.call(
+            "image",
+            client.images.edit,
+            model="gpt-image-1",
+            image=("base.png", base_image, "image/png"),
+            prompt=prompt,
+            size=size,
+            n=1,
+        )
+    else:
+        response = upstream.call(
+            "image",
+            client.images.generate,
+            model="gpt-image-1",
+            prompt=prompt,
+            size=size,
+            quality="hd",
+            n=1,
+            response_format="b64_json",
+        )
+    return response.data[0].b64_json
+
 # 새 캐릭터 이미지를 생성하는 엔드포인트
-@app.route("/api/generate-character-image", methods=["POST"])
+@api.route("/api/generate-character-image", methods=["POST"])
+@rate_limited("image")
 def generate_character_image():
-    data = request.json
+    # 기준 이미지는 base64 JSON, multipart(image 파트) 또는 image/* 본문(나머지는 쿼리 문자열)으로 받음
+    try:
+        upload, data = read_upload(request, 'image')
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
     if not data or "prompt" not in data:
         return jsonify({"error": "No prompt provided"}), 400
 
     prompt = data.get("prompt")
     size = data.get("size", "1024x1024")
-    base_image = data.get("image")
-    animate = data.get("animate", False)
+    animate = data.get("animate", False) in (True, "true", "1")
 
+    # base64 JSON 이나 application/octet-stream 본문은 파일 이름/형식이 없으므로 PNG 로 맞춰서 보냄
     try:
-        response = client.images.generate(
-            model="gpt-image-1",
-            prompt=prompt,
-            image=base_image,
-            size=size,
-            quality="hd",
-            n=1,
-            response_format="b64_json",
+        base_image = as_png(upload.read()) if upload is not None else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # 생성한 이미지는 바로 저장소에 넣고 URL 만 공유/보관 (Idempotency-Key 결과로 이미지 바이트를 메모리에 두지 않음)
+        stored = coalesce(
+            "image",
+            lambda: image_store.put(base64.b64decode(request_character_image(prompt, size, base_image))),
+            [prompt, size, hashlib.sha256(base_image).hexdigest() if base_image is not None else None],
+            request.headers.get("Idempotency-Key")
         )
 
-        image_base64 = response.data[0].b64_json
+        if data.get("format") == "base64":
+            # 이전 응답 형식 (이미지를 JSON 안에 그대로 포함)
+            image_base64 = base64.b64encode(image_store.read(stored["url"])).decode("utf-8")
+            if animate:
+                frames = [image_base64] * 4  # placeholder animation frames
+                return jsonify({"frames": frames})
+            return jsonify({"image": image_base64})
 
-        if animate:
-            frames = [image_base64] * 4  # placeholder animation frames
-            return jsonify({"frames": frames})
+        if wants_binary(data, "image/png"):
+            return Response(image_store.read(stored["url"]), mimetype="image/png")
 
-        return jsonify({"image": image_base64})
+        payload = {"imageId": stored["id"], "imageUrl": stored["url"], "thumbnails": stored["thumbnails"]}
+        if animate:
+            payload["frames"] = [stored["url"]] * 4  # placeholder animation frames
+        return jsonify(payload)
 
     except Exception as e:
-        print(f"Error in generate-character-image endpoint: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        return upstream_error("generate-character-image", e)
 
-@app.route("/api/save-credits", methods=["POST"])
+@api.route("/api/save-credits", methods=["POST"])
 def save_credits():
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
         
     user_id = data.get("userId", "user1")  # Default: user1
-    credits = data.get("credits", 0)
+    try:
+        credits = int(data.get("credits", 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid credits"}), 400
     
     try:
-        # 데이터베이스에서 사용자 찾기
-        user = db_session.query(User).filter_by(username=user_id).first()
-        
-        # 사용자가 없으면 생성
-        if not user:
-            user = User(username=user_id, credits=credits)
-            db_session.add(user)
-        else:
-            # 기존 사용자 크레딧 업데이트
-            user.credits = credits
-            
-        db_session.commit()
+        # 잔액을 그대로 덮어쓰는 대신 원자적으로 설정하고 차이를 원장에 기록
+        balance = credit_ledger.set_balance(db_session, user_id, credits)
         
         return jsonify({
             "success": True,
-            "userId": user.username,
-            "creditsRemaining": user.credits
+            "userId": user_id,
+            "creditsRemaining": balance
         })
     except Exception as e:
         print(f"Error in save-credits endpoint: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/get-credits", methods=["GET"])
+@api.route("/api/get-credits", methods=["GET"])
 def get_credits():
     user_id = request.args.get("userId", "user1") if request.args else "user1"
     
     try:
-        # 데이터베이스에서 사용자 찾기
-        user = db_session.query(User).filter_by(username=user_id).first()
-        
-        # 사용자가 없으면 생성
-        if not user:
-            user = User(username=user_id, credits=100)
-            db_session.add(user)
-            db_session.commit()
+        # 사용자가 없으면 기본 크레딧으로 생성 (동시 생성에도 안전)
+        balance = credit_ledger.get_balance(db_session, user_id)
             
         return jsonify({
-            "userId": user.username,
-            "creditsRemaining": user.credits
+            "userId": user_id,
+            "creditsRemaining": balance
         })
     except Exception as e:
         print(f"Error in get-credits endpoint: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def read_credit_change(data):
+    # (userId, amount, reason) 또는 오류 응답
+    if not data:
+        return None, (jsonify({"error": "No data provided"}), 400)
+    try:
+        amount = int(data.get("amount", 0))
+    except (TypeError, ValueError):
+        amount = 0
+    if amount <= 0:
+        return None, (jsonify({"error": "Amount must be a positive integer"}), 400)
+    # reason 은 String(50) 컬럼에 그대로 들어가므로 길이를 넘으면 DB 오류(500) 전에 400 으로 거절
+    reason = data.get("reason")
+    if reason is not None and not isinstance(reason, str):
+        return None, (jsonify({"error": "Reason must be a string"}), 400)
+    if reason and len(reason) > credit_ledger.MAX_REASON_LENGTH:
+        return None, (jsonify({"error": f"Reason must be at most {credit_ledger.MAX_REASON_LENGTH} characters"}), 400)
+    if reason == credit_ledger.INITIAL_REASON:
+        return None, (jsonify({"error": f"Reason '{reason}' is reserved"}), 400)
+    return (data.get("userId", "user1"), amount, reason), None
+
+@api.route("/api/credits/debit", methods=["POST"])
+def debit_credits():
+    change, error = read_credit_change(request.json)
+    if error:
+        return error
+    user_id, amount, reason = change
+    
+    try:
+        balance = credit_ledger.debit(db_session, user_id, amount, reason)
+        return jsonify({
+            "success": True,
+            "userId": user_id,
+            "creditsRemaining": balance
+        })
+    except credit_ledger.InsufficientCredits as e:
+        return jsonify({
+            "error": str(e),
+            "userId": user_id,
+            "creditsRemaining": e.balance
+        }), 402
+    except Exception as e:
+        print(f"Error in credits/debit endpoint: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/api/credits/credit", methods=["POST"])
+def credit_credits():
+    change, error = read_credit_change(request.json)
+    if error:
+        return error
+    user_id, amount, reason = change
+    
+    try:
+        balance = credit_ledger.credit(db_session, user_id, amount, reason)
+        return jsonify({
+            "success": True,
+            "userId": user_id,
+            "creditsRemaining": balance
+        })
+    except Exception as e:
+        print(f"Error in credits/credit endpoint: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/api/credits/history", methods=["GET"])
+def credit_history():
+    user_id = request.args.get("userId", "user1")
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 200)
+        before = request.args.get("before")
+        before = int(before) if before else None
+    except ValueError:
+        return jsonify({"error": "Invalid limit or before"}), 400
+    
+    try:
+        rows = credit_ledger.transactions(db_session, user_id, limit, before)
+        return jsonify({
+            "userId": user_id,
+            "transactions": [row.to_dict() for row in rows]
+        })
+    except Exception as e:
+        print(f"Error in credits/history endpoint: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def create_app():
+    # 애플리케이션 팩토리. DB 연결, OpenAI 클라이언트 생성, 테이블 생성은 하지 않으므로 워커가 빨리 뜸
+    app = Flask(__name__, static_url_path='', static_folder='.')
+    CORS(app, resources={r"/*": {"origins": "*"}})
+    # 요청 본문 크기 상한 (넘으면 413)
+    app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+    # 프록시(nginx 등)가 X-Sendfile 로 파일을 직접 보내게 하려면 USE_X_SENDFILE=1
+    app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE") == "1"
+
+    # 라우트별 응답 시간 계측 (/metrics)
+    metrics.instrument_app(app)
+    app.register_blueprint(api)
+    app.teardown_appcontext(shutdown_session)
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        # 테이블 생성은 배포할 때 한 번만 실행 (flask --app server init-db)
+        create_schema()
+        print("테이블 생성 완료")
+
+    return app
+
+# gunicorn server:app
+app = create_app()
+
 if __name__ == "__main__":
+    # 개발 서버는 프로세스가 하나뿐이므로 시작할 때 테이블을 만듦
+    create_schema()
     port = int(os.environ.get("PORT", 8000))
     app.run(host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 중복 요청 합치기 설정
+#   IDEMPOTENCY_TTL: Idempotency-Key 로 받은 요청의 결과를 재사용하는 시간(초)
+#   IDEMPOTENCY_MAX_BYTES: 보관하는 결과 전체의 대략적인 크기, 넘으면 오래된 것부터 버림
+#     큰 결과(이미지 등)는 저장소 URL 처럼 작은 값으로 바꿔서 보관할 것
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 600))
+MAX_RETAINED_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BYTES", 16 * 1024 * 1024))
+MAX_RETAINED = 10000
+
+
+class IdempotencyConflict(Exception):
+    # 같은 Idempotency-Key 로 다른 내용의 요청이 들어옴
+    pass
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "fingerprint", "expires", "size")
+
+    def __init__(self, fingerprint):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.fingerprint = fingerprint
+        self.expires = 0.0
+        self.size = 0
+
+
+def fingerprint(*parts):
+    # 요청을 정규화한 해시. 키 순서나 공백이 달라도 같은 요청이면 같은 값
+    body = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def estimate_size(value):
+    # 보관한 결과가 차지하는 대략적인 바이트 수 (문자열/바이트는 길이, 컨테이너는 항목 합)
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 64 + sum(estimate_size(item) for item in value)
+    return 64
+
+
+class SingleFlight:
+    # 같은 키의 호출이 진행 중이면 새로 호출하지 않고 그 결과를 기다려서 함께 씀.
+    # retain=True 로 성공한 결과는 ttl 동안 보관해서, 끝난 뒤 들어온 재시도에도 같은 결과를 돌려줌
+    def __init__(self, ttl=IDEMPOTENCY_TTL, max_retained=MAX_RETAINED, max_bytes=MAX_RETAINED_BYTES):
+        self.ttl = ttl
+        self.max_retained = max_retained
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.calls = {}  # 진행 중인 호출
+        self.retained = OrderedDict()  # 끝난 Idempotency-Key 호출, 만료 순 (ttl 이 같으므로 넣은 순서)
+        self.retained_bytes = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.replayed = 0
+        self.conflicts = 0
+
+    def _check(self, call, fingerprint):
+        if fingerprint is not None and call.fingerprint is not None and call.fingerprint != fingerprint:
+            self.conflicts += 1
+            raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+
+    def _drop_oldest(self):
+        _, call = self.retained.popitem(last=False)
+        self.retained_bytes -= call.size
+
+    def _purge(self, now):
+        # 만료된 결과는 앞쪽에 모여 있으므로 앞에서부터 버림 (같은 키가 다시 오지 않아도 정리됨)
+        while self.retained and next(iter(self.retained.values())).expires < now:
+            self._drop_oldest()
+
+    def do(self, key, fn, fingerprint=None, retain=False):
+        # (결과, 다른 호출의 결과를 공유했는지)
+        with self.lock:
+            self._purge(time.monotonic())
+            call = self.retained.get(key)
+            if call is not None:
+                self._check(call, fingerprint)
+                self.replayed += 1
+                return call.result, True
+
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call(fingerprint)
+                self.calls[key] = call
+                self.executed += 1
+            else:
+                self._check(call, fingerprint)
+                self.coalesced += 1
+
+        if not leader:
+            # 업스트림 호출마다 타임아웃이 있으므로 대기도 그 안에 끝남
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+                if retain and call.error is None:
+                    call.expires = time.monotonic() + self.ttl
+                    call.size = estimate_size(call.result)
+                    previous = self.retained.pop(key, None)
+                    if previous is not None:
+                        self.retained_bytes -= previous.size
+                    self.retained[key] = call
+                    self.retained_bytes += call.size
+                    while self.retained and (len(self.retained) > self.max_retained or self.retained_bytes > self.max_bytes):
+                        self._drop_oldest()
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self.lock:
+            return {
+                "inFlight": len(self.calls),
+                "retained": len(self.retained),
+                "retainedBytes": self.retained_bytes,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "replayed": self.replayed,
+                "conflicts": self.conflicts
+            }
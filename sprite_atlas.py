@@ -0,0 +1,201 @@
+import io
+import os
+import sys
+import math
+import json
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from sqlalchemy import event
+from models import Character, CharacterAtlas, CharacterExpression
+from expression_jobs import resolve_base_image
+
+# 표정 스프라이트 아틀라스 설정
+#   ATLAS_FRAME_SIZE: 표정 하나가 들어가는 칸의 크기(px), 원본은 비율을 유지해 이 안으로 줄임
+#   ATLAS_FORMAT: webp 또는 png
+#   ATLAS_QUALITY: WebP 품질
+FRAME_SIZE = int(os.getenv("ATLAS_FRAME_SIZE", 256))
+FORMAT = os.getenv("ATLAS_FORMAT", "webp").lower()
+QUALITY = int(os.getenv("ATLAS_QUALITY", 90))
+
+
+def source_version(expressions, frame_size=FRAME_SIZE, image_format=FORMAT):
+    # (감정, URL) 목록과 출력 설정의 해시. 표정이 바뀌지 않으면 같은 값
+    sources = sorted((emotion, url or "") for emotion, url in expressions.items())
+    key = json.dumps([sources, frame_size, image_format], separators=(",", ":"))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+def pack(images, frame_size=FRAME_SIZE, image_format=FORMAT, quality=QUALITY):
+    # images: 감정 -> PIL 이미지 (같은 객체면 한 칸을 같이 씀). (인코딩된 바이트, 감정 -> [x, y, w, h]) 반환
+    cells = []
+    index = {}
+    for image in images.values():
+        if id(image) not in index:
+            index[id(image)] = len(cells)
+            cells.append(image)
+    columns = math.ceil(math.sqrt(len(cells)))
+    rows = math.ceil(len(cells) / columns)
+    atlas = Image.new("RGBA", (columns * frame_size, rows * frame_size), (0, 0, 0, 0))
+
+    rects = []
+    for number, image in enumerate(cells):
+        frame = image.copy()
+        frame.thumbnail((frame_size, frame_size), Image.LANCZOS)
+        x, y = (number % columns) * frame_size, (number // columns) * frame_size
+        atlas.paste(frame, (x, y))
+        rects.append([x, y, frame.width, frame.height])
+
+    output = io.BytesIO()
+    if image_format == "png":
+        atlas.save(output, format="PNG", optimize=True)
+    else:
+        atlas.save(output, format="WEBP", quality=quality, method=4)
+    return output.getvalue(), {emotion: rects[index[id(image)]] for emotion, image in images.items()}
+
+
+class AtlasBuilder:
+    # 캐릭터마다 표정 이미지를 한 장의 아틀라스로 묶어 ImageStore 에 저장하고 CharacterAtlas 에 기록.
+    # 표정이 커밋되면 schedule() 로 해당 캐릭터만 백그라운드에서 다시 만들고, 원본이 그대로면 건너뜀
+    def __init__(self, session, store, frame_size=FRAME_SIZE, image_format=FORMAT):
+        self.session = session
+        self.store = store
+        self.frame_size = frame_size
+        self.image_format = image_format
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="atlas")
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.built = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def schedule(self, character_ids):
+        with self.lock:
+            new_ids = set(character_ids) - self.pending
+            self.pending |= new_ids
+        for character_id in sorted(new_ids):
+            self.executor.submit(self._run, character_id)
+
+    def _run(self, character_id):
+        # 만드는 도중 표정이 또 바뀌면 다시 예약될 수 있도록 먼저 pending 에서 뺌
+        with self.lock:
+            self.pending.discard(character_id)
+        try:
+            self.build(character_id)
+        except Exception as e:
+            print(f"Error building atlas for character {character_id}: {str(e)}")
+            with self.lock:
+                self.failed += 1
+        finally:
+            self.session.remove()
+
+    def _load(self, url, cache):
+        # 같은 URL 은 한 번만 읽고 같은 이미지 객체를 돌려줌 (아틀라스에서 한 칸을 공유)
+        if url in cache:
+            return cache[url]
+        data = self.store.read(url)
+        if data is None and url.startswith("data:image/") and "," in url:
+            data = base64.b64decode(url.split(",", 1)[1])
+        if data is None:
+            data = resolve_base_image(url)
+        image = None
+        if data is not None:
+            image = Image.open(io.BytesIO(data))
+            image.draft("RGB", (self.frame_size, self.frame_size))
+            image = ImageOps.exif_transpose(image).convert("RGBA")
+        cache[url] = image
+        return image
+
+    def build(self, character_id):
+        # "built", "unchanged", "empty"(읽을 수 있는 표정 이미지가 없음) 또는 None(캐릭터 없음)
+        character = self.session.get(Character, character_id)
+        if character is None:
+            return None
+        expressions = {expression.emotion: expression.image_url for expression in character.expressions}
+        version = source_version(expressions, self.frame_size, self.image_format)
+        atlas = character.atlas
+        if atlas is not None and atlas.version == version:
+            with self.lock:
+                self.unchanged += 1
+            return "unchanged"
+
+        cache = {}
+        images = {}
+        for emotion, url in expressions.items():
+            # 외부 URL 처럼 이 서버에서 읽을 수 없는 이미지는 빼고, 클라이언트는 그 감정만 개별 URL 을 씀
+            image = self._load(url, cache) if url else None
+            if image is not None:
+                images[emotion] = image
+
+        if not images:
+            if atlas is not None:
+                self.session.delete(atlas)
+                self.session.commit()
+            return "empty"
+
+        data, frames = pack(images, self.frame_size, self.image_format)
+        stored = self.store.put(data, thumbnails=False)
+        if atlas is None:
+            atlas = CharacterAtlas(character_id=character_id)
+            self.session.add(atlas)
+        atlas.version = version
+        atlas.image_url = stored["url"]
+        atlas.frames = frames
+        try:
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        with self.lock:
+            self.built += 1
+        return "built"
+
+    def build_all(self):
+        # 모든 캐릭터를 확인해서 바뀐 것만 다시 만듦 (일괄 가져오기 뒤 등)
+        counts = {}
+        for character_id in [row.id for row in self.session.query(Character.id).order_by(Character.id)]:
+            outcome = self.build(character_id)
+            counts[outcome] = counts.get(outcome, 0) + 1
+            self.session.expunge_all()
+        return counts
+
+    def stats(self):
+        with self.lock:
+            return {"pending": len(self.pending), "built": self.built, "unchanged": self.unchanged, "failed": self.failed}
+
+
+def watch_expressions(session_class, on_change):
+    # 표정이 추가·수정·삭제된 뒤 커밋되면 on_change(캐릭터 id 집합) 호출
+    # query.update() 같은 일괄 실행과 세션을 거치지 않는 일괄 가져오기는 잡지 못하므로 build_all() 로 맞춤
+    key = ("expressions_changed", object())
+
+    @event.listens_for(session_class, "after_flush")
+    def after_flush(session, flush_context):
+        changed = {
+            obj.character_id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+            if isinstance(obj, CharacterExpression) and obj.character_id is not None
+        }
+        if changed:
+            session.info.setdefault(key, set()).update(changed)
+
+    @event.listens_for(session_class, "after_commit")
+    def after_commit(session):
+        changed = session.info.pop(key, None)
+        if changed:
+            on_change(changed)
+
+    @event.listens_for(session_class, "after_rollback")
+    def after_rollback(session):
+        session.info.pop(key, None)
+
+
+if __name__ == "__main__":
+    # 모든 캐릭터의 아틀라스를 확인하고 바뀐 것만 다시 만듦: python sprite_atlas.py
+    from database import db_session
+    from image_store import ImageStore
+
+    builder = AtlasBuilder(db_session, ImageStore())
+    print(builder.build_all(), file=sys.stderr)
+    db_session.remove()
@@ -0,0 +1,139 @@
+import pytest
+import circuit_breaker
+from circuit_breaker import BreakerSet, CircuitBreaker, CircuitOpen
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def make_breaker(**options):
+    settings = {"slow_seconds": 1.0, "window": 10, "min_calls": 4, "failure_ratio": 0.5, "slow_ratio": 0.5,
+                "open_seconds": 15.0, "probes": 1, "enabled": True}
+    settings.update(options)
+    return CircuitBreaker("chat", **settings)
+
+
+def trip(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.allow()
+        breaker.record(0.1, failed=True)
+
+
+def test_opens_after_min_calls_failures(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(0.1, failed=True)
+    # 창에 min_calls 만큼 쌓이기 전에는 열지 않음
+    assert breaker.stats()["open"] is False
+
+    breaker.allow()
+    breaker.record(0.1, failed=True)
+    assert breaker.stats()["open"] is True
+    with pytest.raises(CircuitOpen) as raised:
+        breaker.allow()
+    assert raised.value.retry_after == pytest.approx(15.0)
+    assert raised.value.headers() == {"Retry-After": "15"}
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_slow_calls_open_the_breaker(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.allow()
+        breaker.record(2.0, failed=False)
+    assert breaker.stats()["open"] is True
+
+
+def test_healthy_calls_keep_it_closed(clock):
+    breaker = make_breaker()
+    for index in range(20):
+        breaker.allow()
+        # 실패 비율이 기준(0.5)보다 낮으면 닫힌 상태 유지
+        breaker.record(0.1, failed=index % 4 == 0)
+    assert breaker.stats()["open"] is False
+
+
+def test_half_open_allows_a_single_probe_then_closes(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 15.0
+
+    breaker.allow()
+    assert breaker.stats()["halfOpen"] is True
+    # 시험 호출이 진행 중이면 다른 호출은 바로 거절
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+    breaker.record(0.1, failed=False)
+    assert breaker.stats()["open"] is False
+    breaker.allow()
+    breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 15.0
+
+    breaker.allow()
+    breaker.record(0.1, failed=True)
+    stats = breaker.stats()
+    assert stats["open"] is True and stats["halfOpen"] is False
+    assert stats["opened"] == 2
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+    clock.now += 15.0
+    breaker.allow()
+    # 느린 시험 호출도 실패로 봄
+    breaker.record(2.0, failed=False)
+    assert breaker.stats()["opened"] == 3
+
+
+def test_released_probe_frees_its_slot(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 15.0
+
+    breaker.allow()
+    breaker.release()
+    breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+
+def test_disabled_breaker_never_opens(clock):
+    breaker = make_breaker(enabled=False)
+    trip(breaker)
+    breaker.allow()
+    assert breaker.stats()["open"] is False
+
+
+def test_breaker_set_keeps_one_breaker_per_operation(clock):
+    breakers = BreakerSet(min_calls=2, window=4, enabled=True)
+    chat = breakers.get("chat")
+    assert breakers.get("chat") is chat
+    assert chat.slow_seconds == circuit_breaker.SLOW_SECONDS["chat"]
+
+    for _ in range(2):
+        chat.allow()
+        chat.record(0.1, failed=True)
+    breakers.get("tts").allow()
+
+    stats = breakers.stats()
+    assert list(stats) == ["chat", "tts"]
+    assert stats["chat"]["open"] is True
+    assert stats["tts"]["open"] is False
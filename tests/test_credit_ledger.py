@@ -0,0 +1,65 @@
+import threading
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import scoped_session, sessionmaker
+import credit_ledger
+from models import Base, CreditTransaction, User
+
+
+def test_concurrent_set_balance_keeps_ledger_consistent(tmp_path):
+    # SQLite 는 FOR UPDATE 가 없으므로 set_balance 와 credit 이 겹쳐도 잔액 = 처음 잔액 + 원장 합계 여야 함
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    session = scoped_session(sessionmaker(bind=engine))
+    credit_ledger.balances.entries.clear()
+    credit_ledger.ensure_user(session, "ledger-user")
+    session.remove()
+
+    def worker(number):
+        for step in range(30):
+            if (number + step) % 2:
+                credit_ledger.set_balance(session, "ledger-user", (number * 31 + step) % 500)
+            else:
+                credit_ledger.credit(session, "ledger-user", 3)
+        session.remove()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with engine.connect() as connection:
+        balance = connection.execute(select(User.credits).where(User.username == "ledger-user")).scalar_one()
+        total = connection.execute(select(func.sum(CreditTransaction.amount))).scalar_one()
+    credit_ledger.balances.entries.clear()
+    engine.dispose()
+    assert balance == total
+
+
+def test_opening_balances_are_recorded_in_the_ledger(tmp_path):
+    # 기본 크레딧으로 만든 사용자와 save-credits 로 처음 만든 사용자 모두 원장 합계 = users.credits
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}")
+    Base.metadata.create_all(engine)
+    session = scoped_session(sessionmaker(bind=engine))
+    credit_ledger.balances.entries.clear()
+    credit_ledger.debit(session, "default-user", 7)
+    credit_ledger.set_balance(session, "saved-user", 250)
+    credit_ledger.credit(session, "saved-user", 5)
+    credit_ledger.ensure_user(session, "default-user")
+    session.remove()
+
+    with engine.connect() as connection:
+        balances = dict(connection.execute(select(User.username, User.credits)).all())
+        totals = dict(connection.execute(
+            select(User.username, func.sum(CreditTransaction.amount))
+            .join(CreditTransaction, CreditTransaction.user_id == User.id)
+            .group_by(User.username)
+        ).all())
+        openings = connection.execute(
+            select(func.count()).where(CreditTransaction.reason == credit_ledger.INITIAL_REASON)
+        ).scalar_one()
+    credit_ledger.balances.entries.clear()
+    engine.dispose()
+    assert balances == {"default-user": credit_ledger.DEFAULT_CREDITS - 7, "saved-user": 255}
+    assert totals == balances
+    assert openings == 2
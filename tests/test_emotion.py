@@ -0,0 +1,42 @@
+import pytest
+from emotion import classify_emotion
+
+
+@pytest.mark.parametrize("text", [
+    "정말 흥미롭네요",
+    "조심해서 가세요",
+    "어머니가 오셨어요",
+    "유명한 화가예요",
+    "흠뻑 젖었어요",
+    "헐렁한 옷을 샀어요",
+    "화가들이 모였어요",
+    "흥정했어요",
+])
+def test_short_stems_inside_other_words_do_not_match(text):
+    assert classify_emotion(text) not in ("angry", "surprised", "nervous")
+
+
+def test_heung_inside_excitement_is_not_angry():
+    assert classify_emotion("너무 흥분돼요") == "excited"
+
+
+@pytest.mark.parametrize("text, emotion", [
+    ("흥! 몰라", "angry"),
+    ("정말 화가 났어", "angry"),
+    ("어머! 진짜요", "surprised"),
+    ("흠... 글쎄요", "thoughtful"),
+])
+def test_standalone_interjections_still_match(text, emotion):
+    assert classify_emotion(text) == emotion
+
+
+@pytest.mark.parametrize("text, emotion", [
+    ("화가났어", "angry"),
+    ("진짜 화가나", "angry"),
+    ("완전 화났어", "angry"),
+    ("어머어머", "surprised"),
+    ("흠흠", "thoughtful"),
+    ("흥흥 몰라", "angry"),
+])
+def test_interjections_with_attached_endings_still_match(text, emotion):
+    assert classify_emotion(text) == emotion
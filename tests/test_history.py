@@ -0,0 +1,57 @@
+import threading
+from history import HistoryManager
+
+
+def test_turns_sliding_out_of_server_window_are_summarized():
+    # 짧은 턴만 200번: 토큰 예산은 넘지 않지만 창(10턴) 밖으로 밀려난 턴은 모두 요약에 들어가야 함
+    folded = []
+
+    def summarize(previous, messages):
+        folded.extend(messages)
+        return f"{len(folded)} messages"
+
+    manager = HistoryManager(summarize, workers=0)
+    stored = []
+    for turn in range(200):
+        summary, recent = manager.compact("user:1:1", stored[-60:], sliding=True, max_messages=20)
+        assert len(recent) <= 20
+        assert len(folded) + len(recent) == len(stored)
+        stored += [{"role": "user", "content": f"hi {turn}"}, {"role": "assistant", "content": f"hello {turn}"}]
+
+    assert manager.stats()["resets"] == 0
+    assert folded == stored[:len(folded)]
+
+
+def test_client_history_without_limit_is_only_compacted_over_budget():
+    manager = HistoryManager(lambda previous, messages: "summary", workers=0)
+    history = [{"role": "user", "content": f"hi {turn}"} for turn in range(50)]
+    summary, recent = manager.compact("first:x", history)
+    assert summary is None
+    assert recent == history
+
+
+def test_summaries_are_built_in_the_background():
+    # 요약 호출이 끝나기 전에도 compact 는 이전 요약과 창 안의 메시지로 바로 돌아오고, 같은 대화는 한 번만 요약함
+    release = threading.Event()
+    calls = []
+
+    def summarize(previous, messages):
+        calls.append(len(messages))
+        release.wait(5)
+        return "folded"
+
+    manager = HistoryManager(summarize, workers=1)
+    history = [{"role": "user", "content": f"hi {turn}"} for turn in range(30)]
+    for _ in range(3):
+        summary, recent = manager.compact("user:1:1", history, sliding=True, max_messages=20)
+        assert summary is None
+        assert recent == history[-20:]
+    assert manager.stats()["pending"] == 1
+
+    release.set()
+    manager.executor.shutdown(wait=True)
+    summary, recent = manager.compact("user:1:1", history, sliding=True, max_messages=20)
+    assert calls == [18]
+    assert summary == "folded"
+    assert recent == history[18:]
+    assert manager.stats() == {"conversations": 1, "pending": 0, "summaries": 1, "resets": 0}
@@ -0,0 +1,95 @@
+import pytest
+import rate_limit
+from rate_limit import LocalBackend, RateLimited, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def test_bucket_refills_at_the_configured_rate(clock):
+    backend = LocalBackend()
+    for _ in range(3):
+        assert backend.reserve("user:a", 1, 1.0, 3, 0.0) == 0.0
+    # 빈 버킷: 1토큰이 채워지려면 1초가 필요하므로 거절(음수)
+    assert backend.reserve("user:a", 1, 1.0, 3, 0.0) == pytest.approx(-1.0)
+
+    clock.now += 0.5
+    assert backend.reserve("user:a", 1, 1.0, 3, 0.0) == pytest.approx(-0.5)
+    clock.now += 0.5
+    assert backend.reserve("user:a", 1, 1.0, 3, 0.0) == 0.0
+
+    # 오래 쉬어도 버킷 크기 이상으로는 채워지지 않음
+    clock.now += 100
+    for _ in range(3):
+        assert backend.reserve("user:a", 1, 1.0, 3, 0.0) == 0.0
+    assert backend.reserve("user:a", 1, 1.0, 3, 0.0) < 0
+
+
+def test_short_waits_borrow_tokens(clock):
+    backend = LocalBackend()
+    assert backend.reserve("user:a", 3, 2.0, 3, 0.0) == 0.0
+    assert backend.reserve("user:a", 1, 2.0, 3, 1.0) == pytest.approx(0.5)
+    # 앞 요청이 빌려 쓴 토큰 때문에 다음 요청은 더 오래 기다려야 함
+    assert backend.reserve("user:a", 1, 2.0, 3, 0.0) == pytest.approx(-1.0)
+
+
+def test_least_recently_used_buckets_are_evicted(clock):
+    backend = LocalBackend(max_keys=2)
+    backend.reserve("user:a", 3, 1.0, 3, 0.0)
+    backend.reserve("user:b", 3, 1.0, 3, 0.0)
+    backend.reserve("user:a", 0, 1.0, 3, 0.0)
+    backend.reserve("user:c", 3, 1.0, 3, 0.0)
+
+    assert list(backend.buckets) == ["user:a", "user:c"]
+    # 밀려난 버킷은 다시 가득 찬 상태로 시작함
+    assert backend.reserve("user:b", 3, 1.0, 3, 0.0) == 0.0
+    assert "user:a" not in backend.buckets
+
+
+def test_limiter_rejects_with_retry_after(clock):
+    limiter = RateLimiter(rate=1.0, burst=10, costs={"image": 10, "chat": 1}, max_wait=0.0, enabled=True)
+    limiter.admit("user:a", "image")
+    with pytest.raises(RateLimited) as raised:
+        limiter.admit("user:a", "chat")
+    assert raised.value.retry_after == pytest.approx(1.0)
+    assert raised.value.headers() == {"Retry-After": "1"}
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_limiter_waits_for_short_refills(clock):
+    limiter = RateLimiter(rate=2.0, burst=1, costs={"chat": 1}, max_wait=0.5, enabled=True)
+    limiter.admit("user:a", "chat")
+    started = clock.now
+    limiter.admit("user:a", "chat")
+    assert clock.now - started == pytest.approx(0.5)
+    assert limiter.stats()["delayed"] == 1
+
+
+def test_scaled_buckets_hold_more_tokens(clock):
+    limiter = RateLimiter(rate=1.0, burst=2, costs={"chat": 1}, max_wait=0.0, enabled=True)
+    for _ in range(8):
+        limiter.admit("ip:10.0.0.1", "chat", scale=4)
+    with pytest.raises(RateLimited):
+        limiter.admit("ip:10.0.0.1", "chat", scale=4)
+
+
+def test_disabled_limiter_admits_everything(clock):
+    limiter = RateLimiter(rate=1.0, burst=1, max_wait=0.0, enabled=False)
+    for _ in range(5):
+        limiter.admit("user:a", "image")
+    assert limiter.stats()["admitted"] == 0
@@ -0,0 +1,58 @@
+import pytest
+from response_cache import ResponseCache
+
+
+def make_cache():
+    return ResponseCache(enabled=True)
+
+
+def store(cache, message, response="cached"):
+    cache.put(cache.key(1, "prompt", message, []), response, "happy")
+
+
+def lookup(cache, message):
+    return cache.get(cache.key(1, "prompt", message, []))
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("cats", "bats"),
+    ("dragon", "dog"),
+    ("i love you", "i hate you"),
+    ("do you like cats", "do you like bats"),
+    ("do you like me", "do you not like me"),
+    ("i am happy today", "i am not happy today"),
+    ("tell me about dragons", "tell me about dogs"),
+    ("what is your name", "what is your game"),
+    ("can you tell me a story about cats", "can you tell me a story about bats"),
+    ("do you want to play a game with me", "do you not want to play a game with me"),
+    ("please draw me a picture of a dragon", "please draw me a picture of a dog"),
+    ("what do you think about cats", "what do you think about bats"),
+])
+def test_near_identical_prompts_with_different_meaning_miss(stored, asked):
+    cache = make_cache()
+    store(cache, stored)
+    assert lookup(cache, asked) is None
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("hi", "Hi!!"),
+    ("안녕하세요~", "안녕하세요!!"),
+    ("안녕하세요", "안녕 하세요"),
+    ("good morning", "goodmorning"),
+    ("Who are you?", "who are you"),
+])
+def test_same_greeting_hits(stored, asked):
+    cache = make_cache()
+    store(cache, stored)
+    assert lookup(cache, asked) == ("cached", "happy")
+
+
+def test_scopes_are_separate():
+    cache = make_cache()
+    cache.put(cache.key(1, "prompt", "hi", []), "one", "happy")
+    assert cache.get(cache.key(2, "prompt", "hi", [])) is None
+    assert cache.get(cache.key(1, "edited prompt", "hi", [])) is None
+
+
+def test_history_is_not_cached():
+    assert make_cache().key(1, "prompt", "hi", [{"role": "user", "content": "x"}]) is None
@@ -0,0 +1,124 @@
+import threading
+import time
+import pytest
+import singleflight
+from singleflight import IdempotencyConflict, SingleFlight
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def start_waiters(flight, key, count, outcomes):
+    # count 개의 스레드가 진행 중인 같은 키의 호출을 기다리게 하고, 모두 합류할 때까지 기다림
+    def waiter():
+        try:
+            outcomes.append(flight.do(key, lambda: pytest.fail("waiters must not call fn")))
+        except Exception as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=waiter) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.stats()["coalesced"] == count)
+    return threads
+
+
+def run_leader(flight, key, fn):
+    outcome = []
+
+    def leader():
+        try:
+            outcome.append(flight.do(key, fn))
+        except Exception as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    wait_for(lambda: flight.stats()["inFlight"] == 1)
+    return thread, outcome
+
+
+def test_waiters_share_the_leader_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, outcome = run_leader(flight, "k", lambda: release.wait(5) and "result")
+    outcomes = []
+    waiters = start_waiters(flight, "k", 3, outcomes)
+
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join(5)
+    assert outcome == [("result", False)]
+    assert outcomes == [("result", True)] * 3
+    assert flight.stats()["executed"] == 1
+
+
+def test_waiters_are_released_when_the_leader_fails():
+    flight = SingleFlight()
+    release = threading.Event()
+    error = RuntimeError("upstream failed")
+
+    def fail():
+        release.wait(5)
+        raise error
+
+    leader, outcome = run_leader(flight, "k", fail)
+    outcomes = []
+    waiters = start_waiters(flight, "k", 3, outcomes)
+
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join(5)
+        assert not thread.is_alive()
+    assert outcome == [error]
+    assert outcomes == [error] * 3
+
+    # 실패한 호출은 보관하지 않으므로 다음 호출은 새로 실행됨
+    assert flight.stats()["inFlight"] == 0
+    assert flight.do("k", lambda: "retried", retain=True) == ("retried", False)
+
+
+def test_retained_results_are_replayed_until_they_expire(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(singleflight, "time", clock)
+    flight = SingleFlight(ttl=10)
+    calls = []
+
+    def call():
+        calls.append(1)
+        return f"result {len(calls)}"
+
+    assert flight.do("key", call, fingerprint="a", retain=True) == ("result 1", False)
+    assert flight.do("key", call, fingerprint="a", retain=True) == ("result 1", True)
+    with pytest.raises(IdempotencyConflict):
+        flight.do("key", call, fingerprint="b", retain=True)
+
+    clock.now += 11
+    # 다른 키 호출에서도 만료된 결과를 정리함
+    flight.do("other", lambda: "x")
+    assert flight.stats()["retained"] == 0
+    assert flight.do("key", call, fingerprint="b", retain=True) == ("result 2", False)
+
+
+def test_retained_results_are_capped_by_bytes():
+    flight = SingleFlight(max_bytes=250)
+    for index in range(5):
+        flight.do(f"key-{index}", lambda: "x" * 100, retain=True)
+    stats = flight.stats()
+    assert stats["retained"] == 2
+    assert stats["retainedBytes"] == 200
+    # 가장 오래된 결과부터 버림
+    assert flight.do("key-4", lambda: "new", retain=True) == ("x" * 100, True)
+    assert flight.do("key-0", lambda: "new", retain=True) == ("new", False)
@@ -0,0 +1,111 @@
+import os
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class TTSCache:
+    # (모델, 음성, 텍스트) 해시를 키로 MP3 파일을 디스크에 저장하는 캐시.
+    # 전체 크기가 max_bytes 를 넘으면 가장 오래 사용하지 않은 파일부터 삭제(LRU).
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> 파일 크기, 오래된 순
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loaded = False
+
+    @staticmethod
+    def make_key(model, voice, text):
+        return hashlib.sha256(f"{model}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def _load(self):
+        # 재시작 시 디스크에 남아 있는 파일을 수정 시각 순으로 다시 등록
+        # 워커 시작을 늦추지 않도록 처음 사용할 때 lock 안에서 한 번만 읽음
+        if self.loaded:
+            return
+        self.loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".mp3"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def contains(self, key):
+        # 적중/미스 통계나 LRU 순서를 바꾸지 않고 있는지만 확인
+        with self.lock:
+            self._load()
+            return key in self.entries and os.path.exists(self.path(key))
+
+    def get(self, key):
+        # 캐시에 있으면 파일 경로, 없으면 None
+        with self.lock:
+            self._load()
+            if key in self.entries:
+                path = self.path(key)
+                if os.path.exists(path):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    # 다음 재시작 때도 LRU 순서가 유지되도록 수정 시각 갱신
+                    os.utime(path)
+                    return path
+                # 다른 워커가 지운 파일
+                self.total_bytes -= self.entries.pop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        with self.lock:
+            self._load()
+        path = self.path(key)
+        # fork 된 워커끼리는 스레드 id 가 같을 수 있으므로 임시 파일 이름은 uuid 로 구분
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict(keep=key)
+        return path
+
+    def _evict(self, keep=None):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = next(iter(self.entries.items()))
+            if key == keep:
+                break
+            del self.entries[key]
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            self._load()
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,112 @@
+import io
+import os
+import base64
+import binascii
+import mimetypes
+import tempfile
+
+# 업로드 크기 설정
+#   UPLOAD_MAX_BYTES: 이미지/오디오 파일 하나의 최대 크기 (기본 10MB)
+#   UPLOAD_SPOOL_BYTES: 이 크기를 넘는 업로드는 메모리 대신 임시 파일에 보관 (기본 1MB)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", 1024 * 1024))
+# 요청 본문 전체 한도. base64 JSON 은 원본보다 1/3 크므로 그만큼 여유를 둠
+MAX_REQUEST_BYTES = UPLOAD_MAX_BYTES * 4 // 3 + 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+RAW_TYPES = ("image/", "audio/", "application/octet-stream")
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Upload:
+    # 업로드된 파일 하나. file 은 처음 위치로 되감긴 seek 가능한 파일 객체
+    def __init__(self, file, size, mimetype, filename=None):
+        self.file = file
+        self.size = size
+        self.mimetype = mimetype
+        self.filename = filename or "upload" + (mimetypes.guess_extension(mimetype) or "")
+
+    def read(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def data_url(self):
+        return f"data:{self.mimetype};base64,{base64.b64encode(self.read()).decode('ascii')}"
+
+
+def _file_size(file):
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    return size
+
+
+def _check_size(size):
+    if size > UPLOAD_MAX_BYTES:
+        raise UploadError(f"Upload exceeds {UPLOAD_MAX_BYTES} bytes", 413)
+
+
+def _spool_stream(stream, mimetype):
+    # 원시 본문을 조각 단위로 읽어 한도를 넘으면 바로 중단. 큰 본문은 임시 파일로 넘어감
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > UPLOAD_MAX_BYTES:
+            spool.close()
+            _check_size(size)
+        spool.write(chunk)
+    spool.seek(0)
+    return Upload(spool, size, mimetype)
+
+
+def _from_data_url(value):
+    # "data:image/png;base64,...." 또는 순수 base64 문자열
+    mimetype = "application/octet-stream"
+    if value.startswith("data:") and "," in value:
+        header, value = value.split(",", 1)
+        mimetype = header[5:].split(";")[0] or mimetype
+    elif "," in value:
+        value = value.split(",", 1)[1]
+    try:
+        data = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise UploadError("Upload is not valid base64")
+    _check_size(len(data))
+    return Upload(io.BytesIO(data), len(data), mimetype)
+
+
+def read_upload(request, field):
+    # (Upload 또는 None, 나머지 필드) 를 반환. 세 가지 형식을 모두 받음
+    #   multipart/form-data: field 이름의 파일 파트, 나머지는 폼 필드
+    #   image/*, audio/*, application/octet-stream 본문: 본문 전체가 파일, 나머지는 쿼리 문자열
+    #   JSON: field 값이 base64 또는 data URL 문자열
+    mimetype = request.mimetype or ""
+    if mimetype == "multipart/form-data":
+        storage = request.files.get(field)
+        if storage is None:
+            return None, request.form
+        # werkzeug 가 큰 파트는 이미 임시 파일에 받아 둠
+        size = _file_size(storage.stream)
+        _check_size(size)
+        return Upload(storage.stream, size, storage.mimetype or "application/octet-stream", storage.filename), request.form
+    if mimetype.startswith(RAW_TYPES):
+        return _spool_stream(request.stream, mimetype), request.args
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, None
+    value = data.get(field)
+    if not value:
+        return None, data
+    if not isinstance(value, str):
+        raise UploadError(f"{field} must be a base64 string")
+    return _from_data_url(value), data
+
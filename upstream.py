@@ -0,0 +1,234 @@
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+from circuit_breaker import BreakerSet, CircuitOpen
+
+# 환경 변수 로드
+load_dotenv()
+
+# OpenAI 호출 공통 설정
+#   UPSTREAM_MAX_CONCURRENCY: 프로세스 전체에서 동시에 진행할 수 있는 업스트림 호출 수
+#   UPSTREAM_QUEUE_TIMEOUT: 빈 슬롯을 기다리는 최대 시간(초), 넘으면 UpstreamBusy
+#   UPSTREAM_POOL_SIZE: 공유 HTTP 연결 풀 크기 (keep-alive 연결 재사용)
+#   UPSTREAM_RETRIES: 일시적 오류(연결 실패, 타임아웃, 429, 5xx) 재시도 횟수
+MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", 64))
+QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", 10))
+POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", 100))
+RETRIES = int(os.getenv("UPSTREAM_RETRIES", 2))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", 0.25))
+BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", 4))
+CONNECT_TIMEOUT = 5.0
+
+# 작업별 호출 타임아웃(초). UPSTREAM_TIMEOUT_CHAT 처럼 환경 변수로 덮어쓸 수 있음
+TIMEOUTS = {
+    "chat": 30.0,
+    "emotion": 10.0,
+    "summary": 20.0,
+    "vision": 30.0,
+    "tts": 30.0,
+    "image": 120.0,
+}
+for _operation in TIMEOUTS:
+    TIMEOUTS[_operation] = float(os.getenv(f"UPSTREAM_TIMEOUT_{_operation.upper()}", TIMEOUTS[_operation]))
+DEFAULT_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", 30))
+
+
+
+class UpstreamBusy(Exception):
+    # 동시 호출 한도가 찼고 대기 시간 안에 슬롯이 나지 않음
+    pass
+
+
+def create_client():
+    # 모든 요청 스레드가 하나의 연결 풀을 공유하는 클라이언트. 재시도는 call()에서 직접 처리
+    # openai 패키지는 가져오는 데만 0.5초 가까이 걸리므로 첫 호출 때 가져옴
+    import httpx
+    from openai import OpenAI, DefaultHttpxClient
+
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT)
+    )
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+
+
+class LazyClient:
+    # 속성에 처음 접근할 때 create_client() 로 실제 클라이언트를 만들고 이후로는 그대로 위임
+    #   client.chat.completions.create 처럼 기존 코드를 바꾸지 않고 쓸 수 있음
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+client = LazyClient(create_client)
+_retryable_errors = None
+
+
+def retryable_errors():
+    # 일시적 오류로 보고 재시도할 예외 (연결 실패, 타임아웃, 429, 5xx)
+    global _retryable_errors
+    if _retryable_errors is None:
+        from openai import APIConnectionError, RateLimitError, InternalServerError
+        _retryable_errors = (APIConnectionError, RateLimitError, InternalServerError)
+    return _retryable_errors
+
+def unavailable(e):
+    # 업스트림이 응답하지 못한 오류 (서킷 열림, 동시 호출 한도 초과, 재시도 후에도 남은 일시적 오류).
+    # 이때는 엔드포인트가 오류 대신 대체 응답을 줄 수 있음
+    return isinstance(e, (CircuitOpen, UpstreamBusy)) or isinstance(e, retryable_errors())
+
+# 작업별 서킷 브레이커. 업스트림이 느려지거나 실패하면 호출 없이 바로 CircuitOpen 을 냄
+breakers = BreakerSet()
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_stats_lock = threading.Lock()
+_stats = {"inFlight": 0, "calls": 0, "retries": 0, "failures": 0, "rejected": 0}
+_observers = []
+
+
+def observe(fn):
+    # 호출이 끝날 때마다 fn(operation, model, seconds, outcome, response) 를 부름 (metrics.py 에서 등록)
+    #   outcome: "ok", "error", "busy", "open"(서킷 브레이커가 막음), "cancelled"(스트림을 끝까지 읽지 않음)
+    _observers.append(fn)
+
+
+def _notify(operation, kwargs, started, outcome, response=None):
+    seconds = time.perf_counter() - started
+    for fn in _observers:
+        try:
+            fn(operation, kwargs.get("model"), seconds, outcome, response)
+        except Exception as e:
+            print(f"Error in upstream observer: {str(e)}")
+
+
+def _count(name, delta=1):
+    with _stats_lock:
+        _stats[name] += delta
+
+
+def backoff_delay(attempt):
+    # full jitter: 0 ~ min(최대값, 기본값 * 2^attempt) 사이 임의의 시간
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _admit(operation, kwargs, started):
+    # 서킷 브레이커와 동시 호출 한도를 차례로 통과. 통과하지 못하면 관찰자에게 알리고 예외
+    breaker = breakers.get(operation)
+    try:
+        breaker.allow()
+    except CircuitOpen:
+        _notify(operation, kwargs, started, "open")
+        raise
+    try:
+        _acquire()
+    except UpstreamBusy:
+        breaker.release()
+        _notify(operation, kwargs, started, "busy")
+        raise
+    return breaker
+
+
+def _acquire():
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+        _count("rejected")
+        raise UpstreamBusy("Too many upstream requests in flight")
+    _count("inFlight")
+
+
+def _release():
+    _count("inFlight", -1)
+    _slots.release()
+
+
+def _with_retries(operation, fn, kwargs):
+    kwargs.setdefault("timeout", TIMEOUTS.get(operation, DEFAULT_TIMEOUT))
+    retryable = retryable_errors()
+    attempt = 0
+    while True:
+        _count("calls")
+        try:
+            return fn(**kwargs)
+        except retryable as e:
+            if attempt >= RETRIES:
+                _count("failures")
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Upstream {operation} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            _count("retries")
+            attempt += 1
+            time.sleep(delay)
+        except Exception:
+            _count("failures")
+            raise
+
+
+def call(operation, fn, **kwargs):
+    # 동시 호출 한도, 타임아웃, 지터 백오프 재시도를 적용해 OpenAI 메서드를 호출
+    #   upstream.call("chat", client.chat.completions.create, model="gpt-4o", ...)
+    started = time.perf_counter()
+    breaker = _admit(operation, kwargs, started)
+    called = time.perf_counter()
+    try:
+        response = _with_retries(operation, fn, kwargs)
+    except Exception as e:
+        # 요청 자체가 잘못된 경우(400 등)는 업스트림 상태와 무관하므로 실패로 세지 않음
+        breaker.record(time.perf_counter() - called, isinstance(e, retryable_errors()))
+        _notify(operation, kwargs, started, "error")
+        raise
+    finally:
+        _release()
+    breaker.record(time.perf_counter() - called, False)
+    _notify(operation, kwargs, started, "ok", response)
+    return response
+
+
+def stream(operation, fn, **kwargs):
+    # 스트리밍 호출. 스트림을 여는 단계만 재시도하고, 끝까지 읽을 때까지 슬롯을 유지함
+    started = time.perf_counter()
+    breaker = _admit(operation, kwargs, started)
+    called = time.perf_counter()
+    outcome = "error"
+    try:
+        try:
+            response = _with_retries(operation, fn, {**kwargs, "stream": True})
+        except Exception as e:
+            breaker.record(time.perf_counter() - called, isinstance(e, retryable_errors()))
+            raise
+        # 지연은 스트림이 열릴 때까지의 시간으로 판단 (전체 길이는 답변 길이에 따라 달라짐)
+        opened = time.perf_counter() - called
+        try:
+            yield from response
+            outcome = "ok"
+            breaker.record(opened, False)
+        except GeneratorExit:
+            # 클라이언트가 스트림 도중 연결을 끊음
+            outcome = "cancelled"
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.record(opened, isinstance(e, retryable_errors()))
+            raise
+        finally:
+            response.close()
+    finally:
+        _release()
+        _notify(operation, kwargs, started, outcome)
+
+
+def stats():
+    with _stats_lock:
+        counts = {**_stats, "maxConcurrency": MAX_CONCURRENCY}
+    return {**counts, "breakers": breakers.stats()}